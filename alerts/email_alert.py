@@ -3,20 +3,16 @@
 import smtplib
 from email.mime.text import MIMEText
 
-from config import (
-    EMAIL_ENABLED,
-    GMAIL_USERNAME,
-    GMAIL_APP_PASSWORD,
-    RECEIVER_EMAIL,
-)
+from settings import Settings, get_settings
 
 
-def send_price_alert(product: dict, target_price: float):
-    if not EMAIL_ENABLED:
+def send_price_alert(product: dict, target_price: float, settings: Settings = None):
+    email = (settings or get_settings()).alerts.email
+    if not email.enabled:
         print("📧 Email disabled (EMAIL_ENABLED is false). Skipping alert.")
         return
 
-    if not all([GMAIL_USERNAME, GMAIL_APP_PASSWORD, RECEIVER_EMAIL]):
+    if not all([email.username, email.app_password, email.receiver]):
         print("📧 Email config missing. Skipping alert.")
         return
 
@@ -31,14 +27,14 @@ def send_price_alert(product: dict, target_price: float):
 
     msg = MIMEText(body, "html")
     msg["Subject"] = f"Price Alert: {product.get('title')}"
-    msg["From"] = GMAIL_USERNAME
-    msg["To"] = RECEIVER_EMAIL
+    msg["From"] = email.username
+    msg["To"] = email.receiver
 
     try:
         with smtplib.SMTP("smtp.gmail.com", 587) as server:
             server.starttls()
-            server.login(GMAIL_USERNAME, GMAIL_APP_PASSWORD)
+            server.login(email.username, email.app_password)
             server.send_message(msg)
-        print(f"✅ Price alert email sent to {RECEIVER_EMAIL}")
+        print(f"✅ Price alert email sent to {email.receiver}")
     except Exception as e:
         print(f"❌ Failed to send email: {e}")
@@ -0,0 +1,473 @@
+# alerts/rules.py
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from config import ALERT_RULES_PATH, ROLLUPS_PATH
+from scraper.fileio import atomic_write
+from scraper.stock import StockState
+
+if TYPE_CHECKING:
+    # Only the engine needs numpy; it is imported when rules are evaluated
+    import numpy as np
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Used when the rules file cannot be read: the alerts every product had
+# before rules were configurable
+DEFAULT_RULES = [
+    {"name": "target_price", "type": "target_price"},
+    {"name": "in_stock", "type": "in_stock"},
+]
+
+# Daily price buckets kept per product when no rule needs a longer window
+MIN_ROLLUP_DAYS = 30
+
+_BUYABLE = [int(StockState.IN_STOCK), int(StockState.LOW_STOCK)]
+
+# Stands in for a product without rollups yet
+_NO_ROLLUP = {"days": {}, "low": None, "count": 0, "price": None, "state": 0}
+
+
+# ============================================================
+# ROLLUPS
+# ============================================================
+
+class RollupStore:
+    """Per-product aggregates the rules are joined against
+
+    For each product key: daily [sum, count] price buckets for the last
+    `days` days, the all-time low, the number of prices seen, and the last
+    price and stock state. Folded in incrementally after every evaluated
+    batch, so a rule never reads the history file; the first load without
+    a rollups file builds it from the history once.
+    """
+
+    def __init__(self, path: str = ROLLUPS_PATH, days: int = MIN_ROLLUP_DAYS):
+        self.path = path
+        self.days = days
+        self._rollups: Optional[Dict[str, Dict]] = None
+
+    def load(self, until: Optional[str] = None) -> Dict[str, Dict]:
+        """The rollups; built from history rows before until when there is no file"""
+        if self._rollups is not None:
+            return self._rollups
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._rollups = json.load(f)
+                return self._rollups
+            except Exception as e:
+                print(f"[!] Error reading rollups, rebuilding from history: {e}")
+        self.rebuild(until=until)
+        return self._rollups
+
+    def rebuild(self, until: Optional[str] = None):
+        """Fold the history into fresh rollups
+
+        Rows from until on are left out: they are the batch that is about
+        to be folded in. Periods compacted by the retention job are read
+        from the hourly/daily tiers, with their lowest price as the low.
+        """
+        from scraper.marketplaces import product_key
+        from scraper.retention import iter_tiered_history
+
+        self._rollups = {}
+        rows = 0
+        for row in iter_tiered_history():
+            if until and (row.get("timestamp") or "") >= until:
+                continue
+            try:
+                price = float(row["price"]) if row.get("price") else None
+                low = float(row["price_min"]) if row.get("price_min") else None
+            except ValueError:
+                price = low = None
+            self.fold(product_key(row["asin"], row["marketplace"]), row.get("timestamp") or "",
+                      price, int(row.get("stock_state") or 0), low)
+            rows += 1
+        if rows:
+            print(f"[OK] Built alert rollups for {len(self._rollups)} products "
+                  f"from {rows} history rows")
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.load().get(key)
+
+    def fold(self, key: str, timestamp: str, price: Optional[float], state: int,
+             low: Optional[float] = None):
+        rollup = self.load().setdefault(
+            key, {"days": {}, "low": None, "count": 0, "price": None, "state": 0})
+        if price is not None:
+            day = timestamp[:10]
+            bucket = rollup["days"].setdefault(day, [0.0, 0])
+            bucket[0] += price
+            bucket[1] += 1
+            if len(rollup["days"]) > self.days + 1:
+                cutoff = _days_before(day, self.days)
+                rollup["days"] = {d: b for d, b in rollup["days"].items() if d > cutoff}
+            low = price if low is None else min(low, price)
+            rollup["low"] = low if rollup["low"] is None else min(rollup["low"], low)
+            rollup["count"] += 1
+            rollup["price"] = price
+        if state:
+            rollup["state"] = state
+
+    def save(self):
+        if self._rollups is None:
+            return
+        try:
+            with atomic_write(self.path, encoding="utf-8") as f:
+                json.dump(self._rollups, f, separators=(",", ":"))
+        except Exception as e:
+            print(f"[!] Error writing rollups: {e}")
+
+
+def _days_before(day: str, days: int) -> str:
+    return (datetime.strptime(day, "%Y-%m-%d") - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+# ============================================================
+# RULES
+# ============================================================
+
+# A compiled rule: test(columns) -> boolean mask over the batch, and
+# describe(columns, row) -> (reason, reference label, reference price)
+Test = Callable[[Dict[str, "np.ndarray"]], "np.ndarray"]
+Describe = Callable[[Dict[str, "np.ndarray"], int], Tuple[str, Optional[str], Optional[float]]]
+
+
+class Rule:
+    """One rule from the rules file, compiled to a vectorized test"""
+
+    __slots__ = ("name", "type", "kind", "windows", "test", "describe")
+
+    def __init__(self, name: str, type: str, kind: str, test: Test, describe: Describe,
+                 windows: Tuple[int, ...] = ()):
+        self.name = name
+        self.type = type
+        self.kind = kind
+        self.windows = windows
+        self.test = test
+        self.describe = describe
+
+
+def _target_price(spec: Dict) -> Rule:
+    def test(c):
+        return c["price"] <= c["target"]
+
+    def describe(c, i):
+        return f"below target {c['target'][i]:.2f}", "Target Price", float(c["target"][i])
+
+    return Rule(spec["name"], "target_price", "price", test, describe)
+
+
+def _drop_from_average(spec: Dict) -> Rule:
+    days = int(spec.get("days", 30))
+    factor = 1 - float(spec.get("pct", 10)) / 100
+    min_points = int(spec.get("min_points", 5))
+    avg, points = f"avg_{days}", f"points_{days}"
+
+    def test(c):
+        return (c["price"] <= c[avg] * factor) & (c["price"] < c[avg]) & (c[points] >= min_points)
+
+    def describe(c, i):
+        drop = (1 - c["price"][i] / c[avg][i]) * 100
+        return (f"{drop:.0f}% below {days}-day average {c[avg][i]:.2f}",
+                f"{days}-day Average", float(c[avg][i]))
+
+    return Rule(spec["name"], "drop_from_average", "price", test, describe, (days,))
+
+
+def _all_time_low(spec: Dict) -> Rule:
+    min_points = int(spec.get("min_points", 5))
+
+    def test(c):
+        return (c["price"] < c["low"]) & (c["count"] >= min_points)
+
+    def describe(c, i):
+        return f"new all-time low (was {c['low'][i]:.2f})", "Previous Low", float(c["low"][i])
+
+    return Rule(spec["name"], "all_time_low", "price", test, describe)
+
+
+def _below_competitor(spec: Dict) -> Rule:
+    factor = 1 - float(spec.get("pct", 0)) / 100
+
+    def test(c):
+        return (c["price"] < c["competitor"] * factor) & (c["price"] < c["competitor"])
+
+    def describe(c, i):
+        return (f"below competitor {c['competitor_key'][i]} at {c['competitor'][i]:.2f}",
+                "Competitor Price", float(c["competitor"][i]))
+
+    return Rule(spec["name"], "below_competitor", "price", test, describe)
+
+
+def _in_stock(spec: Dict) -> Rule:
+    def test(c):
+        return c["stock_alert"] & c["buyable"]
+
+    def describe(c, i):
+        return "in stock", None, None
+
+    return Rule(spec["name"], "in_stock", "stock", test, describe)
+
+
+def _back_in_stock(spec: Dict) -> Rule:
+    def test(c):
+        return (c["stock_alert"] & c["buyable"] & ~c["was_buyable"]
+                & (c["prev_state"] != int(StockState.UNKNOWN)))
+
+    def describe(c, i):
+        return f"back in stock (was {StockState(int(c['prev_state'][i])).label})", None, None
+
+    return Rule(spec["name"], "back_in_stock", "stock", test, describe)
+
+
+RULE_TYPES: Dict[str, Callable[[Dict], Rule]] = {
+    "target_price": _target_price,
+    "drop_from_average": _drop_from_average,
+    "all_time_low": _all_time_low,
+    "below_competitor": _below_competitor,
+    "in_stock": _in_stock,
+    "back_in_stock": _back_in_stock,
+}
+
+
+def compile_rules(specs: List[Dict]) -> List[Rule]:
+    rules = []
+    for spec in specs:
+        if not spec.get("enabled", True):
+            continue
+        compiler = RULE_TYPES.get(spec.get("type"))
+        if compiler is None:
+            raise ValueError(f"Unknown rule type '{spec.get('type')}' "
+                             f"(choose from: {', '.join(RULE_TYPES)})")
+        rules.append(compiler(dict(spec, name=spec.get("name") or spec["type"])))
+    return rules
+
+
+def load_rules(path: str = ALERT_RULES_PATH) -> List[Rule]:
+    """Compiled rules from the rules file, or DEFAULT_RULES if it is unusable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return compile_rules(json.load(f)["rules"])
+    except Exception as e:
+        print(f"[X] Alert rules in {path} not loaded, using the defaults: {e}")
+        return compile_rules(DEFAULT_RULES)
+
+
+# ============================================================
+# ENGINE
+# ============================================================
+
+class AlertBatch:
+    """Results of the running cycle waiting for rule evaluation (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results: List[Tuple[Dict, Dict, str]] = []
+
+    def add(self, item: Dict, data: Dict, observed_at: Optional[float] = None):
+        """Queue a result; observed_at is the epoch time its history row was stamped with"""
+        timestamp = time.strftime(TIME_FORMAT, time.localtime(observed_at or time.time()))
+        with self._lock:
+            self._results.append((item, data, timestamp))
+
+    def drain(self) -> List[Tuple[Dict, Dict, str]]:
+        with self._lock:
+            results, self._results = self._results, []
+        return results
+
+
+pending = AlertBatch()
+
+
+class RuleEngine:
+    """Evaluate every rule over a whole batch of results at once
+
+    The batch is joined with the rollups into one column per input
+    (price, target, 30-day average, all-time low, previous stock state,
+    competitor price ...), then each rule is a handful of array operations
+    over those columns. Reading the inputs out of the result and rollup
+    dicts is one pass over the batch; the window averages and every rule
+    are array operations, whatever the number of rules and windows.
+    """
+
+    def __init__(self, rules: Optional[List[Rule]] = None, rollups: Optional[RollupStore] = None):
+        self.rules = load_rules() if rules is None else rules
+        self.windows = sorted({days for rule in self.rules for days in rule.windows})
+        self.rollups = rollups or RollupStore(days=max([MIN_ROLLUP_DAYS] + self.windows))
+
+    def columns(self, batch: List[Tuple[Dict, Dict, str]]) -> Dict[str, "np.ndarray"]:
+        import numpy as np
+        from scraper.marketplaces import product_key
+        from scraper.products_manager import ProductsManager
+
+        # Gather the inputs of every row from the batch and its rollups;
+        # everything computed from them is done on whole columns
+        n = len(batch)
+        rollups = [self.rollups.get(ProductsManager.key(item)) or _NO_ROLLUP
+                   for item, _, _ in batch]
+        cols = {
+            # None becomes NaN in a float array
+            "price": np.array([data.get("price") for _, data, _ in batch], dtype=float),
+            "target": np.array([item.get("target_price") for item, _, _ in batch], dtype=float),
+            "stock_alert": np.array([bool(item.get("stock_alert", False))
+                                     for item, _, _ in batch], dtype=bool),
+            "state": np.array([data.get("stock_state") or 0 for _, data, _ in batch],
+                              dtype=np.int8),
+            "prev_state": np.array([rollup["state"] for rollup in rollups], dtype=np.int8),
+            "low": np.array([rollup["low"] for rollup in rollups], dtype=float),
+            "count": np.array([rollup["count"] for rollup in rollups], dtype=np.int64),
+        }
+
+        # Window averages: the daily buckets of the whole batch as flat
+        # columns, summed per row with one bincount per window
+        if self.windows:
+            rows = np.array([i for i, rollup in enumerate(rollups) for _ in rollup["days"]],
+                            dtype=np.int64)
+            days = np.array([day for rollup in rollups for day in rollup["days"]], dtype="U10")
+            sums = np.array([bucket[0] for rollup in rollups
+                             for bucket in rollup["days"].values()], dtype=float)
+            counts = np.array([bucket[1] for rollup in rollups
+                               for bucket in rollup["days"].values()], dtype=np.int64)
+            today = time.strftime("%Y-%m-%d")
+            for window in self.windows:
+                recent = days > _days_before(today, window)
+                total = np.bincount(rows[recent], weights=sums[recent], minlength=n)
+                points = np.bincount(rows[recent], weights=counts[recent],
+                                     minlength=n).astype(np.int64)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    cols[f"avg_{window}"] = np.where(points > 0, total / points, np.nan)
+                cols[f"points_{window}"] = points
+
+        # A competitor scraped in the same batch is compared at its new price
+        current = {ProductsManager.key(item): data.get("price") for item, data, _ in batch}
+        competitors, competitor_prices = [], []
+        for item, _, _ in batch:
+            competitor = item.get("competitor") or None
+            price = None
+            if competitor:
+                if "@" in competitor:
+                    competitor = product_key(*competitor.split("@", 1))
+                price = current.get(competitor)
+                if price is None:
+                    price = (self.rollups.get(competitor) or {}).get("price")
+            competitors.append(competitor)
+            competitor_prices.append(price)
+        cols["competitor"] = np.array(competitor_prices, dtype=float)
+        cols["competitor_key"] = np.array(competitors, dtype=object)
+
+        cols["buyable"] = np.isin(cols["state"], _BUYABLE)
+        cols["was_buyable"] = np.isin(cols["prev_state"], _BUYABLE)
+        return cols
+
+    def evaluate(self, batch: List[Tuple[Dict, Dict, str]]
+                 ) -> Tuple[Dict[str, "np.ndarray"], Dict[int, List[Rule]]]:
+        """The joined columns, and batch row -> rules that fired for it in rule order"""
+        import numpy as np
+
+        cols = self.columns(batch)
+        fired: Dict[int, List[Rule]] = defaultdict(list)
+        with np.errstate(invalid="ignore"):
+            for rule in self.rules:
+                for i in np.flatnonzero(rule.test(cols)):
+                    fired[int(i)].append(rule)
+        return cols, fired
+
+    def run(self, batch: List[Tuple[Dict, Dict, str]], settings=None) -> int:
+        """Evaluate, send the alerts, fold the batch into the rollups; returns alerts sent
+
+        Alerts go out with the channel settings of settings (a Settings
+        snapshot; default: the current one).
+        """
+        if not batch:
+            return 0
+        from alerts.unified_alerts import AlertManager
+
+        self.rollups.load(until=min(timestamp for _, _, timestamp in batch))
+        cols, fired = self.evaluate(batch)
+        alerts = AlertManager(settings) if fired else None
+        sent = 0
+        for i in sorted(fired):
+            item, data, _ = batch[i]
+            sent += _send(alerts, item, data, fired[i], cols, i)
+
+        from scraper.products_manager import ProductsManager
+
+        for item, data, timestamp in batch:
+            self.rollups.fold(ProductsManager.key(item), timestamp, data.get("price"),
+                              data.get("stock_state") or 0)
+        self.rollups.save()
+
+        names = ", ".join(rule.name for rule in self.rules)
+        print(f"[i] Alert rules: {len(batch)} results, {sent} alerts sent (rules: {names})")
+        return sent
+
+
+def _send(alerts, item: Dict, data: Dict, rules: List[Rule], cols: Dict[str, "np.ndarray"],
+          i: int) -> int:
+    """Send one price and/or one stock alert for the rules fired on a result"""
+    from scraper.products_manager import ProductsManager
+
+    key = ProductsManager.key(item)
+    channels = item.get("alert_channels", ["email"])
+    sent = 0
+
+    price_rules = [rule for rule in rules if rule.kind == "price"]
+    if price_rules:
+        described = [rule.describe(cols, i) for rule in price_rules]
+        reasons = "; ".join(reason for reason, _, _ in described)
+        _, label, reference = described[0]
+        print(f"   [!] PRICE ALERT! {key}: {reasons}")
+        message = data
+        # A plain target hit keeps the classic "Price Drop Alert" wording
+        if [rule.type for rule in price_rules] != ["target_price"]:
+            message = dict(data, alert_reason=f"Price Alert ({reasons})", alert_reference=label)
+        alerts.send_all_alerts(message, target_price=reference, stock_alert=False,
+                               channels=channels)
+        sent += 1
+
+    stock_rules = [rule for rule in rules if rule.kind == "stock"]
+    if stock_rules:
+        reasons = "; ".join(rule.describe(cols, i)[0] for rule in stock_rules)
+        print(f"   [!] STOCK ALERT! {key}: {reasons}")
+        alerts.send_all_alerts(data, stock_alert=True, channels=channels)
+        sent += 1
+    return sent
+
+
+_engine: Optional[RuleEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> RuleEngine:
+    """Process-wide engine; rules are compiled on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RuleEngine()
+        return _engine
+
+
+def send_cycle_alerts(settings=None) -> int:
+    """Evaluate the rules over the results collected since the last call
+
+    settings: the Settings snapshot of the cycle (default: the current one).
+    """
+    from scraper.profiling import region
+
+    batch = pending.drain()
+    if not batch:
+        return 0
+    try:
+        with region("alerts.rules"):
+            return get_engine().run(batch, settings)
+    except Exception as e:
+        print(f"[X] Alert rules failed for {len(batch)} results: {e}")
+        return 0
@@ -1,26 +1,48 @@
 # alerts/unified_alerts.py
 
-import smtplib
-import requests
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, List
-import config
+from typing import Dict, List, Optional
+
+from settings import Settings, get_settings
+
+# Channel SDKs (smtplib, requests, twilio) are imported on first use so that
+# importing this module stays cheap for commands that never send alerts.
+
+
+def _price_wording(data: Dict):
+    """Headline and reference-price label of a price alert
+
+    Rule alerts (see alerts/rules.py) say which rule fired and what the
+    price was compared with; a plain target hit reads as before.
+    """
+    return (data.get("alert_reason") or "Price Drop Alert",
+            data.get("alert_reference") or "Target Price")
 
 
 class AlertManager:
-    """Unified alert system for all notification channels"""
+    """Unified alert system for all notification channels
+
+    Sends with the channel settings of the snapshot it was created with
+    (default: the current one).
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.channels = self.settings.alerts
 
-    @staticmethod
-    def send_email(data: Dict, target_price: float = None, stock_alert: bool = False):
+    def send_email(self, data: Dict, target_price: float = None, stock_alert: bool = False):
         """Send email alert"""
-        if not config.EMAIL_ENABLED:
+        email = self.channels.email
+        if not email.enabled:
             return
 
         try:
+            import smtplib
+            from email.mime.text import MIMEText
+            from email.mime.multipart import MIMEMultipart
+
             msg = MIMEMultipart()
-            msg["From"] = config.GMAIL_USERNAME
-            msg["To"] = config.RECEIVER_EMAIL
+            msg["From"] = email.username
+            msg["To"] = email.receiver
 
             if stock_alert:
                 msg["Subject"] = f"Stock Alert: {data['title'][:50]}"
@@ -35,14 +57,15 @@ Current Price: {data['price_raw']}
 View on Amazon: {data['url']}
 """
             else:
-                msg["Subject"] = f"Price Drop Alert: {data['title'][:50]}"
+                headline, reference = _price_wording(data)
+                msg["Subject"] = f"{headline}: {data['title'][:50]}"
                 body = f"""
-Price Drop Alert!
+{headline}!
 
 Product: {data['title']}
 ASIN: {data['asin']}
 Current Price: ${data['price']:.2f}
-Target Price: ${target_price:.2f}
+{reference}: ${target_price:.2f}
 You Save: ${target_price - data['price']:.2f}
 
 Stock Status: {data['stock']}
@@ -55,47 +78,49 @@ View on Amazon: {data['url']}
             msg.attach(MIMEText(body, "plain"))
 
             with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-                server.login(config.GMAIL_USERNAME, config.GMAIL_APP_PASSWORD)
+                server.login(email.username, email.app_password)
                 server.send_message(msg)
 
             print("[OK] Email alert sent")
         except Exception as e:
             print(f"[!] Email alert failed: {e}")
 
-    @staticmethod
-    def send_sms(data: Dict, target_price: float = None, stock_alert: bool = False):
+    def send_sms(self, data: Dict, target_price: float = None, stock_alert: bool = False):
         """Send SMS via Twilio"""
-        if not config.SMS_ENABLED:
+        sms = self.channels.sms
+        if not sms.enabled:
             return
 
         try:
             from twilio.rest import Client
 
-            client = Client(config.TWILIO_ACCOUNT_SID,
-                            config.TWILIO_AUTH_TOKEN)
+            client = Client(sms.account_sid, sms.auth_token)
 
             if stock_alert:
                 message_body = f"Stock Alert: {data['title'][:40]} is now {data['stock']}!"
             else:
-                message_body = f"Price Drop: {data['title'][:40]} is now ${data['price']:.2f} (target: ${target_price:.2f})"
+                headline, reference = _price_wording(data)
+                message_body = f"{headline}: {data['title'][:40]} is now ${data['price']:.2f} ({reference.lower()}: ${target_price:.2f})"
 
             message = client.messages.create(
                 body=message_body,
-                from_=config.TWILIO_PHONE_NUMBER,
-                to=config.RECEIVER_PHONE_NUMBER
+                from_=sms.from_number,
+                to=sms.to_number
             )
 
             print(f"[OK] SMS alert sent (SID: {message.sid})")
         except Exception as e:
             print(f"[!] SMS alert failed: {e}")
 
-    @staticmethod
-    def send_telegram(data: Dict, target_price: float = None, stock_alert: bool = False):
+    def send_telegram(self, data: Dict, target_price: float = None, stock_alert: bool = False):
         """Send Telegram message"""
-        if not config.TELEGRAM_ENABLED:
+        telegram = self.channels.telegram
+        if not telegram.enabled:
             return
 
         try:
+            import requests
+
             if stock_alert:
                 text = f"""
 Stock Alert
@@ -108,13 +133,14 @@ Price: {data['price_raw']}
 View on Amazon: {data['url']}
 """
             else:
+                headline, reference = _price_wording(data)
                 text = f"""
-Price Drop Alert!
+{headline}!
 
 Product: {data['title'][:100]}
 ASIN: {data['asin']}
 Current: ${data['price']:.2f}
-Target: ${target_price:.2f}
+{reference}: ${target_price:.2f}
 You Save: ${target_price - data['price']:.2f}
 Stock: {data['stock']}
 Rating: {data['rating_raw']}
@@ -122,9 +148,9 @@ Rating: {data['rating_raw']}
 View on Amazon: {data['url']}
 """
 
-            url = f"https://api.telegram.org/bot{config.TELEGRAM_BOT_TOKEN}/sendMessage"
+            url = f"https://api.telegram.org/bot{telegram.bot_token}/sendMessage"
             payload = {
-                "chat_id": config.TELEGRAM_CHAT_ID,
+                "chat_id": telegram.chat_id,
                 "text": text,
             }
 
@@ -135,13 +161,14 @@ View on Amazon: {data['url']}
         except Exception as e:
             print(f"[!] Telegram alert failed: {e}")
 
-    @staticmethod
-    def send_discord(data: Dict, target_price: float = None, stock_alert: bool = False):
+    def send_discord(self, data: Dict, target_price: float = None, stock_alert: bool = False):
         """Send Discord webhook message"""
-        if not config.DISCORD_ENABLED:
+        if not self.channels.discord.enabled:
             return
 
         try:
+            import requests
+
             if stock_alert:
                 embed = {
                     "title": "Stock Alert",
@@ -158,8 +185,9 @@ View on Amazon: {data['url']}
                     "url": data['url']
                 }
             else:
+                headline, reference = _price_wording(data)
                 embed = {
-                    "title": "Price Drop Alert!",
+                    "title": f"{headline}!",
                     "description": data['title'][:200],
                     "color": 65280,
                     "fields": [
@@ -167,7 +195,7 @@ View on Amazon: {data['url']}
                             "value": data['asin'], "inline": True},
                         {"name": "Current Price",
                             "value": f"${data['price']:.2f}", "inline": True},
-                        {"name": "Target Price",
+                        {"name": reference,
                             "value": f"${target_price:.2f}", "inline": True},
                         {"name": "You Save",
                             "value": f"${target_price - data['price']:.2f}", "inline": True},
@@ -182,25 +210,27 @@ View on Amazon: {data['url']}
             payload = {"embeds": [embed]}
 
             response = requests.post(
-                config.DISCORD_WEBHOOK_URL, json=payload, timeout=10)
+                self.channels.discord.url, json=payload, timeout=10)
             response.raise_for_status()
 
             print("[OK] Discord alert sent")
         except Exception as e:
             print(f"[!] Discord alert failed: {e}")
 
-    @staticmethod
-    def send_slack(data: Dict, target_price: float = None, stock_alert: bool = False):
+    def send_slack(self, data: Dict, target_price: float = None, stock_alert: bool = False):
         """Send Slack webhook message"""
-        if not config.SLACK_ENABLED:
+        if not self.channels.slack.enabled:
             return
 
         try:
+            import requests
+
             if stock_alert:
                 text = f"*Stock Alert*\n{data['title'][:100]}\nStock: *{data['stock']}*"
                 color = "#0000FF"
             else:
-                text = f"*Price Drop Alert!*\n{data['title'][:100]}\nCurrent: ${data['price']:.2f} | Target: ${target_price:.2f}"
+                headline, reference = _price_wording(data)
+                text = f"*{headline}!*\n{data['title'][:100]}\nCurrent: ${data['price']:.2f} | {reference}: ${target_price:.2f}"
                 color = "#00FF00"
 
             payload = {
@@ -226,30 +256,32 @@ View on Amazon: {data['url']}
             }
 
             response = requests.post(
-                config.SLACK_WEBHOOK_URL, json=payload, timeout=10)
+                self.channels.slack.url, json=payload, timeout=10)
             response.raise_for_status()
 
             print("[OK] Slack alert sent")
         except Exception as e:
             print(f"[!] Slack alert failed: {e}")
 
-    @staticmethod
-    def send_push(data: Dict, target_price: float = None, stock_alert: bool = False):
+    def send_push(self, data: Dict, target_price: float = None, stock_alert: bool = False):
         """Send push notification via Pushover"""
-        if not config.PUSH_ENABLED:
+        push = self.channels.push
+        if not push.enabled:
             return
 
         try:
+            import requests
+
             if stock_alert:
                 title = "Stock Alert"
                 message = f"{data['title'][:100]}\nStock: {data['stock']}"
             else:
-                title = "Price Drop Alert"
-                message = f"{data['title'][:100]}\nNow: ${data['price']:.2f} (Target: ${target_price:.2f})"
+                title, reference = _price_wording(data)
+                message = f"{data['title'][:100]}\nNow: ${data['price']:.2f} ({reference}: ${target_price:.2f})"
 
             payload = {
-                "token": config.PUSHOVER_API_TOKEN,
-                "user": config.PUSHOVER_USER_KEY,
+                "token": push.api_token,
+                "user": push.user_key,
                 "title": title,
                 "message": message,
                 "url": data['url'],
@@ -264,25 +296,27 @@ View on Amazon: {data['url']}
         except Exception as e:
             print(f"[!] Push notification failed: {e}")
 
-    @classmethod
-    def send_all_alerts(cls, data: Dict, target_price: float = None,
+    def send_all_alerts(self, data: Dict, target_price: float = None,
                         stock_alert: bool = False, channels: List[str] = None):
         """Send alerts to specified channels"""
+        from scraper.profiling import region
+
         if channels is None:
             channels = ["email"]
 
         channel_map = {
-            "email": cls.send_email,
-            "sms": cls.send_sms,
-            "telegram": cls.send_telegram,
-            "discord": cls.send_discord,
-            "slack": cls.send_slack,
-            "push": cls.send_push,
+            "email": self.send_email,
+            "sms": self.send_sms,
+            "telegram": self.send_telegram,
+            "discord": self.send_discord,
+            "slack": self.send_slack,
+            "push": self.send_push,
         }
 
         for channel in channels:
             if channel in channel_map:
-                channel_map[channel](data, target_price, stock_alert)
+                with region(f"alerts.{channel}"):
+                    channel_map[channel](data, target_price, stock_alert)
 
 
 # Test the alerts if run directly
@@ -300,5 +334,5 @@ if __name__ == "__main__":
     }
 
     print("Testing alert system...")
-    AlertManager.send_all_alerts(
+    AlertManager().send_all_alerts(
         test_data, target_price=29.99, channels=["email"])
@@ -0,0 +1,125 @@
+# benchmarks/import_time.py
+"""Import-time regression guard for the CLI entry point.
+
+Runs one-shot commands under ``python -X importtime`` in a scratch
+directory and fails if a heavy module sneaks into their import graph or
+the total import time exceeds the budget.
+
+Usage:
+    python benchmarks/import_time.py [--budget-ms 150] [--repeat 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MAIN_PY = os.path.join(ROOT_DIR, "main.py")
+
+# Modules that one-shot commands must never import
+FORBIDDEN = {
+    "tls_client",
+    "lxml",
+    "schedule",
+    "requests",
+    "dotenv",
+    "twilio",
+    "pandas",
+    "smtplib",
+}
+
+COMMANDS = {
+    "list": ["--list"],
+    "export-csv": ["--export-csv", "export.csv"],
+}
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Map top-level module name -> cumulative import time in microseconds"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, _, rest = line.partition(":")
+        parts = rest.split("|")
+        if len(parts) != 3:
+            continue
+        # Nested imports are indented; only top-level entries are summed
+        name = parts[2][1:]
+        if name.startswith(" "):
+            continue
+        modules[name] = int(parts[1])
+    return modules
+
+
+def imported_modules(stderr: str) -> set:
+    """Every module (including nested imports) reported by -X importtime"""
+    names = set()
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            names.add(line.rsplit("|", 1)[-1].strip())
+    return names
+
+
+def measure(args: list, workdir: str) -> tuple:
+    """Run main.py once and return (total cumulative us, imported module set)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", MAIN_PY] + args,
+        cwd=workdir,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"main.py {' '.join(args)} failed:\n{result.stderr}")
+
+    top_level = parse_importtime(result.stderr)
+    return sum(top_level.values()), imported_modules(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=150.0,
+                        help="Maximum best-of-N import time per command")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Runs per command; the fastest one is reported")
+    args = parser.parse_args()
+
+    failures = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, cmd in COMMANDS.items():
+            timings = []
+            modules = set()
+            for _ in range(args.repeat):
+                total_us, modules = measure(cmd, workdir)
+                timings.append(total_us)
+
+            best_ms = min(timings) / 1000
+            leaked = sorted(
+                m for m in modules if m.split(".")[0] in FORBIDDEN)
+
+            status = "OK"
+            if leaked:
+                status = "FAIL"
+                failures.append(f"{label}: imports {', '.join(leaked)}")
+            if best_ms > args.budget_ms:
+                status = "FAIL"
+                failures.append(
+                    f"{label}: {best_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+
+            print(f"[{status}] {label:12} {best_ms:8.1f} ms  ({len(modules)} modules)")
+
+    if failures:
+        print("\n[X] Import-time regressions:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+
+    print("\n[OK] Import time within budget")
+
+
+if __name__ == "__main__":
+    main()
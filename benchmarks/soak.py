@@ -0,0 +1,200 @@
+# benchmarks/soak.py
+"""Soak test for the long-running scrape loop.
+
+Runs thousands of full scrape cycles in one process against a local
+stand-in for Amazon (an HTTP server serving large product pages, half of
+them without embedded price data so the lxml path runs too) and fails if
+RSS keeps growing after the warm-up cycles.
+
+Sessions, trees and managers are created exactly as in ``main.py --loop``;
+only the network target and the politeness delays are replaced.
+
+Usage:
+    python benchmarks/soak.py [--cycles 2000] [--products 4] [--page-kb 1024]
+                              [--warmup 100] [--max-growth-mb 8]
+"""
+
+import argparse
+import contextlib
+import gzip
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PRICE_DATA = ('<div class="twister-plus-buying-options-price-data">'
+              '{"desktop_buybox_group_1":[{"displayPrice":"$24.99","priceAmount":24.99}]}</div>')
+
+
+def product_page(asin: str, page_kb: int, embedded: bool) -> bytes:
+    """A product page padded to page_kb with filler markup"""
+    filler = '<div class="a-row"><span class="a-size-base">filler text</span></div>\n'
+    body = [
+        "<html><head><title>Amazon.com</title></head><body>",
+        f'<span id="productTitle"> Soak test product {asin} </span>',
+        '<div id="corePriceDisplay_desktop_feature_div">'
+        '<span class="a-offscreen">$29.99</span><span class="a-offscreen">$24.99</span></div>',
+        '<div id="availability"><span> In Stock </span></div>',
+        '<span data-hook="rating-out-of-text">4.5 out of 5</span>',
+        '<span id="acrCustomerReviewText">1,234 ratings</span>',
+        PRICE_DATA if embedded else "",
+        filler * (page_kb * 1024 // len(filler)),
+        "</body></html>",
+    ]
+    return gzip.compress("".join(body).encode())
+
+
+def start_server(asins, page_kb: int) -> ThreadingHTTPServer:
+    """Serve /dp/<asin> pages and an empty home page on a free local port"""
+    pages = {f"/dp/{asin}": product_page(asin, page_kb, embedded=idx % 2 == 0)
+             for idx, asin in enumerate(asins)}
+    home = gzip.compress(b"<html><body>home</body></html>")
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out as separate writes; without this every
+        # response waits for a delayed ACK
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            body = pages.get(self.path.split("?")[0], home)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Set-Cookie", "session-id=123-4567890")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def install_transport(port: int):
+    """Register a "soak" transport that sends every request to the local server"""
+    from urllib.parse import urlsplit
+
+    from scraper.streaming import StreamingClient
+    from scraper.transports import TRANSPORTS, Transport
+
+    class LocalClient(StreamingClient):
+        def get(self, url, **kwargs):
+            parts = urlsplit(url)
+            local = f"http://127.0.0.1:{port}{parts.path}"
+            if parts.query:
+                local += "?" + parts.query
+            return super().get(local, **kwargs)
+
+    class SoakTransport(Transport):
+        name = "soak"
+
+        def new_client(self, proxy=None):
+            return LocalClient()
+
+    TRANSPORTS["soak"] = SoakTransport()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=2000,
+                        help="Scrape cycles to run (default: 2000)")
+    parser.add_argument("--products", type=int, default=4,
+                        help="Products per cycle (default: 4)")
+    parser.add_argument("--page-kb", type=int, default=1024,
+                        help="Uncompressed size of a product page (default: 1024)")
+    parser.add_argument("--warmup", type=int, default=100,
+                        help="Cycles before the RSS baseline is taken (default: 100)")
+    parser.add_argument("--max-growth-mb", type=float, default=8.0,
+                        help="Allowed RSS growth after warm-up (default: 8)")
+    args = parser.parse_args()
+
+    # Settings are read at import time, so they go in before scraper.*
+    os.environ.update({
+        "FETCH_TRANSPORT": "soak",
+        "FETCH_STRATEGY": "product",
+        "PROXY_ENABLED": "false",
+        "REQUEST_DELAY_MIN": "0",
+        "REQUEST_DELAY_MAX": "0",
+        "MEMORY_RECYCLE_CYCLES": "0",
+        "MEMORY_RECYCLE_MB": "0",
+    })
+    sys.path.insert(0, ROOT_DIR)
+    # The scraper's jitter and retry sleeps would make thousands of cycles
+    # take days; nothing here depends on them
+    time.sleep = lambda seconds: None
+
+    asins = [f"B0SOAK{idx:04d}" for idx in range(args.products)]
+    server = start_server(asins, args.page_kb)
+    install_transport(server.server_address[1])
+
+    from scraper.cycle import scrape_all
+    from scraper.memory import MemoryMonitor, rss_bytes
+    from scraper.products_manager import ProductsManager
+
+    if rss_bytes() is None:
+        print("[X] RSS cannot be measured on this platform")
+        sys.exit(1)
+
+    failures = []
+    devnull = open(os.devnull, "w")
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with contextlib.redirect_stdout(devnull):
+            manager = ProductsManager()
+            for asin in asins:
+                manager.add_product(asin, f"Soak {asin}", alert_channels=["email"])
+
+        monitor = MemoryMonitor("soak", recycle_cycles=0, recycle_mb=0, trace=False)
+        baseline = None
+        started = time.perf_counter()
+
+        for cycle in range(1, args.cycles + 1):
+            with contextlib.redirect_stdout(devnull):
+                scrape_all()
+                monitor.after_cycle()
+
+            rss = rss_bytes() / 1048576
+            if cycle == args.warmup:
+                baseline = rss
+            if cycle % max(1, args.cycles // 10) == 0:
+                print(f"[*] cycle {cycle:>6}  RSS {rss:8.1f} MB")
+
+        elapsed = time.perf_counter() - started
+        os.chdir(ROOT_DIR)
+
+    server.shutdown()
+    devnull.close()
+
+    final = rss_bytes() / 1048576
+    print(f"\n[i] {args.cycles} cycles x {args.products} products in {elapsed:.0f} s "
+          f"({elapsed / args.cycles * 1000:.0f} ms/cycle)")
+    if baseline is None:
+        failures.append(f"fewer cycles ({args.cycles}) than warm-up ({args.warmup})")
+    else:
+        growth = final - baseline
+        status = "OK" if growth <= args.max_growth_mb else "FAIL"
+        print(f"[{status}] RSS {baseline:.1f} MB after warm-up, {final:.1f} MB at the end "
+              f"({growth:+.1f} MB, limit {args.max_growth_mb:.1f} MB)")
+        if status == "FAIL":
+            failures.append(f"RSS grew {growth:.1f} MB after warm-up")
+
+    if failures:
+        print("\n[X] Soak test failed:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+
+    print("\n[OK] Memory stayed flat")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,9 @@
 
 import os
 import sys
+import json
 import subprocess
 from datetime import datetime
-import importlib.util
 
 import pandas as pd
 import streamlit as st
@@ -13,24 +13,14 @@ import plotly.graph_objects as go
 # Get root directory
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
-# Method 1: Add to path
+# streamlit runs this file as a script; make the project importable
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
-# Method 2: Direct import using importlib for config
-config_path = os.path.join(ROOT_DIR, "config.py")
-spec = importlib.util.spec_from_file_location("config", config_path)
-config = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(config)
-
-# Method 3: Direct import for products_manager
-products_manager_path = os.path.join(
-    ROOT_DIR, "scraper", "products_manager.py")
-spec2 = importlib.util.spec_from_file_location(
-    "products_manager", products_manager_path)
-products_manager_module = importlib.util.module_from_spec(spec2)
-spec2.loader.exec_module(products_manager_module)
-ProductsManager = products_manager_module.ProductsManager
+import config
+from scraper.marketplaces import MARKETPLACES
+from scraper.products_manager import ProductsManager
+from settings import SettingsError, get_settings
 
 CSV_PATH = config.CSV_PATH
 
@@ -65,28 +55,169 @@ st.markdown("""
 manager = ProductsManager()
 
 
-def load_data():
-    """Load CSV data"""
+# Rows of history.csv parsed at a time; rows before the selected range
+# are dropped chunk by chunk instead of after reading the whole file
+RAW_CHUNK_ROWS = 200_000
+
+# Columns of the retention tiers (scraper/retention.py) -> load_data() columns
+TIER_COLUMNS = {
+    "daily": (config.HISTORY_DAILY_PATH,
+              {"day": "timestamp", "close": "price", "low": "price_min", "high": "price_max"}),
+    "hourly": (config.HISTORY_HOURLY_PATH,
+               {"hour": "timestamp", "price_last": "price", "price_min": "price_min",
+                "price_max": "price_max"}),
+}
+
+
+def load_tiers(since=None):
+    """Hourly and daily rows the retention job folded the older history into
+
+    Only the tiers covering the range from since (a "YYYY-MM-DD HH:MM:SS"
+    string, None for everything) are read.
+    """
+    from scraper.retention import tiers_for_range
+
+    frames = []
+    for tier in tiers_for_range(since):
+        if tier not in TIER_COLUMNS or not os.path.isfile(TIER_COLUMNS[tier][0]):
+            continue
+        path, columns = TIER_COLUMNS[tier]
+        df = pd.read_csv(
+            path, usecols=list(columns) + ["asin", "marketplace", "stock", "rating", "reviews"],
+            dtype={"asin": "string", "marketplace": "string", "stock": "string"})
+        df = df.rename(columns=columns)
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        if since:
+            df = df[df["timestamp"] >= pd.Timestamp(since)]
+        frames.append(df)
+    return frames
+
+
+def load_data(since=None):
+    """Load CSV data, from since on if given
+
+    Only compact columns are materialized: ASIN and stock as categoricals,
+    numeric rating/reviews. Legacy files have their text columns parsed to
+    numbers on load; title and url come from the product metadata table.
+    Periods compacted by the retention job come from the hourly/daily
+    tiers, with their last price as price and their extremes in
+    price_min/price_max. Raw rows before since are dropped while reading;
+    only their last rating/reviews per product are kept, for the delta
+    rows of the range to be filled from.
+    """
     if not os.path.isfile(CSV_PATH):
         return pd.DataFrame()
     try:
-        df = pd.read_csv(CSV_PATH)
+        header = pd.read_csv(CSV_PATH, nrows=0).columns
+        legacy = "rating" not in header
+        usecols = ["timestamp", "asin", "price_raw", "price", "stock"]
+        if "marketplace" in header:
+            usecols.append("marketplace")
+        usecols += ["rating_raw", "reviews_raw"] if legacy else ["rating", "reviews"]
+
+        dtype = {"asin": "category", "marketplace": "category", "stock": "category",
+                 "price_raw": "category", "price": "float64"}
+        if legacy:
+            dtype.update({"rating_raw": "string", "reviews_raw": "string"})
+
+        groups = ["asin", "marketplace"]
+        fill = ["rating_raw", "reviews_raw"] if legacy else ["rating", "reviews"]
+        start = pd.Timestamp(since) if since else None
+        parts, carried = [], None
+        for chunk in pd.read_csv(CSV_PATH, usecols=usecols, dtype=dtype,
+                                 chunksize=RAW_CHUNK_ROWS):
+            chunk["timestamp"] = pd.to_datetime(chunk["timestamp"])
+            if "marketplace" not in chunk.columns:
+                chunk["marketplace"] = "com"
+            if start is not None:
+                older = chunk["timestamp"] < start
+                if older.any():
+                    # last() is the last non-empty value, what ffill would carry
+                    last = chunk[older].groupby(groups, observed=True)[fill].last()
+                    carried = last if carried is None else \
+                        pd.concat([carried, last]).groupby(level=[0, 1]).last()
+                    chunk = chunk[~older]
+            parts.append(chunk)
+
+        df = pd.concat(parts, ignore_index=True) if parts else \
+            pd.DataFrame(columns=usecols + (["marketplace"] if "marketplace" not in usecols else []))
         df["timestamp"] = pd.to_datetime(df["timestamp"])
+        df["seed"] = False
+        if carried is not None:
+            seeds = carried.reset_index()
+            seeds["seed"] = True
+            df = pd.concat([seeds, df], ignore_index=True)[df.columns]
+        for column in ("asin", "marketplace", "stock", "price_raw"):
+            df[column] = df[column].astype("category")
+
+        if legacy:
+            df["rating_raw"] = df.groupby(groups, observed=True)["rating_raw"].ffill()
+            df["reviews_raw"] = df.groupby(groups, observed=True)["reviews_raw"].ffill()
+            df["rating"] = pd.to_numeric(
+                df["rating_raw"].str.extract(r"(\d+(?:[.,]\d+)?)")[0].str.replace(",", "."),
+                errors="coerce")
+            df["reviews"] = pd.to_numeric(
+                df["reviews_raw"].str.replace(r"\D", "", regex=True), errors="coerce")
+            df = df.drop(columns=["rating_raw", "reviews_raw"])
+
+        # Delta-mode rows leave unchanged fields blank; carry them forward
+        df[["rating", "reviews"]] = df.groupby(
+            groups, observed=True)[["rating", "reviews"]].ffill()
+        df = df[~df["seed"]].drop(columns="seed")
+
+        tiers = load_tiers(since)
+        if tiers:
+            df = pd.concat(tiers + [df], ignore_index=True)
+            for column in ("asin", "marketplace", "stock"):
+                df[column] = df[column].astype("category")
+        df["rating"] = df["rating"].astype("float32")
+        df["reviews"] = df["reviews"].astype("Int32")
         return df
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return pd.DataFrame()
 
 
+def load_meta():
+    """Load product metadata (title, url) keyed by product key"""
+    path = config.PRODUCT_META_PATH
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def legacy_meta(asin):
+    """Title/url from a legacy history file (before metadata was split out)"""
+    if not os.path.isfile(CSV_PATH):
+        return {}
+    header = pd.read_csv(CSV_PATH, nrows=0).columns
+    if "title" not in header:
+        return {}
+    rows = pd.read_csv(CSV_PATH, usecols=["asin", "title", "url"])
+    rows = rows[rows["asin"] == asin].dropna()
+    if rows.empty:
+        return {}
+    return {"title": rows["title"].iloc[-1], "url": rows["url"].iloc[-1]}
+
+
 def calculate_stats(product_df):
     """Calculate price statistics"""
     if product_df.empty or product_df["price"].isna().all():
         return None
     prices = product_df["price"].dropna()
+    # Hourly/daily tier rows carry the extremes of their period
+    lows = product_df["price_min"].fillna(product_df["price"]) \
+        if "price_min" in product_df else prices
+    highs = product_df["price_max"].fillna(product_df["price"]) \
+        if "price_max" in product_df else prices
     return {
         "current": prices.iloc[-1] if len(prices) > 0 else None,
-        "min": prices.min(),
-        "max": prices.max(),
+        "min": lows.min(),
+        "max": highs.max(),
         "avg": prices.mean(),
         "change": prices.iloc[-1] - prices.iloc[0] if len(prices) > 1 else 0,
         "change_pct": ((prices.iloc[-1] - prices.iloc[0]) / prices.iloc[0] * 100) if len(prices) > 1 and prices.iloc[0] > 0 else 0
@@ -126,7 +257,7 @@ with st.sidebar:
             except subprocess.TimeoutExpired:
                 st.error("❌ Scrape timed out (>10 min)")
             except subprocess.CalledProcessError as e:
-                st.error(f"❌ Scrape failed")
+                st.error("❌ Scrape failed")
                 with st.expander("Show error details"):
                     st.code(e.stderr if e.stderr else str(e))
             except Exception as e:
@@ -141,8 +272,10 @@ with st.sidebar:
     st.metric("Total Products", len(products))
     st.metric("Active Products", enabled_count)
 
+    history_files = [CSV_PATH, config.HISTORY_HOURLY_PATH, config.HISTORY_DAILY_PATH]
     if os.path.isfile(CSV_PATH):
-        file_size = os.path.getsize(CSV_PATH) / 1024
+        file_size = sum(os.path.getsize(path) for path in history_files
+                        if os.path.isfile(path)) / 1024
         st.metric("History Size", f"{file_size:.1f} KB")
 
 
@@ -153,7 +286,14 @@ if page == "📊 Dashboard":
     st.markdown('<p class="main-header">📊 Amazon Price Tracker Dashboard</p>',
                 unsafe_allow_html=True)
 
-    df = load_data()
+    history_ranges = {"All history": None, "Last 7 days": 7, "Last 30 days": 30,
+                      "Last 90 days": 90, "Last year": 365}
+    history_range = st.selectbox("🗓️ History Range", options=list(history_ranges.keys()))
+    days = history_ranges[history_range]
+    since = (datetime.now() - pd.Timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S") \
+        if days else None
+
+    df = load_data(since)
     products = manager.load_products()
 
     if not products:
@@ -163,16 +303,20 @@ if page == "📊 Dashboard":
 
     # Product selector
     product_options = {
-        p["asin"]: f"{p['name']} ({p['asin']})" for p in products}
+        ProductsManager.key(p): f"{p['name']} ({p['asin']}, amazon.{p.get('marketplace', 'com')})"
+        for p in products}
 
-    selected_asin = st.selectbox(
+    selected_key = st.selectbox(
         "📦 Select Product",
         options=list(product_options.keys()),
         format_func=lambda x: product_options[x]
     )
 
-    product_info = manager.get_product(selected_asin)
-    product_df = df[df["asin"] == selected_asin].sort_values("timestamp")
+    product_info = manager.get_product(selected_key)
+    product_df = df[
+        (df["asin"] == product_info["asin"])
+        & (df["marketplace"] == product_info.get("marketplace", "com"))
+    ].sort_values("timestamp")
 
     if product_df.empty:
         st.info("No historical data yet. Click 'Scrape All Products' to fetch data.")
@@ -227,6 +371,7 @@ if page == "📊 Dashboard":
                 y=product_df["price"],
                 mode='lines+markers',
                 name='Price',
+                line_shape='hv',
                 line=dict(color='#FF9900', width=3),
                 marker=dict(size=8),
                 hovertemplate='<b>$%{y:.2f}</b><br>%{x}<extra></extra>'
@@ -254,19 +399,29 @@ if page == "📊 Dashboard":
     with col_right:
         st.subheader("📋 Latest Info")
 
-        st.markdown(f"**Product:** {latest['title'][:100]}")
-        st.markdown(f"**💵 Price:** {latest['price_raw']}")
+        meta = load_meta().get(selected_key) or legacy_meta(selected_key)
+
+        st.markdown(
+            f"**Product:** {(meta.get('title') or product_info['name'])[:100]}")
+        # Rows from the retention tiers only have the parsed price
+        if pd.notna(latest['price_raw']):
+            price_text = latest['price_raw']
+        elif pd.notna(latest['price']):
+            price_text = f"{latest['price']:.2f}"
+        else:
+            price_text = "N/A"
+        st.markdown(f"**💵 Price:** {price_text}")
         st.markdown(f"**📦 Stock:** {latest['stock']}")
-        if pd.notna(latest['rating_raw']):
-            st.markdown(f"**⭐ Rating:** {latest['rating_raw']}")
-        if pd.notna(latest['reviews_raw']):
-            st.markdown(f"**💬 Reviews:** {latest['reviews_raw']}")
+        if pd.notna(latest['rating']):
+            st.markdown(f"**⭐ Rating:** {latest['rating']:.1f} out of 5")
+        if pd.notna(latest['reviews']):
+            st.markdown(f"**💬 Reviews:** {latest['reviews']:,} ratings")
         st.markdown(
             f"**🕐 Updated:** {latest['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
 
-        if pd.notna(latest["url"]):
+        if meta.get("url"):
             st.link_button("🔗 View on Amazon",
-                           latest["url"], use_container_width=True)
+                           meta["url"], use_container_width=True)
 
     # Raw data
     with st.expander("📊 View Raw Data"):
@@ -291,8 +446,11 @@ elif page == "➕ Add Product":
                 "ASIN *", help="Amazon Standard Identification Number (10 characters)")
             name = st.text_input(
                 "Product Name *", help="Descriptive name for the product")
-            target_price = st.number_input("Target Price ($)", min_value=0.0, step=0.01, value=0.0,
-                                           help="Get alerts when price drops below this")
+            target_price = st.number_input("Target Price", min_value=0.0, step=0.01, value=0.0,
+                                           help="Get alerts when price drops below this (marketplace currency)")
+            marketplace = st.selectbox(
+                "Marketplace", list(MARKETPLACES.keys()),
+                format_func=lambda code: MARKETPLACES[code].domain)
 
         with col2:
             stock_alert = st.checkbox(
@@ -315,7 +473,8 @@ elif page == "➕ Add Product":
                 st.error("❌ ASIN must be exactly 10 characters!")
             else:
                 price = target_price if target_price > 0 else None
-                if manager.add_product(asin, name, price, stock_alert, alert_channels):
+                if manager.add_product(asin, name, price, stock_alert, alert_channels,
+                                       marketplace=marketplace):
                     st.success(f"✅ Added: {name}")
                     st.balloons()
                     import time
@@ -330,7 +489,7 @@ elif page == "➕ Add Product":
     st.subheader("📁 Bulk Import from CSV")
 
     st.info("""
-    CSV Format: `asin,name,target_price`
+    CSV Format: `asin,name,target_price[,marketplace]`
     
     Example:
     ```
@@ -362,49 +521,112 @@ elif page == "📝 Manage Products":
     st.markdown('<p class="main-header">📝 Manage Products</p>',
                 unsafe_allow_html=True)
 
-    products = manager.load_products()
+    # Search and pagination
+    col_search, col_size = st.columns([3, 1])
+    with col_search:
+        search = st.text_input("🔍 Search by ASIN or name", "")
+    with col_size:
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1)
 
-    if not products:
-        st.info("No products to manage. Add some first!")
+    _, total = manager.search_products(search, 0, 0)
+
+    if total == 0:
+        if search:
+            st.info("No products match your search.")
+        else:
+            st.info("No products to manage. Add some first!")
         st.stop()
 
-    # Search and filter
-    search = st.text_input("🔍 Search products", "")
-
-    filtered = [p for p in products if search.lower(
-    ) in p['name'].lower() or search.lower() in p['asin'].lower()]
-
-    st.write(f"Showing {len(filtered)} of {len(products)} products")
-
-    # Product list
-    for idx, product in enumerate(filtered):
-        with st.expander(f"{'✅' if product.get('enabled', True) else '❌'} {product['name']} ({product['asin']})"):
-            col1, col2, col3 = st.columns([2, 2, 1])
-
-            with col1:
-                st.write(f"**ASIN:** {product['asin']}")
-                st.write(
-                    f"**Target Price:** ${product.get('target_price', 'N/A')}")
-                st.write(
-                    f"**Stock Alert:** {'Yes' if product.get('stock_alert') else 'No'}")
-
-            with col2:
-                st.write(
-                    f"**Channels:** {', '.join(product.get('alert_channels', ['email']))}")
-                st.write(
-                    f"**Status:** {'Enabled' if product.get('enabled', True) else 'Disabled'}")
-                st.write(
-                    f"**Last Checked:** {product.get('last_checked', 'Never')}")
-
-            with col3:
-                if st.button("🔄 Toggle", key=f"toggle_{product['asin']}"):
-                    manager.toggle_product(product['asin'])
-                    st.rerun()
+    page_count = (total + page_size - 1) // page_size
+    page_number = st.number_input(
+        f"Page (1-{page_count})", min_value=1, max_value=page_count, value=1, step=1)
+
+    page_products, total = manager.search_products(
+        search, (page_number - 1) * page_size, page_size)
+
+    st.write(
+        f"Showing {len(page_products)} of {total} matching products (page {page_number}/{page_count})")
+
+    # Editable grid for the current page only
+    grid = pd.DataFrame([{
+        "selected": False,
+        "enabled": p.get("enabled", True),
+        "key": ProductsManager.key(p),
+        "asin": p["asin"],
+        "marketplace": p.get("marketplace", "com"),
+        "name": p["name"],
+        "target_price": p.get("target_price"),
+        "stock_alert": p.get("stock_alert", False),
+        "alert_channels": ", ".join(p.get("alert_channels", ["email"])),
+        "last_checked": p.get("last_checked") or "Never",
+    } for p in page_products])
+
+    edited = st.data_editor(
+        grid,
+        key=f"products_grid_{search}_{page_number}_{page_size}",
+        hide_index=True,
+        use_container_width=True,
+        disabled=["asin", "marketplace", "last_checked"],
+        column_config={
+            "key": None,
+            "selected": st.column_config.CheckboxColumn("Select"),
+            "enabled": st.column_config.CheckboxColumn("Enabled"),
+            "target_price": st.column_config.NumberColumn("Target Price ($)", min_value=0.0, step=0.01, format="$%.2f"),
+            "stock_alert": st.column_config.CheckboxColumn("Stock Alert"),
+        },
+    )
 
-                if st.button("🗑️ Delete", key=f"delete_{product['asin']}"):
-                    manager.delete_product(product['asin'])
-                    st.success("Deleted!")
-                    st.rerun()
+    selected_asins = edited.loc[edited["selected"], "key"].tolist()
+
+    if st.button("💾 Save Changes"):
+        updates = {}
+        for original, row in zip(grid.to_dict("records"), edited.to_dict("records")):
+            fields = {}
+            for column in ("enabled", "name", "stock_alert"):
+                if row[column] != original[column]:
+                    fields[column] = row[column]
+            if not (pd.isna(row["target_price"]) and pd.isna(original["target_price"])) \
+                    and row["target_price"] != original["target_price"]:
+                fields["target_price"] = None if pd.isna(
+                    row["target_price"]) else float(row["target_price"])
+            if row["alert_channels"] != original["alert_channels"]:
+                fields["alert_channels"] = [
+                    c.strip() for c in row["alert_channels"].split(",") if c.strip()]
+            if fields:
+                updates[row["key"]] = fields
+        count = manager.bulk_update(updates)
+        st.success(f"✅ Saved changes to {count} products")
+        st.rerun()
+
+    # Bulk actions on the selected rows
+    st.subheader(f"Bulk Actions ({len(selected_asins)} selected)")
+
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        if st.button("✅ Enable", disabled=not selected_asins, use_container_width=True):
+            manager.bulk_set_enabled(selected_asins, True)
+            st.rerun()
+
+    with col2:
+        if st.button("❌ Disable", disabled=not selected_asins, use_container_width=True):
+            manager.bulk_set_enabled(selected_asins, False)
+            st.rerun()
+
+    with col3:
+        if st.button("🗑️ Delete", disabled=not selected_asins, use_container_width=True):
+            manager.bulk_delete(selected_asins)
+            st.success(f"Deleted {len(selected_asins)} products!")
+            st.rerun()
+
+    with col4:
+        new_target = st.number_input(
+            "New Target Price ($)", min_value=0.0, step=0.01, value=0.0,
+            help="0 clears the target price")
+        if st.button("🎯 Retarget", disabled=not selected_asins, use_container_width=True):
+            manager.bulk_retarget(
+                selected_asins, new_target if new_target > 0 else None)
+            st.rerun()
 
     st.divider()
 
@@ -432,21 +654,22 @@ elif page == "⚙️ Settings":
     st.subheader("🔔 Alert Configuration")
 
     st.info("""
-    Configure your alert channels directly in `config.py`:
+    Configure your alert channels in `.env` (running scrapers pick up
+    changes within seconds, or on `kill -HUP`):
     
     **Example - Enable Email Alerts:**
-    ```python
-    EMAIL_ENABLED = True
-    GMAIL_USERNAME = "your@gmail.com"
-    GMAIL_APP_PASSWORD = "your_app_password"
-    RECEIVER_EMAIL = "receiver@email.com"
+    ```
+    EMAIL_ENABLED=true
+    GMAIL_USERNAME=your@gmail.com
+    GMAIL_APP_PASSWORD=your_app_password
+    RECEIVER_EMAIL=receiver@email.com
     ```
     
     **Example - Enable Telegram:**
-    ```python
-    TELEGRAM_ENABLED = True
-    TELEGRAM_BOT_TOKEN = "your_bot_token"
-    TELEGRAM_CHAT_ID = "your_chat_id"
+    ```
+    TELEGRAM_ENABLED=true
+    TELEGRAM_BOT_TOKEN=your_bot_token
+    TELEGRAM_CHAT_ID=your_chat_id
     ```
     
     **Setup Guides:**
@@ -462,16 +685,22 @@ elif page == "⚙️ Settings":
 
     st.subheader("📊 Current Status")
 
+    try:
+        alerts = get_settings().alerts
+    except SettingsError as e:
+        st.error("❌ Settings are invalid:\n\n" + "\n".join(f"- {p}" for p in e.problems))
+        st.stop()
+
     col1, col2 = st.columns(2)
 
     with col1:
-        st.write("**Email:**", "✅ Enabled" if config.EMAIL_ENABLED else "❌ Disabled")
-        st.write("**SMS:**", "✅ Enabled" if config.SMS_ENABLED else "❌ Disabled")
+        st.write("**Email:**", "✅ Enabled" if alerts.email.enabled else "❌ Disabled")
+        st.write("**SMS:**", "✅ Enabled" if alerts.sms.enabled else "❌ Disabled")
         st.write("**Telegram:**",
-                 "✅ Enabled" if config.TELEGRAM_ENABLED else "❌ Disabled")
+                 "✅ Enabled" if alerts.telegram.enabled else "❌ Disabled")
 
     with col2:
         st.write("**Discord:**",
-                 "✅ Enabled" if config.DISCORD_ENABLED else "❌ Disabled")
-        st.write("**Slack:**", "✅ Enabled" if config.SLACK_ENABLED else "❌ Disabled")
-        st.write("**Push:**", "✅ Enabled" if config.PUSH_ENABLED else "❌ Disabled")
+                 "✅ Enabled" if alerts.discord.enabled else "❌ Disabled")
+        st.write("**Slack:**", "✅ Enabled" if alerts.slack.enabled else "❌ Disabled")
+        st.write("**Push:**", "✅ Enabled" if alerts.push.enabled else "❌ Disabled")
@@ -1,17 +1,17 @@
 # main.py
 
 import argparse
+import os
 import time
 import sys
 import io
-import random
 
-import schedule
-
-from scraper.amazon_scraper import AmazonScraper
+from config import RETENTION_HOURLY_MONTHS, RETENTION_RAW_DAYS
 from scraper.products_manager import ProductsManager
-from scraper.utils import save_to_csv, parse_price_to_float
-from alerts.unified_alerts import AlertManager
+
+# Heavy dependencies (tls_client, lxml, schedule, requests, channel SDKs) are
+# imported inside the commands that need them, so one-shot invocations such
+# as --list or --export-csv start quickly.
 
 # Fix encoding for Windows console
 if sys.platform == 'win32':
@@ -22,91 +22,356 @@ if sys.platform == 'win32':
 
 
 def scrape_all():
-    """Scrape all enabled products"""
-    print("="*50)
-    print("=== Running scrape cycle ===")
-    print("="*50)
+    """Scrape all enabled products (see scraper.cycle)"""
+    from scraper.cycle import scrape_all as run_cycle
+    from scraper.profiling import profile_cycle
+
+    with profile_cycle():
+        run_cycle()
+
+
+def check_settings(reloadable: bool = False):
+    """Validate proxies and alert channels before starting; exits listing every problem
+
+    With reloadable, SIGHUP (or editing .env) reloads them while running.
+    """
+    from settings import SettingsError, get_settings, install_reload_signal
+
+    try:
+        get_settings()
+    except SettingsError as e:
+        for problem in e.problems:
+            print(f"[X] {problem}")
+        sys.exit(1)
+    if reloadable and install_reload_signal():
+        print(f"[i] kill -HUP {os.getpid()} (or editing .env) reloads proxy and alert settings")
+
+
+def cmd_import_csv(args):
+    """Import products from a CSV file"""
+    manager = ProductsManager()
+    count = manager.import_from_csv(args.import_csv)
+    print(f"[OK] Imported {count} products")
+
+
+def cmd_export_csv(args):
+    """Export products to a CSV file"""
+    manager = ProductsManager()
+    if manager.export_to_csv(args.export_csv):
+        print(f"[OK] Exported products to {args.export_csv}")
+
+
+def cmd_list(args):
+    """List all tracked products"""
+    manager = ProductsManager()
+    products = manager.load_products()
+    print(f"\n{'='*80}")
+    print(f"Total Products: {len(products)}")
+    print(f"{'='*80}")
+    for idx, p in enumerate(products, 1):
+        status = "[ENABLED]" if p.get("enabled", True) else "[DISABLED]"
+        print(f"{idx}. {status} {p['name'][:50]}")
+        print(f"   ASIN: {p['asin']} (amazon.{p.get('marketplace', 'com')})")
+        print(f"   Target Price: ${p.get('target_price', 'N/A')}")
+        print(f"   Stock Alert: {p.get('stock_alert', False)}")
+        print(
+            f"   Channels: {', '.join(p.get('alert_channels', ['email']))}")
+        print()
+
+
+def cmd_scrape(args):
+    """Run a single scrape cycle, or keep running on a schedule with --loop"""
+    from scraper.profiling import arm, install_signal_toggle
+
+    if args.profile:
+        arm(args.profile, forever=True)
+
+    check_settings(reloadable=args.loop)
+    if not args.loop:
+        scrape_all()
+        return
+
+    import schedule
+    from scraper.memory import MemoryMonitor, recycle_process
+
+    if install_signal_toggle(args.profile or "sample"):
+        print(f"[i] kill -USR1 {os.getpid()} switches cycle profiling on/off")
+
+    from scraper.retention import start_compactor
+
+    monitor = MemoryMonitor("loop")
+    start_compactor()
+
+    def run_cycle():
+        scrape_all()
+        if monitor.after_cycle():
+            recycle_process()
+
+    schedule.every(args.interval_minutes).minutes.do(run_cycle)
+    print(
+        f"[*] Scheduler started. Interval: {args.interval_minutes} minutes.")
+    print("[*] Press Ctrl+C to stop\n")
+
+    # Run immediately on start
+    run_cycle()
+
+    while True:
+        schedule.run_pending()
+        time.sleep(1)
+
+
+def cmd_history_export(args):
+    """Stream filtered history rows to a CSV, JSONL or Parquet file"""
+    from scraper.history import export_history, normalize_timestamp
+
+    try:
+        since = normalize_timestamp(args.since)
+        until = normalize_timestamp(args.until, end_of_day=True)
+        count = export_history(
+            args.output, fmt=args.format, asins=args.asin, since=since, until=until)
+    except (ValueError, RuntimeError) as e:
+        print(f"[X] {e}")
+        sys.exit(1)
+    print(f"[OK] Exported {count} history rows to {args.output}")
+
+
+def cmd_history_compact(args):
+    """Collapse history into change-only runs"""
+    from scraper.history import compact_history
+
+    stats = compact_history(args.output)
+    print(
+        f"[OK] Compacted {stats['rows_in']} rows into {stats['runs_out']} runs -> {args.output}")
+
+
+def cmd_history_migrate(args):
+    """Rewrite a legacy history file into the normalized schema"""
+    from scraper.history import migrate_history
+
+    count = migrate_history(args.output)
+    print(f"[OK] Migrated {count} rows -> {args.output}")
+    print("[i] Replace data/history.csv with the output once you have checked it "
+          "(the scraper also migrates it itself before its next append, see HISTORY_AUTO_MIGRATE)")
+
+
+def cmd_history_transitions(args):
+    """List stock state changes (in stock -> out of stock, ...) from history"""
+    from scraper.history import iter_stock_transitions, normalize_timestamp
+
+    try:
+        since = normalize_timestamp(args.since)
+        until = normalize_timestamp(args.until, end_of_day=True)
+    except ValueError as e:
+        print(f"[X] {e}")
+        sys.exit(1)
+
+    count = 0
+    for t in iter_stock_transitions(asins=args.asin, since=since, until=until):
+        print(f"{t['timestamp']}  {t['key']:<22} {t['from'].label:>16} -> "
+              f"{t['to'].label:<16} {t['stock'][:40]}")
+        count += 1
+    print(f"[i] {count} stock transitions")
+
+
+def cmd_history_backfill_prices(args):
+    """Re-parse every price_raw in history with the price normalizer"""
+    from scraper.history import backfill_prices
+
+    start = time.time()
+    count = backfill_prices(args.output, default_currency=args.currency)
+    print(
+        f"[OK] Backfilled {count} rows in {time.time() - start:.1f}s -> {args.output}")
+
+
+def cmd_history_retain(args):
+    """Fold aged raw history into the hourly and daily tiers once"""
+    from scraper.retention import run_retention
+
+    if args.raw_days <= 0:
+        print("[X] Set --raw-days or RETENTION_RAW_DAYS to the days of raw history to keep")
+        sys.exit(1)
+    stats = run_retention(args.raw_days, args.hourly_months)
+    print(f"[OK] Folded {stats['raw_rows']} raw rows into hourly and "
+          f"{stats['hourly_rows']} hourly rows into daily")
+
+
+def cmd_coordinator(args):
+    """Queue products for workers and persist their results"""
+    from scraper.retention import start_compactor
+    from scraper.work_queue import run_coordinator
+
+    check_settings(reloadable=True)
+    start_compactor()
+    try:
+        run_coordinator(args.interval_minutes, poll_seconds=args.poll_seconds, once=args.once)
+    except KeyboardInterrupt:
+        print("\n[*] Coordinator stopped")
+
+
+def cmd_worker(args):
+    """Claim queued products, scrape them and report back"""
+    import socket
+    from scraper.work_queue import run_worker
+
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    check_settings(reloadable=True)
+    try:
+        run_worker(worker_id, marketplace=args.marketplace,
+                   poll_seconds=args.poll_seconds, exit_when_idle=args.exit_when_idle)
+    except KeyboardInterrupt:
+        print(f"\n[*] Worker {worker_id} stopped")
+
+
+def cmd_variations_expand(args):
+    """Fetch a tracked product's page and track its variation children"""
+    from scraper.amazon_scraper import AmazonScraper
+    from scraper.health import page_problem
+    from scraper.marketplaces import product_key
+    from scraper.variations import variation_label
+
+    manager = ProductsManager()
+    key = product_key(args.asin, args.marketplace)
+    product = manager.get_product(key)
+    if product is None:
+        print(f"[X] Product {key} is not tracked; add it first")
+        sys.exit(1)
+
+    scraper = AmazonScraper(product["asin"], product.get("marketplace"))
+    data = scraper.parse(scraper.fetch())
+    variations = (data or {}).get("variations")
+    if not variations:
+        print(f"[i] No variation data found on the page of {key}")
+        return
+
+    children = variations["children"]
+    print(f"[OK] {len(children)} variations (parent: {variations['parent_asin'] or 'unknown'})")
+    for asin, child in sorted(children.items()):
+        offer = child["price_raw"] or "-"
+        if child["available"] is False:
+            offer += " (unavailable)"
+        print(f"   {asin}  {variation_label(child['dimensions']):<40} {offer}")
+
+    if args.dry_run:
+        return
+
+    manager.add_variation_children(key, variations)
+    if page_problem(data) == "no_offer" and product.get("enabled", True):
+        # A parent page has no offer of its own; its children carry the prices
+        manager.update_product(key, enabled=False)
+        print(f"[i] Disabled {key}: variation parent without an offer")
+
+
+def cmd_report_staleness(args):
+    """Show how long ago each product was last checked successfully"""
+    from scraper.planner import format_staleness, plan_cycle, product_age, staleness_report
 
     manager = ProductsManager()
     products = manager.get_enabled_products()
+    print(f"[i] {format_staleness(staleness_report(products))}")
+
+    print(f"\n{'='*80}")
+    print(f"{'Product':<30} {'Last checked':<20} {'Age (min)':>10}  Next cycle position")
+    print(f"{'='*80}")
+    for idx, p in enumerate(plan_cycle(products)[:args.top], 1):
+        age = product_age(p) / 60
+        age_text = "never" if age == float("inf") else f"{age:.0f}"
+        print(f"{ProductsManager.key(p)[:30]:<30} {p.get('last_checked') or '-':<20} "
+              f"{age_text:>10}  {idx}")
+
+
+def cmd_report_health(args):
+    """Show failing products and the requests they waste"""
+    from scraper.health import HealthStore
+
+    records = HealthStore().load()
+    failing = sorted(
+        ((key, r) for key, r in records.items() if r.get("wasted_requests")),
+        key=lambda item: item[1]["wasted_requests"], reverse=True)
 
-    if not products:
-        print("[!] No products to track. Add products via dashboard.")
+    if not failing:
+        print("[OK] No failed checks recorded")
         return
 
-    print(f"[*] Tracking {len(products)} products\n")
-
-    for idx, item in enumerate(products, 1):
-        asin = item["asin"]
-        name = item["name"]
-        target_price = item.get("target_price")
-        stock_alert = item.get("stock_alert", False)
-        alert_channels = item.get("alert_channels", ["email"])
-
-        print(f"\n[{idx}/{len(products)}] Checking {name}")
-        print(f"         ASIN: {asin}")
-
-        scraper = AmazonScraper(asin)
-        html_source = scraper.fetch()
-
-        if not html_source:
-            print("   [X] Failed to fetch page")
-            continue
-
-        data = scraper.parse(html_source)
-
-        if not data:
-            print("[X] Amazon returned blocked/invalid data. Skipping save.")
-            continue
-
-        data["price"] = parse_price_to_float(data.get("price_raw"))
-
-        print(f"   Title : {data.get('title', 'N/A')[:80]}")
-        print(f"   Price : {data.get('price')} (raw: {data.get('price_raw')})")
-        print(f"   Stock : {data.get('stock')}")
-
-        # Save to CSV
-        save_to_csv(data)
-
-        # Update last checked time
-        manager.update_product(
-            asin, last_checked=time.strftime("%Y-%m-%d %H:%M:%S"))
-
-        # Check for price alert
-        if target_price is not None and data.get("price") is not None:
-            if data["price"] <= target_price:
-                print(
-                    f"   [!] PRICE ALERT! Below target (${target_price:.2f})")
-                AlertManager.send_all_alerts(
-                    data,
-                    target_price=target_price,
-                    stock_alert=False,
-                    channels=alert_channels
-                )
-            else:
-                print(
-                    f"   [i] Price ${data['price']:.2f} above target ${target_price:.2f}")
-
-        # Check for stock alert
-        if stock_alert and data.get("stock"):
-            stock_lower = data["stock"].lower()
-            if "in stock" in stock_lower or "available" in stock_lower:
-                print(f"   [!] STOCK ALERT! Item is in stock")
-                AlertManager.send_all_alerts(
-                    data,
-                    stock_alert=True,
-                    channels=alert_channels
-                )
-
-        # Add delay between products to avoid rate limiting
-        if idx < len(products):
-            delay = random.uniform(5, 10)
-            print(f"   [*] Waiting {delay:.1f}s before next product...")
-            time.sleep(delay)
-
-    print("\n" + "="*50)
-    print("[OK] Scrape cycle completed")
-    print("="*50)
+    wasted = sum(r["wasted_requests"] for _, r in failing)
+    by_error = {}
+    for _, r in failing:
+        for error, count in r.get("errors", {}).items():
+            by_error[error] = by_error.get(error, 0) + count
+    print(f"[i] {wasted} requests spent on failed checks across {len(failing)} products")
+    print("[i] Failures by error: " + ", ".join(
+        f"{error} {count}" for error, count in sorted(by_error.items(), key=lambda e: -e[1])))
+
+    print(f"\n{'='*100}")
+    print(f"{'Product':<22} {'Wasted':>7} {'Streak':>7}  {'Last error':<18} "
+          f"{'Last success':<20} {'Next check':<20}")
+    print(f"{'='*100}")
+    for key, r in failing[:args.top]:
+        print(f"{key[:22]:<22} {r['wasted_requests']:>7} {r.get('failures', 0):>7}  "
+              f"{(r.get('last_error') or '-')[:18]:<18} {r.get('last_success') or 'never':<20} "
+              f"{r.get('next_check') or 'next cycle':<20}")
+
+
+def cmd_report_selectors(args):
+    """Show each field's selectors in evaluation order with their hit rates"""
+    from scraper.selector_registry import get_registry
+
+    registry = get_registry()
+    selectors = registry.current()
+    print(f"[i] {registry.path} (version {selectors.version})")
+    for name, field in selectors.fields.items():
+        order = "by hit rate" if field.reorder else "fixed order"
+        print(f"\n{name} ({order})")
+        for s in field.selectors:
+            rate = f"{s.hits / s.evals:.0%}" if s.evals else "-"
+            print(f"  {rate:>5} {s.hits:>7}/{s.evals:<7} {s.xpath}")
+
+
+def cmd_report_memory(args):
+    """Show RSS per cycle of the long-running processes"""
+    from scraper.memory import load_memory_snapshots
+
+    snapshots = load_memory_snapshots()
+    if not snapshots:
+        print("[i] No memory snapshots yet (written by --loop and worker)")
+        return
+
+    print(f"\n{'='*80}")
+    print(f"{'Time':<20} {'Process':<10} {'PID':>7} {'Cycle':>6} {'RSS MB':>8} "
+          f"{'Growth':>8} {'Python MB':>10}")
+    print(f"{'='*80}")
+    for s in snapshots[-args.top:]:
+        growth = f"{s['rss_growth_mb']:+.1f}" if s.get("rss_growth_mb") is not None else "-"
+        python_mb = f"{s['python_mb']:.1f}" if s.get("python_mb") is not None else "-"
+        rss = f"{s['rss_mb']:.1f}" if s.get("rss_mb") is not None else "-"
+        print(f"{s['time']:<20} {s['process'][:10]:<10} {s['pid']:>7} {s['cycle']:>6} "
+              f"{rss:>8} {growth:>8} {python_mb:>10}")
+
+    growth = snapshots[-1].get("growth")
+    if growth:
+        print("\n[i] Largest allocation growth since the first cycle:")
+        for site in growth:
+            print(f"   {site['size_kb']:>10.1f} KB  {site['count']:>+8}  {site['site']}")
+
+
+def cmd_report_bandwidth(args):
+    """Show transferred bytes per product and per proxy"""
+    from scraper.bandwidth import load_bandwidth
+
+    stats = load_bandwidth()
+    for section, label in (("by_proxy", "Proxy"), ("by_product", "Product")):
+        rows = sorted(stats.get(section, {}).items(),
+                      key=lambda item: item[1]["wire_bytes"], reverse=True)
+        if section == "by_product":
+            rows = rows[:args.top]
+        print(f"\n{'='*80}")
+        print(f"{label:<30} {'Requests':>9} {'Wire MB':>9} {'KB/req':>8} {'Early':>6} {'Raw':>5}")
+        print(f"{'='*80}")
+        for key, row in rows:
+            per_request = row["wire_bytes"] / max(row["requests"], 1) / 1024
+            print(f"{key[:30]:<30} {row['requests']:>9} {row['wire_bytes'] / 1048576:>9.1f} "
+                  f"{per_request:>8.0f} {row['aborted_early']:>6} {row['uncompressed_responses']:>5}")
+    if not stats.get("by_proxy"):
+        print("[i] No bandwidth recorded yet")
 
 
 def main():
@@ -123,6 +388,14 @@ def main():
         default=30,
         help="Interval in minutes for scheduled scraping (used with --loop).",
     )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="sample",
+        choices=["sample", "cprofile"],
+        help="Profile each scrape cycle into data/profiles/ (default: sample, "
+             "a low-overhead stack sampler; cprofile traces every call).",
+    )
     parser.add_argument(
         "--import-csv",
         type=str,
@@ -139,54 +412,164 @@ def main():
         help="List all tracked products",
     )
 
-    args = parser.parse_args()
-
-    manager = ProductsManager()
-
-    # Handle CSV import
-    if args.import_csv:
-        count = manager.import_from_csv(args.import_csv)
-        print(f"[OK] Imported {count} products")
-        return
-
-    # Handle CSV export
-    if args.export_csv:
-        if manager.export_to_csv(args.export_csv):
-            print(f"[OK] Exported products to {args.export_csv}")
-        return
-
-    # List products
-    if args.list:
-        products = manager.load_products()
-        print(f"\n{'='*80}")
-        print(f"Total Products: {len(products)}")
-        print(f"{'='*80}")
-        for idx, p in enumerate(products, 1):
-            status = "[ENABLED]" if p.get("enabled", True) else "[DISABLED]"
-            print(f"{idx}. {status} {p['name'][:50]}")
-            print(f"   ASIN: {p['asin']}")
-            print(f"   Target Price: ${p.get('target_price', 'N/A')}")
-            print(f"   Stock Alert: {p.get('stock_alert', False)}")
-            print(
-                f"   Channels: {', '.join(p.get('alert_channels', ['email']))}")
-            print()
-        return
+    subparsers = parser.add_subparsers(dest="command")
+
+    history_parser = subparsers.add_parser(
+        "history", help="Export or compact price history")
+    history_sub = history_parser.add_subparsers(
+        dest="history_command", required=True)
+
+    export_parser = history_sub.add_parser(
+        "export", help="Stream history to CSV, JSONL or Parquet")
+    export_parser.add_argument(
+        "--output", "-o", required=True, help="Output file path")
+    export_parser.add_argument(
+        "--format", choices=["csv", "jsonl", "parquet"], default="csv",
+        help="Output format (default: csv)")
+    export_parser.add_argument(
+        "--asin", action="append",
+        help="Only export this ASIN (repeat for several)")
+    export_parser.add_argument(
+        "--since", help="Start date, YYYY-MM-DD[ HH:MM:SS] (inclusive)")
+    export_parser.add_argument(
+        "--until", help="End date, YYYY-MM-DD[ HH:MM:SS] (inclusive)")
+    export_parser.set_defaults(handler=cmd_history_export)
+
+    compact_parser = history_sub.add_parser(
+        "compact", help="Collapse unchanged observations into runs")
+    compact_parser.add_argument(
+        "--output", "-o", default=os.path.join("data", "history_runs.csv"),
+        help="Output file for runs (default: data/history_runs.csv)")
+    compact_parser.set_defaults(handler=cmd_history_compact)
+
+    migrate_parser = history_sub.add_parser(
+        "migrate", help="Move title/url out of legacy history rows")
+    migrate_parser.add_argument(
+        "--output", "-o", default=os.path.join("data", "history_migrated.csv"),
+        help="Output file (default: data/history_migrated.csv)")
+    migrate_parser.set_defaults(handler=cmd_history_migrate)
+
+    transitions_parser = history_sub.add_parser(
+        "transitions", help="Stock state changes per product")
+    transitions_parser.add_argument(
+        "--asin", action="append",
+        help="Only this ASIN (repeat for several)")
+    transitions_parser.add_argument(
+        "--since", help="Start date, YYYY-MM-DD[ HH:MM:SS] (inclusive)")
+    transitions_parser.add_argument(
+        "--until", help="End date, YYYY-MM-DD[ HH:MM:SS] (inclusive)")
+    transitions_parser.set_defaults(handler=cmd_history_transitions)
+
+    backfill_parser = history_sub.add_parser(
+        "backfill-prices", help="Recompute price from price_raw for all rows")
+    backfill_parser.add_argument(
+        "--output", "-o", default=os.path.join("data", "history_backfilled.csv"),
+        help="Output file (default: data/history_backfilled.csv)")
+    backfill_parser.add_argument(
+        "--currency", default="USD",
+        help="Currency assumed for a bare '$' (default: USD)")
+    backfill_parser.set_defaults(handler=cmd_history_backfill_prices)
+
+    retain_parser = history_sub.add_parser(
+        "retain", help="Apply the raw/hourly/daily retention policy now")
+    retain_parser.add_argument(
+        "--raw-days", type=int, default=RETENTION_RAW_DAYS,
+        help="Days of raw rows to keep (default: RETENTION_RAW_DAYS)")
+    retain_parser.add_argument(
+        "--hourly-months", type=int, default=RETENTION_HOURLY_MONTHS,
+        help="Months of hourly rows to keep, 0 = forever (default: RETENTION_HOURLY_MONTHS)")
+    retain_parser.set_defaults(handler=cmd_history_retain)
+
+    coordinator_parser = subparsers.add_parser(
+        "coordinator", help="Queue due products for worker processes")
+    coordinator_parser.add_argument(
+        "--interval-minutes", type=int, default=30,
+        help="Minutes between scrape rounds (default: 30)")
+    coordinator_parser.add_argument(
+        "--poll-seconds", type=float, default=5,
+        help="How often to collect results (default: 5)")
+    coordinator_parser.add_argument(
+        "--once", action="store_true",
+        help="Run a single round and exit when it is finished")
+    coordinator_parser.set_defaults(handler=cmd_coordinator)
+
+    worker_parser = subparsers.add_parser(
+        "worker", help="Scrape products queued by the coordinator")
+    worker_parser.add_argument(
+        "--worker-id", help="Name shown in logs and leases (default: host-pid)")
+    worker_parser.add_argument(
+        "--marketplace", help="Only take products from this marketplace (e.g. de)")
+    worker_parser.add_argument(
+        "--poll-seconds", type=float, default=5,
+        help="Wait between checks of an empty queue (default: 5)")
+    worker_parser.add_argument(
+        "--exit-when-idle", action="store_true",
+        help="Exit once the queue is empty")
+    worker_parser.set_defaults(handler=cmd_worker)
+
+    variations_parser = subparsers.add_parser(
+        "variations", help="Work with variation families (sizes, colors)")
+    variations_sub = variations_parser.add_subparsers(
+        dest="variations_command", required=True)
+
+    expand_parser = variations_sub.add_parser(
+        "expand", help="Track every child of a tracked product's variation family")
+    expand_parser.add_argument("asin", help="ASIN of a tracked product")
+    expand_parser.add_argument(
+        "--marketplace", help="Marketplace of the tracked product (default: com)")
+    expand_parser.add_argument(
+        "--dry-run", action="store_true", help="Only list the children")
+    expand_parser.set_defaults(handler=cmd_variations_expand)
+
+    report_parser = subparsers.add_parser(
+        "report", help="Show scraper statistics")
+    report_sub = report_parser.add_subparsers(
+        dest="report_command", required=True)
+
+    bandwidth_parser = report_sub.add_parser(
+        "bandwidth", help="Bytes transferred per product and per proxy")
+    bandwidth_parser.add_argument(
+        "--top", type=int, default=20,
+        help="Number of products to show (default: 20)")
+    bandwidth_parser.set_defaults(handler=cmd_report_bandwidth)
+
+    staleness_parser = report_sub.add_parser(
+        "staleness", help="Age since last successful check (p50/p99) and next cycle order")
+    staleness_parser.add_argument(
+        "--top", type=int, default=20,
+        help="Number of products to list (default: 20)")
+    staleness_parser.set_defaults(handler=cmd_report_staleness)
+
+    health_parser = report_sub.add_parser(
+        "health", help="Failing products and the request budget they waste")
+    health_parser.add_argument(
+        "--top", type=int, default=20,
+        help="Number of products to list (default: 20)")
+    health_parser.set_defaults(handler=cmd_report_health)
+
+    selectors_parser = report_sub.add_parser(
+        "selectors", help="XPath selector order and hit rates per field")
+    selectors_parser.set_defaults(handler=cmd_report_selectors)
+
+    memory_parser = report_sub.add_parser(
+        "memory", help="RSS per cycle of --loop and worker processes")
+    memory_parser.add_argument(
+        "--top", type=int, default=20,
+        help="Number of recent snapshots to list (default: 20)")
+    memory_parser.set_defaults(handler=cmd_report_memory)
 
-    # Run scraper
-    if args.loop:
-        schedule.every(args.interval_minutes).minutes.do(scrape_all)
-        print(
-            f"[*] Scheduler started. Interval: {args.interval_minutes} minutes.")
-        print("[*] Press Ctrl+C to stop\n")
-
-        # Run immediately on start
-        scrape_all()
+    args = parser.parse_args()
 
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+    if getattr(args, "handler", None):
+        args.handler(args)
+    elif args.import_csv:
+        cmd_import_csv(args)
+    elif args.export_csv:
+        cmd_export_csv(args)
+    elif args.list:
+        cmd_list(args)
     else:
-        scrape_all()
+        cmd_scrape(args)
 
 
 if __name__ == "__main__":
@@ -3,57 +3,224 @@
 import random
 import time
 from lxml import html
-import tls_client
 
-from config import HEADERS_LIST, BASE_URL, RETRY_COUNT, RETRY_BACKOFF
+from config import HEADERS_LIST, RETRY_COUNT, RETRY_BACKOFF
+from settings import Settings, get_settings
+from scraper.bandwidth import meter, proxy_label
+from scraper.embedded import extract_embedded, has_variations, parse_timer
+from scraper.marketplaces import Marketplace, get_marketplace, product_key
+from scraper.prices import CURRENCY_RE, detect_currency, parse_amount
+from scraper.profiling import region
+from scraper.selector_registry import get_selectors
+from scraper.transports import get_transport
+from scraper.utils import parse_rating, parse_review_count
+from scraper.variations import extract_variations
+
+
+BLOCKED_PATTERNS = [
+    "enter the characters you see below",
+    "automated access",
+    "robot check",
+    "sorry, we just need to make sure you're not a robot",
+    "api-services-support@amazon.com",
+]
+
+# At least one of these must appear for a product page to count as valid
+PRODUCT_MARKERS = ["productTitle", "corePrice"]
+
+# Title, price and availability sit above everything else parse() needs
+# except the variation JSON; a streaming fetch stops reading once all of
+# them have arrived. The review count is next to the title when there is
+# one, so it is not waited for: pages without reviews never have it
+STREAM_STOP_MARKERS = ["productTitle", "corePrice", 'id="availability"']
+
+ACCEPT_HTML = "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8"
 
 
 class AmazonScraper:
 
-    def __init__(self, asin):
+    def __init__(self, asin, marketplace=None, settings: Settings = None):
         self.asin = asin
-        self.url = f"https://www.amazon.com/dp/{self.asin}"
+        self.marketplace = get_marketplace(marketplace)
+        # Snapshot used for this scraper's lifetime (default: the current one)
+        self.settings = settings or get_settings()
+        self.url = self.marketplace.product_url(self.asin)
+        # Outcome of the last fetch, for health tracking
+        self.last_error = None
+        self.attempts_used = 0
 
     # ============================================================
-    # FETCH PAGE
+    # SESSION SETUP
     # ============================================================
 
-    def fetch(self):
-        client_ids = [
-            "chrome_120", "chrome_119", "chrome_118",
-            "firefox_120", "safari_ios_16_5"
-        ]
-
-        client = tls_client.Session(
-            client_identifier=random.choice(client_ids),
-            random_tls_extension_order=True
-        )
+    @staticmethod
+    def new_client(transport=None, settings: Settings = None):
+        """Create an HTTP client of the given transport (default: FETCH_TRANSPORT)
+        routed through one of the settings' proxies"""
+        proxy = (settings or get_settings()).proxy.choose()
+        return get_transport(transport).new_client(proxy)
+
+    @staticmethod
+    def record_bandwidth(client, response, product: str):
+        """Account a response's transferred bytes to a product key and the client's proxy"""
+        proxy = getattr(client, "proxy", None) or (getattr(client, "proxies", None) or {}).get("https")
+        encoding = (response.headers.get("content-encoding") or "").lower()
+        compressed = bool(encoding) and encoding != "identity"
+
+        if hasattr(response, "wire_bytes"):
+            wire_bytes, body_bytes = response.wire_bytes, response.body_bytes
+            aborted = response.aborted
+        else:
+            # tls_client hands over the decoded body only
+            body_bytes = len(response.content or b"")
+            length = response.headers.get("content-length")
+            wire_bytes = int(length) if length and length.isdigit() else body_bytes
+            aborted = False
+
+        if not compressed:
+            print("   [!] Response was not compressed")
+        if aborted:
+            print(f"   [i] Stopped reading after {body_bytes // 1024} KB")
+
+        meter.record(product, proxy_label(proxy), wire_bytes, body_bytes, compressed, aborted)
+
+    @staticmethod
+    def warm_up_headers(marketplace: Marketplace) -> dict:
+        return {
+            "user-agent": random.choice(HEADERS_LIST)["user-agent"],
+            "accept": ACCEPT_HTML,
+            "accept-language": marketplace.accept_language,
+            "accept-encoding": "gzip, deflate, br",
+            "connection": "keep-alive",
+            "upgrade-insecure-requests": "1",
+        }
 
-        print("[*] Starting warm-up sequence...")
+    @staticmethod
+    def warm_up(client, marketplace: Marketplace) -> dict:
+        """Visit the marketplace's warm-up pages and return the cookies collected"""
+        print(f"[*] Starting warm-up sequence ({marketplace.domain})...")
 
+        warm_headers = AmazonScraper.warm_up_headers(marketplace)
+        cookies = {}
         try:
-            warm_headers = {
-                "user-agent": random.choice(HEADERS_LIST)["user-agent"],
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                "accept-language": "en-US,en;q=0.9",
-                "accept-encoding": "gzip, deflate, br",
-                "connection": "keep-alive",
-                "upgrade-insecure-requests": "1",
-            }
-
-            warm1 = client.get("https://www.amazon.com/",
-                               headers=warm_headers, timeout_seconds=15)
-            print(f"   [OK] Homepage visited (Status: {warm1.status_code})")
-            time.sleep(random.uniform(2, 4))
-
-            warm2 = client.get("https://www.amazon.com/books-used-books-textbooks/b?node=283155",
-                               headers=warm_headers, timeout_seconds=15)
-            print(f"   [OK] Category visited (Status: {warm2.status_code})")
-
-            warm_cookies = warm2.cookies
+            for idx, path in enumerate(marketplace.warmup_paths):
+                if idx:
+                    with region("sleep"):
+                        time.sleep(random.uniform(2, 4))
+                with region("http"):
+                    response = client.get(marketplace.base_url + path,
+                                          headers=warm_headers, timeout_seconds=15)
+                print(f"   [OK] Visited {path} (Status: {response.status_code})")
+                AmazonScraper.record_bandwidth(client, response, "(warm-up)")
+                cookies.update({c.name: c.value for c in response.cookies})
         except Exception as e:
             print(f"[!] Warm-up failed: {e}")
-            warm_cookies = {}
+
+        return cookies
+
+    @staticmethod
+    def session_cookies(warm_cookies: dict, marketplace: Marketplace) -> dict:
+        """Warm-up cookies plus the locale/session cookies the marketplace expects"""
+        cookies = dict(warm_cookies)
+        cookies["i18n-prefs"] = marketplace.currency
+        cookies[f"lc-{marketplace.cookie_suffix}"] = marketplace.language
+
+        # ensure session cookies exist
+        if "session-id" not in cookies:
+            cookies["session-id"] = f"{marketplace.session_prefix}-{random.randint(1000000, 9999999)}-{random.randint(1000000, 9999999)}"
+        ubid = f"ubid-{marketplace.cookie_suffix}"
+        if ubid not in cookies:
+            cookies[ubid] = f"133-{random.randint(1000000, 9999999)}-{random.randint(1000000, 9999999)}"
+        return cookies
+
+    # ============================================================
+    # FETCH PAGE
+    # ============================================================
+
+    def request_headers(self) -> dict:
+        """Headers for one product/search request, with a random browser identity"""
+        headers = random.choice(HEADERS_LIST).copy()
+        headers.update({
+            "accept": ACCEPT_HTML,
+            "accept-encoding": "gzip, deflate, br",
+            "accept-language": self.marketplace.accept_language,
+            "upgrade-insecure-requests": "1",
+            "referer": self.marketplace.base_url + "/",
+        })
+        return headers
+
+    @staticmethod
+    def failure_reason(status: str, response) -> str:
+        """Error class of a rejected response, for health tracking"""
+        if status == "blocked":
+            return "blocked"
+        if response.status_code != 200:
+            return f"http_{response.status_code}"
+        return "unexpected_page"
+
+    def check_response(self, response, markers) -> str:
+        """Classify a response as valid, blocked (bot check) or unexpected"""
+        print(f"   Status Code: {response.status_code}")
+        text = response.text
+        text_lower = text.lower()
+
+        if any(p in text_lower for p in BLOCKED_PATTERNS + self.marketplace.blocked_patterns):
+            print("   [!] Blocked by Amazon bot check")
+            return "blocked"
+
+        if any(m in text for m in markers):
+            print("   [OK] Valid page received!")
+            return "valid"
+
+        print("   [!] Unexpected page content, retrying...")
+        return "unexpected"
+
+    def fetch(self, session=None, stop_early: bool = True):
+        """Fetch the product page HTML, or None if every attempt failed
+
+        session is a PooledSession from scraper.session_pool; it is already
+        warmed up and is marked broken if Amazon serves a bot check. Without
+        one a fresh client is created and warmed up for this product only.
+        stop_early=False reads the whole page even with a streaming client,
+        for the variation JSON further down.
+        """
+        return self.fetch_url(self.url, PRODUCT_MARKERS, session,
+                              stop_markers=STREAM_STOP_MARKERS if stop_early else None)
+
+    def fetch_url(self, url, markers, session=None, stop_markers=None, product=None):
+        """Fetch any marketplace page, retrying until one of markers appears
+
+        stop_markers lets a streaming client stop reading once they have all
+        been received; other clients always read the whole body. Bytes are
+        accounted to product (default: this scraper's product key).
+        """
+        if product is None:
+            product = product_key(self.asin, self.marketplace.code) if self.asin else "(batch)"
+
+        if session is not None:
+            return self._fetch_with(session.client, session.cookies, url, markers,
+                                    session, stop_markers, product)
+
+        # A client of our own is closed afterwards; tls_client sessions are
+        # native handles that the garbage collector does not release
+        client = self.new_client(settings=self.settings)
+        try:
+            with region("warm_up"):
+                warm_cookies = self.warm_up(client, self.marketplace)
+            return self._fetch_with(client, warm_cookies, url, markers,
+                                    None, stop_markers, product)
+        finally:
+            close = getattr(client, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+    def _fetch_with(self, client, warm_cookies, url, markers, session, stop_markers, product):
+        """The retry loop of fetch_url on an already warmed-up client"""
+        streaming = getattr(client, "streams", False)
+        self.last_error = None
 
         # ============================================================
         # MAIN REQUEST LOOP
@@ -61,63 +228,43 @@ class AmazonScraper:
 
         for attempt in range(1, RETRY_COUNT + 1):
             print(f"\n[*] Attempt {attempt}/{RETRY_COUNT}")
+            self.attempts_used = attempt
 
-            headers = random.choice(HEADERS_LIST).copy()
-            headers.update({
-                "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                "accept-encoding": "gzip, deflate, br",
-                "accept-language": "en-US,en;q=0.9",
-                "upgrade-insecure-requests": "1",
-                "referer": "https://www.amazon.com/",
-            })
-
-            cookies = {c.name: c.value for c in warm_cookies}
-            cookies["i18n-prefs"] = "USD"
-            cookies["lc-main"] = "en_US"
-
-            # ensure session cookies exist
-            if "session-id" not in cookies:
-                cookies["session-id"] = f"142-{random.randint(1000000, 9999999)}-{random.randint(1000000, 9999999)}"
-            if "ubid-main" not in cookies:
-                cookies["ubid-main"] = f"133-{random.randint(1000000, 9999999)}-{random.randint(1000000, 9999999)}"
+            headers = self.request_headers()
+            cookies = self.session_cookies(warm_cookies, self.marketplace)
 
             try:
-                time.sleep(random.uniform(1, 3))
-
-                response = client.get(
-                    self.url,
-                    headers=headers,
-                    cookies=cookies,
-                    timeout_seconds=15,
-                    allow_redirects=True
-                )
-
-                print(f"   Status Code: {response.status_code}")
-
-                text_lower = response.text.lower()
-                blocked_patterns = [
-                    "enter the characters you see below",
-                    "automated access",
-                    "robot check",
-                    "sorry, we just need to make sure you're not a robot",
-                    "api-services-support@amazon.com",
-                ]
-
-                if any(p in text_lower for p in blocked_patterns):
-                    print("   [!] Blocked by Amazon bot check")
-                    time.sleep(RETRY_BACKOFF * attempt)
-                    continue
-
-                if "productTitle" in response.text or "corePrice" in response.text:
-                    print("   [OK] Valid product page received!")
+                with region("sleep"):
+                    time.sleep(random.uniform(1, 3))
+
+                extra = {"stop_markers": stop_markers} if streaming else {}
+                with region("http"):
+                    response = client.get(
+                        url,
+                        headers=headers,
+                        cookies=cookies,
+                        timeout_seconds=15,
+                        allow_redirects=True,
+                        **extra
+                    )
+
+                self.record_bandwidth(client, response, product)
+
+                status = self.check_response(response, markers)
+                if status == "valid":
+                    self.last_error = None
                     return response.text
-
-                print("   [!] Unexpected page content, retrying...")
-                time.sleep(RETRY_BACKOFF * attempt)
+                self.last_error = self.failure_reason(status, response)
+                if status == "blocked" and session is not None:
+                    session.broken = True
+                with region("sleep"):
+                    time.sleep(RETRY_BACKOFF * attempt)
 
             except Exception as e:
                 print(f"   [X] Request error: {e}")
-                time.sleep(RETRY_BACKOFF * attempt)
+                self.last_error = type(e).__name__
+                with region("sleep"):
+                    time.sleep(RETRY_BACKOFF * attempt)
 
         print("\n[X] All attempts failed — Amazon is blocking requests.")
         return None
@@ -126,27 +273,25 @@ class AmazonScraper:
     # STRICT BUYBOX PRICE EXTRACTOR
     # ============================================================
 
-    def extract_buybox_price(self, tree):
+    def extract_buybox_price(self, tree, selectors=None):
         """
         Extract the real BuyBox price.
         If multiple prices exist (MSRP + discounted),
         return the lowest price (the true checkout amount).
         """
 
-        xpath_prices = '//div[@id="corePriceDisplay_desktop_feature_div"]//span[@class="a-offscreen"]/text()'
-        raw_prices = tree.xpath(xpath_prices)
+        selectors = selectors or get_selectors()
+        raw_prices = selectors.all("buybox_prices", tree)
 
-        clean_prices = []
+        candidates = []
         for p in raw_prices:
-            if "$" in p:
-                try:
-                    clean_prices.append(float(p.replace("$", "").strip()))
-                except:
-                    pass
+            if CURRENCY_RE.search(p):
+                amount = parse_amount(p, self.marketplace.currency)
+                if amount is not None:
+                    candidates.append((amount, p.strip()))
 
-        if clean_prices:
-            correct_price = min(clean_prices)
-            return f"${correct_price:.2f}"
+        if candidates:
+            return min(candidates)[1]
 
         return None
 
@@ -154,54 +299,28 @@ class AmazonScraper:
     # PARSE PAGE
     # ============================================================
 
-    def parse(self, html_source):
-        if not html_source:
-            print("[X] No HTML received.")
-            return None
+    def parse_dom(self, tree) -> dict:
+        """Raw fields read from the lxml tree with the selector registry"""
 
-        tree = html.fromstring(html_source)
-
-        def xp(q):
-            r = tree.xpath(q)
-            return r[0].strip() if r else None
-
-        def xp_all(q):
-            r = tree.xpath(q)
-            return [i.strip() for i in r]
+        # One selector set per page, so a registry reload mid-parse is harmless
+        sel = get_selectors()
 
         # ============================
         # TITLE
         # ============================
 
-        title = (
-            xp('//span[@id="productTitle"]/text()')
-            or xp('//h1//span[@id="productTitle"]/text()')
-        )
+        title = sel.first("title", tree)
 
         # ============================
         # PRICE (STRICT BUYBOX)
         # ============================
 
-        price = self.extract_buybox_price(tree)
-
-        if not price:
-            BUYBOX_FALLBACK = [
-                '//span[@id="price_inside_buybox"]/text()',
-                '//span[@id="priceblock_ourprice"]/text()',
-                '//span[@id="priceblock_dealprice"]/text()',
-                '//span[contains(@class,"priceToPay")]//span[@class="a-offscreen"]/text()'
-            ]
-            for q in BUYBOX_FALLBACK:
-                r = xp(q)
-                if r and any(ch.isdigit() for ch in r):
-                    price = r
-                    break
+        price = self.extract_buybox_price(tree, sel) or sel.first("price", tree)
 
         # final fallback
         if not price:
-            offscreen_prices = xp_all('//span[@class="a-offscreen"]/text()')
-            for p in offscreen_prices:
-                if "$" in p:
+            for p in sel.all("any_price", tree):
+                if CURRENCY_RE.search(p):
                     price = p
                     break
 
@@ -209,10 +328,7 @@ class AmazonScraper:
         # STOCK
         # ============================
 
-        stock = (
-            xp('//div[@id="availability"]//span/text()')
-            or xp('normalize-space(//div[@id="availability"])')
-        )
+        stock = sel.first("stock", tree)
         if stock:
             stock = " ".join(stock.split())
 
@@ -220,26 +336,61 @@ class AmazonScraper:
         # RATING / REVIEWS
         # ============================
 
-        rating = (
-            xp('//span[@data-hook="rating-out-of-text"]/text()')
-            or xp('//span[@class="a-icon-alt"]/text()')
-        )
+        return {
+            "title": title,
+            "price_raw": price,
+            "stock": stock,
+            "rating_raw": sel.first("rating", tree),
+            "reviews_raw": sel.first("reviews", tree),
+        }
+
+    def parse(self, html_source):
+        if not html_source:
+            print("[X] No HTML received.")
+            return None
+
+        # ============================
+        # EMBEDDED DATA (NO DOM)
+        # ============================
+
+        started = time.perf_counter()
+        with region("parse.embedded"):
+            fields = extract_embedded(html_source) if self.settings.embedded_extraction else None
+        parse_timer.record("embedded", time.perf_counter() - started)
 
-        reviews = (
-            xp('//span[@id="acrCustomerReviewText"]/text()')
-            or xp('//span[@data-hook="total-review-count"]/text()')
-        )
+        # ============================
+        # DOM FALLBACK
+        # ============================
+
+        # Variation pages still need the tree for the per-child swatches
+        tier = "embedded" if fields is not None else "dom"
+        tree = None
+        if tier == "dom" or has_variations(html_source):
+            started = time.perf_counter()
+            with region("parse.dom"):
+                tree = html.fromstring(html_source)
+                if tier == "dom":
+                    fields = self.parse_dom(tree)
+            parse_timer.record("dom", time.perf_counter() - started)
+        parse_timer.resolved(tier)
 
         # ============================
         # RESULT
         # ============================
 
+        price = fields["price_raw"]
         return {
             "asin": self.asin,
-            "title": title,
+            "marketplace": self.marketplace.code,
+            "currency": detect_currency(price, self.marketplace.currency),
+            "title": fields["title"],
             "price_raw": price,
-            "stock": stock or "Unknown",
-            "rating_raw": rating,
-            "reviews_raw": reviews,
+            "stock": fields["stock"] or "Unknown",
+            "rating_raw": fields["rating_raw"],
+            "reviews_raw": fields["reviews_raw"],
+            "rating": parse_rating(fields["rating_raw"]),
+            "reviews": parse_review_count(fields["reviews_raw"]),
             "url": self.url,
+            # Variation family (children, per-child offers) or None
+            "variations": extract_variations(html_source, tree),
         }
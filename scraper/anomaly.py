@@ -0,0 +1,227 @@
+# scraper/anomaly.py
+
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    ANOMALY_FILTER,
+    ANOMALY_MIN_CHANGE_PCT,
+    ANOMALY_PATH,
+    ANOMALY_THRESHOLD,
+    ANOMALY_WINDOW,
+    CSV_PATH,
+)
+from scraper.fileio import atomic_write
+
+# A median/MAD of fewer prices says nothing about what is normal
+MIN_POINTS = 5
+
+# MAD * 1.4826 estimates the standard deviation of normally spread prices
+MAD_SCALE = 1.4826
+
+# A held price is confirmed by a next price within 2% of it
+CONFIRM_TOLERANCE = 0.02
+
+# Fields kept with a held observation, enough to save its history row
+HELD_FIELDS = ("asin", "marketplace", "title", "price_raw", "price", "stock",
+               "stock_state", "stock_count", "rating", "reviews", "rating_raw",
+               "reviews_raw", "url")
+
+
+def _median(values: List[float]) -> float:
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+class PriceWindow:
+    """The last `size` accepted prices of one product in a fixed ring buffer"""
+
+    __slots__ = ("values", "pos", "count")
+
+    def __init__(self, size: int, prices=()):
+        self.values = array("d", bytes(8 * size))
+        self.pos = 0
+        self.count = 0
+        for price in prices:
+            self.push(price)
+
+    def push(self, price: float):
+        self.values[self.pos] = price
+        self.pos = (self.pos + 1) % len(self.values)
+        self.count = min(self.count + 1, len(self.values))
+
+    def prices(self) -> List[float]:
+        """Oldest first"""
+        if self.count < len(self.values):
+            return self.values[:self.count].tolist()
+        return self.values[self.pos:].tolist() + self.values[:self.pos].tolist()
+
+    def median_mad(self) -> Tuple[float, float]:
+        # Until the buffer wraps, the filled slots are the first `count`
+        values = sorted(self.values[:self.count])
+        median = _median(values)
+        return median, _median(sorted(abs(v - median) for v in values))
+
+
+class AnomalyFilter:
+    """Hold back prices that look like scrape glitches
+
+    Every price is compared with the median of the product's last
+    ANOMALY_WINDOW accepted prices. One further than ANOMALY_THRESHOLD
+    scaled MADs and ANOMALY_MIN_CHANGE_PCT percent from the median (an
+    accessory or per-unit price caught by a fallback selector) is held
+    instead of saved and alerted on. The next check decides: a price
+    within CONFIRM_TOLERANCE of the held one confirms a real change (the
+    held row is saved with its original time and the window restarts at
+    the new level); anything else drops it.
+
+    The window is a fixed array per product, so a check costs the same
+    whatever the length of the history. Windows and held prices persist in
+    ANOMALY_PATH; the first run without it seeds them from the history.
+    """
+
+    def __init__(self, path: str = ANOMALY_PATH, window: int = ANOMALY_WINDOW,
+                 threshold: float = ANOMALY_THRESHOLD,
+                 min_change_pct: float = ANOMALY_MIN_CHANGE_PCT, enabled: bool = ANOMALY_FILTER):
+        self.path = path
+        self.window = window
+        self.threshold = threshold
+        self.min_change = min_change_pct / 100
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._windows: Optional[Dict[str, PriceWindow]] = None
+        self._held: Dict[str, Dict] = {}
+        self._dirty = False
+        self.counts = {"held": 0, "confirmed": 0, "dropped": 0}
+
+    def _load(self):
+        if self._windows is not None:
+            return
+        self._windows = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                self._windows = {key: PriceWindow(self.window, prices)
+                                 for key, prices in state.get("windows", {}).items()}
+                self._held = state.get("held", {})
+                return
+            except Exception as e:
+                print(f"[!] Error reading price windows, rebuilding from history: {e}")
+        self._seed()
+
+    def _seed(self, history_path: str = CSV_PATH):
+        from scraper.history import iter_history
+        from scraper.marketplaces import product_key
+
+        for row in iter_history(history_path):
+            try:
+                price = float(row["price"]) if row.get("price") else None
+            except ValueError:
+                continue
+            if price is None:
+                continue
+            key = product_key(row["asin"], row["marketplace"])
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = PriceWindow(self.window)
+            window.push(price)
+        self._dirty = bool(self._windows)
+
+    def _is_outlier(self, window: PriceWindow, price: float) -> Tuple[bool, float]:
+        median, mad = window.median_mad()
+        distance = abs(price - median)
+        limit = max(self.threshold * MAD_SCALE * mad, self.min_change * median)
+        return distance > limit, median
+
+    def check(self, key: str, data: Dict) -> Tuple[bool, Optional[Dict]]:
+        """Screen one result's price; returns (held, released)
+
+        held: the price is quarantined and the result must be neither
+        saved nor alerted on. released: a previously held observation
+        that this result confirmed, {"data", "observed_at"}, to be saved
+        before it.
+        """
+        price = data.get("price")
+        if not self.enabled or price is None or (isinstance(price, float) and math.isnan(price)):
+            return False, None
+
+        with self._lock:
+            self._load()
+            self._dirty = True
+
+            held = self._held.pop(key, None)
+            if held is not None:
+                if abs(price - held["data"]["price"]) <= CONFIRM_TOLERANCE * held["data"]["price"]:
+                    self.counts["confirmed"] += 1
+                    print(f"   [i] Price change to {held['data']['price']} confirmed; "
+                          "saving the held observation")
+                    self._windows[key] = PriceWindow(self.window, [held["data"]["price"], price])
+                    return False, held
+                self.counts["dropped"] += 1
+                print(f"   [i] Held price {held['data']['price']} not seen again; dropped as a glitch")
+
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = PriceWindow(self.window)
+            if window.count >= MIN_POINTS:
+                outlier, median = self._is_outlier(window, price)
+                if outlier:
+                    self.counts["held"] += 1
+                    self._held[key] = {
+                        "observed_at": time.time(),
+                        "data": {field: data.get(field) for field in HELD_FIELDS},
+                    }
+                    print(f"   [!] Price {price} is far from the recent median {median:.2f}; "
+                          "held until the next check confirms it")
+                    return True, None
+            window.push(price)
+            return False, None
+
+    def held(self) -> Dict[str, Dict]:
+        with self._lock:
+            self._load()
+            return dict(self._held)
+
+    def summary(self) -> Optional[str]:
+        """One-line summary of the held/confirmed/dropped prices since the last call"""
+        with self._lock:
+            counts = dict(self.counts)
+            for name in self.counts:
+                self.counts[name] = 0
+        if not any(counts.values()):
+            return None
+        return ", ".join(f"{count} {name}" for name, count in counts.items())
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            state = {
+                "windows": {key: window.prices() for key, window in self._windows.items()},
+                "held": self._held,
+            }
+            self._dirty = False
+        try:
+            with atomic_write(self.path, encoding="utf-8") as f:
+                json.dump(state, f, separators=(",", ":"))
+        except Exception as e:
+            print(f"[!] Error writing price windows: {e}")
+
+
+_filter: Optional[AnomalyFilter] = None
+_filter_lock = threading.Lock()
+
+
+def get_anomaly_filter() -> AnomalyFilter:
+    """Process-wide filter shared by every marketplace thread"""
+    global _filter
+    with _filter_lock:
+        if _filter is None:
+            _filter = AnomalyFilter()
+        return _filter
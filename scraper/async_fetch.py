@@ -0,0 +1,257 @@
+# scraper/async_fetch.py
+
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from config import (
+    MARKETPLACE_CONCURRENCY,
+    REQUEST_DELAY_MIN,
+    REQUEST_DELAY_MAX,
+    RETRY_BACKOFF,
+    RETRY_COUNT,
+    SESSION_MAX_USES,
+)
+from scraper.amazon_scraper import PRODUCT_MARKERS, AmazonScraper
+from scraper.marketplaces import Marketplace, get_marketplace, product_key
+from scraper.prices import parse_amount
+from scraper.products_manager import ProductsManager
+from scraper.profiling import region
+from scraper.session_pool import PooledSession
+from settings import Settings
+
+
+class AsyncAmazonScraper(AmazonScraper):
+    """AmazonScraper on an async transport
+
+    Same headers, cookies, retries and response checks as the blocking
+    scraper, but every request and pause is awaited, so thousands of
+    fetches can be in flight on one event loop.
+    """
+
+    @staticmethod
+    async def warm_up_async(client, marketplace: Marketplace) -> dict:
+        """Async version of AmazonScraper.warm_up"""
+        print(f"[*] Starting warm-up sequence ({marketplace.domain})...")
+
+        warm_headers = AmazonScraper.warm_up_headers(marketplace)
+        cookies = {}
+        try:
+            for idx, path in enumerate(marketplace.warmup_paths):
+                if idx:
+                    with region("sleep"):
+                        await asyncio.sleep(random.uniform(2, 4))
+                with region("http"):
+                    response = await client.get(marketplace.base_url + path,
+                                                headers=warm_headers, timeout_seconds=15)
+                print(f"   [OK] Visited {path} (Status: {response.status_code})")
+                AmazonScraper.record_bandwidth(client, response, "(warm-up)")
+                cookies.update(dict(response.cookies))
+        except Exception as e:
+            print(f"[!] Warm-up failed: {e}")
+
+        return cookies
+
+    async def fetch_async(self, session=None) -> Optional[str]:
+        """Fetch the product page HTML, or None if every attempt failed"""
+        return await self.fetch_url_async(self.url, PRODUCT_MARKERS, session)
+
+    async def fetch_url_async(self, url, markers, session=None, product=None) -> Optional[str]:
+        """Async version of AmazonScraper.fetch_url"""
+        if product is None:
+            product = product_key(self.asin, self.marketplace.code)
+
+        if session is not None:
+            client = session.client
+            warm_cookies = session.cookies
+        else:
+            client = self.new_client("async", self.settings)
+            with region("warm_up"):
+                warm_cookies = await self.warm_up_async(client, self.marketplace)
+
+        self.last_error = None
+        try:
+            for attempt in range(1, RETRY_COUNT + 1):
+                print(f"\n[*] Attempt {attempt}/{RETRY_COUNT} ({product})")
+                self.attempts_used = attempt
+
+                headers = self.request_headers()
+                cookies = self.session_cookies(warm_cookies, self.marketplace)
+
+                try:
+                    with region("sleep"):
+                        await asyncio.sleep(random.uniform(1, 3))
+
+                    with region("http"):
+                        response = await client.get(
+                            url,
+                            headers=headers,
+                            cookies=cookies,
+                            timeout_seconds=15,
+                            allow_redirects=True
+                        )
+                    self.record_bandwidth(client, response, product)
+
+                    status = self.check_response(response, markers)
+                    if status == "valid":
+                        self.last_error = None
+                        return response.text
+                    self.last_error = self.failure_reason(status, response)
+                    if status == "blocked" and session is not None:
+                        session.broken = True
+                    with region("sleep"):
+                        await asyncio.sleep(RETRY_BACKOFF * attempt)
+
+                except Exception as e:
+                    print(f"   [X] Request error: {e}")
+                    self.last_error = type(e).__name__
+                    with region("sleep"):
+                        await asyncio.sleep(RETRY_BACKOFF * attempt)
+        finally:
+            if session is None:
+                await client.close()
+
+        print(f"\n[X] All attempts failed for {product} — Amazon is blocking requests.")
+        return None
+
+
+class AsyncSessionPool:
+    """SessionPool counterpart for the async transport
+
+    Same budget as SessionPool (at most `concurrency` requests in flight,
+    starts spaced by a random delay, sessions retired after `max_uses` or
+    a bot check), built on asyncio primitives. Bound to the event loop it
+    is used on, so a pool lives for one cycle.
+    """
+
+    def __init__(self, marketplace: Marketplace, concurrency: int = MARKETPLACE_CONCURRENCY,
+                 delay_min: float = REQUEST_DELAY_MIN, delay_max: float = REQUEST_DELAY_MAX,
+                 max_uses: int = SESSION_MAX_USES, settings: Optional[Settings] = None):
+        self.marketplace = marketplace
+        self.settings = settings
+        self.concurrency = max(1, concurrency)
+        self.delay_min = delay_min
+        self.delay_max = max(delay_min, delay_max)
+        self.max_uses = max_uses
+
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._idle: List[PooledSession] = []
+        self._next_start = 0.0
+
+    async def _create(self) -> PooledSession:
+        client = AmazonScraper.new_client("async", self.settings)
+        with region("warm_up"):
+            cookies = await AsyncAmazonScraper.warm_up_async(client, self.marketplace)
+        return PooledSession(client, cookies, self)
+
+    async def wait_turn(self):
+        """Wait until this domain's rate budget allows another request"""
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + random.uniform(self.delay_min, self.delay_max)
+        if start > now:
+            with region("sleep"):
+                await asyncio.sleep(start - now)
+
+    @asynccontextmanager
+    async def session(self):
+        """Check out a session for one product; waits while the pool is busy"""
+        async with self._slots:
+            pooled = self._idle.pop() if self._idle else await self._create()
+            try:
+                yield pooled
+            finally:
+                pooled.uses += 1
+                if pooled.broken or pooled.uses >= self.max_uses:
+                    await pooled.client.close()
+                else:
+                    self._idle.append(pooled)
+
+    async def close(self):
+        """Close all idle sessions"""
+        while self._idle:
+            await self._idle.pop().client.close()
+
+
+async def scrape_product_async(item: Dict, pool: AsyncSessionPool, health=None,
+                               settings: Optional[Settings] = None) -> Optional[Dict]:
+    """Async version of scraper.cycle.scrape_product (product pages only)"""
+    from scraper.health import page_problem
+
+    scraper = AsyncAmazonScraper(item["asin"], item.get("marketplace"), settings)
+    key = ProductsManager.key(item)
+
+    await pool.wait_turn()
+    async with pool.session() as session:
+        html_source = await scraper.fetch_async(session)
+
+    if not html_source:
+        print(f"   [X] Failed to fetch page for {key}")
+        if health:
+            health.record_failure(key, scraper.last_error or "fetch_failed",
+                                  scraper.attempts_used)
+        return None
+
+    # lxml parsing is CPU-bound; keep it off the event loop
+    data = await asyncio.to_thread(scraper.parse, html_source)
+
+    if not data:
+        print("[X] Amazon returned blocked/invalid data. Skipping save.")
+        return None
+
+    problem = page_problem(data)
+    if problem:
+        print(f"   [X] Unusable product page for {key} ({problem}). Skipping save.")
+        if health:
+            health.record_failure(key, problem, scraper.attempts_used)
+        return None
+    if health:
+        health.record_success(key)
+
+    data["price"] = parse_amount(data.get("price_raw"), scraper.marketplace.currency)
+    return data
+
+
+async def scrape_marketplace_async(code: str, items: List[Dict], manager: ProductsManager,
+                                   checkpoint=None, health=None,
+                                   settings: Optional[Settings] = None):
+    """Scrape one marketplace's products concurrently on the event loop"""
+    from scraper.cycle import SiblingFill, handle_result
+
+    pool = AsyncSessionPool(get_marketplace(code), settings=settings)
+    siblings = SiblingFill(code, items, manager, checkpoint, health)
+
+    async def check(idx: int, item: Dict):
+        if not siblings.claim(item):
+            return
+        print(f"\n[{code}] [{idx}/{len(items)}] Checking {item['name']}")
+        try:
+            with region("product"):
+                data = await scrape_product_async(item, pool, health, settings)
+                if data:
+                    # Persists history and the product (blocking); alerts
+                    # are only queued for the end of the cycle
+                    await asyncio.to_thread(handle_result, item, data, manager)
+                    await asyncio.to_thread(siblings.fill, data)
+        except Exception as e:
+            print(f"   [X] Error checking {ProductsManager.key(item)}: {e}")
+            if health:
+                health.record_failure(ProductsManager.key(item), type(e).__name__)
+        if checkpoint:
+            checkpoint.mark_done(ProductsManager.key(item))
+
+    try:
+        await asyncio.gather(*(check(idx, item) for idx, item in enumerate(items, 1)))
+    finally:
+        await pool.close()
+
+
+async def scrape_all_async(by_marketplace: Dict[str, List[Dict]], manager: ProductsManager,
+                           checkpoint=None, health=None, settings: Optional[Settings] = None):
+    """Scrape every marketplace on one event loop"""
+    await asyncio.gather(*(
+        scrape_marketplace_async(code, items, manager, checkpoint, health, settings)
+        for code, items in by_marketplace.items()
+    ))
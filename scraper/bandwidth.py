@@ -0,0 +1,101 @@
+# scraper/bandwidth.py
+
+import json
+import os
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from config import BANDWIDTH_PATH
+from scraper.fileio import atomic_write
+
+
+def proxy_label(proxy_url: Optional[str]) -> str:
+    """host:port of a proxy URL with credentials stripped ("direct" if none)"""
+    if not proxy_url:
+        return "direct"
+    parts = urlsplit(proxy_url)
+    return parts.hostname + (f":{parts.port}" if parts.port else "") if parts.hostname else "unknown"
+
+
+def _empty_totals() -> Dict:
+    return {
+        "requests": 0,
+        "wire_bytes": 0,
+        "body_bytes": 0,
+        "uncompressed_responses": 0,
+        "aborted_early": 0,
+    }
+
+
+class BandwidthMeter:
+    """Thread-safe byte accounting per product key and per proxy
+
+    wire_bytes is what went over the network (compressed); body_bytes is
+    the decoded HTML that was read. Totals are merged into BANDWIDTH_PATH
+    by save() so they accumulate across cycles.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_product: Dict[str, Dict] = {}
+        self.by_proxy: Dict[str, Dict] = {}
+
+    def record(self, product: str, proxy: str, wire_bytes: int, body_bytes: int,
+               compressed: bool = True, aborted: bool = False):
+        with self._lock:
+            for table, key in ((self.by_product, product), (self.by_proxy, proxy)):
+                totals = table.setdefault(key, _empty_totals())
+                totals["requests"] += 1
+                totals["wire_bytes"] += wire_bytes
+                totals["body_bytes"] += body_bytes
+                totals["uncompressed_responses"] += 0 if compressed else 1
+                totals["aborted_early"] += 1 if aborted else 0
+
+    def total(self) -> Dict:
+        totals = _empty_totals()
+        with self._lock:
+            for row in self.by_proxy.values():
+                for key in totals:
+                    totals[key] += row[key]
+        return totals
+
+    def reset(self):
+        with self._lock:
+            self.by_product.clear()
+            self.by_proxy.clear()
+
+    def save(self, path: str = BANDWIDTH_PATH):
+        """Add this meter's totals to the bandwidth file and reset the meter"""
+        stored = load_bandwidth(path)
+        with self._lock:
+            for section, table in (("by_product", self.by_product), ("by_proxy", self.by_proxy)):
+                target = stored.setdefault(section, {})
+                for key, totals in table.items():
+                    merged = target.setdefault(key, _empty_totals())
+                    for field, value in totals.items():
+                        merged[field] = merged.get(field, 0) + value
+            self.by_product.clear()
+            self.by_proxy.clear()
+
+        try:
+            with atomic_write(path, encoding="utf-8") as f:
+                json.dump(stored, f, indent=2)
+        except Exception as e:
+            print(f"[!] Error writing bandwidth stats: {e}")
+
+
+def load_bandwidth(path: str = BANDWIDTH_PATH) -> Dict:
+    """Read accumulated bandwidth totals"""
+    if not os.path.isfile(path):
+        return {"by_product": {}, "by_proxy": {}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[!] Error reading bandwidth stats: {e}")
+        return {"by_product": {}, "by_proxy": {}}
+
+
+# Process-wide meter shared by all scraper threads
+meter = BandwidthMeter()
@@ -0,0 +1,162 @@
+# scraper/batch_fetch.py
+
+from typing import Dict, List, Optional
+from urllib.parse import quote_plus
+
+from lxml import html
+
+from config import BATCH_SEARCH_SIZE
+from scraper.amazon_scraper import AmazonScraper
+from scraper.marketplaces import product_key
+from scraper.prices import CURRENCY_RE, detect_currency, parse_amount
+from scraper.utils import parse_rating, parse_review_count
+
+# Markers that identify a usable response for each page type
+SEARCH_MARKERS = ['data-component-type="s-search-result"', "s-result-list"]
+AOD_MARKERS = ["aod-pinned-offer", "aod-offer"]
+
+
+def _first(result) -> Optional[str]:
+    """First XPath result with whitespace collapsed (handles string results)"""
+    if isinstance(result, str):
+        return " ".join(result.split()) or None
+    return " ".join(result[0].split()) if result else None
+
+
+class BatchOfferScraper:
+    """Fetch prices for many ASINs with fewer, lighter requests
+
+    Built on AmazonScraper's session handling and retries, with two
+    alternatives to the full product page:
+
+    - search: one search result page answers for up to
+      BATCH_SEARCH_SIZE ASINs (price, rating, review count, low-stock
+      notes), mapped back to ASINs through each card's data-asin.
+    - aod: the all-offers-display fragment, a few KB per ASIN
+      instead of a 1-2 MB product page.
+
+    Both return the same row shape as AmazonScraper.parse. ASINs missing
+    from a batch response are left for the caller to fetch one by one.
+    """
+
+    def __init__(self, marketplace=None, settings=None):
+        self.scraper = AmazonScraper("", marketplace, settings)
+        self.marketplace = self.scraper.marketplace
+
+    # ============================================================
+    # URLS
+    # ============================================================
+
+    def search_url(self, asins: List[str]) -> str:
+        return f"{self.marketplace.base_url}/s?k={quote_plus(' | '.join(asins))}"
+
+    def aod_url(self, asin: str) -> str:
+        return (f"{self.marketplace.base_url}/gp/product/ajax/aodAjaxMain/"
+                f"?asin={asin}&pc=dp&experienceId=aodAjaxMain")
+
+    # ============================================================
+    # FETCH
+    # ============================================================
+
+    def fetch_search(self, asins: List[str], session=None) -> Dict[str, Dict]:
+        """Fetch one search page for a batch of ASINs; returns ASIN -> row"""
+        html_source = self.scraper.fetch_url(
+            self.search_url(asins), SEARCH_MARKERS, session,
+            product=product_key("(search)", self.marketplace.code))
+        if not html_source:
+            return {}
+        wanted = set(asins)
+        return {asin: row for asin, row in self.parse_search(html_source).items()
+                if asin in wanted}
+
+    def fetch_aod(self, asin: str, session=None) -> Optional[Dict]:
+        """Fetch the offer-listing fragment for one ASIN"""
+        html_source = self.scraper.fetch_url(
+            self.aod_url(asin), AOD_MARKERS, session,
+            product=product_key(asin, self.marketplace.code))
+        if not html_source:
+            return None
+        return self.parse_aod(html_source, asin)
+
+    @staticmethod
+    def batches(asins: List[str], size: int = BATCH_SEARCH_SIZE) -> List[List[str]]:
+        return [asins[i:i + size] for i in range(0, len(asins), size)]
+
+    # ============================================================
+    # PARSE
+    # ============================================================
+
+    def _row(self, asin, title, price, stock, rating, reviews) -> Dict:
+        return {
+            "asin": asin,
+            "marketplace": self.marketplace.code,
+            "currency": detect_currency(price, self.marketplace.currency),
+            "title": title,
+            "price_raw": price,
+            "stock": stock or "Unknown",
+            "rating_raw": rating,
+            "reviews_raw": reviews,
+            "rating": parse_rating(rating),
+            "reviews": parse_review_count(reviews),
+            "url": self.marketplace.product_url(asin),
+        }
+
+    def parse_search(self, html_source: str) -> Dict[str, Dict]:
+        """Map every search result card on the page to a row keyed by ASIN"""
+        tree = html.fromstring(html_source)
+        rows = {}
+
+        for card in tree.xpath('//div[@data-component-type="s-search-result"][@data-asin]'):
+            asin = card.get("data-asin")
+            if not asin or asin in rows:
+                continue
+
+            def first(q):
+                return _first(card.xpath(q))
+
+            title = first('.//h2//span/text()')
+            price = None
+            for p in card.xpath('.//span[contains(@class,"a-price") and not(@data-a-strike)]'
+                                '/span[@class="a-offscreen"]/text()'):
+                if CURRENCY_RE.search(p):
+                    price = p.strip()
+                    break
+
+            # Cards only mention stock when it is limited or missing; a
+            # price alone does not say the buy box has it, so no note is
+            # stored as "Unknown"
+            stock = first('.//span[contains(@aria-label,"left in stock")]/@aria-label') \
+                or first('.//span[contains(text(),"unavailable")]/text()')
+
+            rating = first('.//span[@class="a-icon-alt"]/text()')
+            reviews = first('.//a[contains(@href,"customerReviews")]//span/text()') \
+                or first('.//span[@class="a-size-base s-underline-text"]/text()')
+
+            rows[asin] = self._row(asin, title, price, stock, rating, reviews)
+
+        return rows
+
+    def parse_aod(self, html_source: str, asin: str) -> Optional[Dict]:
+        """Parse the pinned (buy box) offer of an all-offers-display fragment"""
+        tree = html.fromstring(html_source)
+
+        def first(q):
+            return _first(tree.xpath(q))
+
+        title = first('//h5[@id="aod-asin-title-text"]/text()') \
+            or first('//*[@id="aod-asin-title-text"]/text()')
+        price = first('//div[@id="aod-pinned-offer"]//span[@class="a-offscreen"]/text()') \
+            or first('//div[@id="aod-offer"]//span[@class="a-offscreen"]/text()')
+        stock = first('normalize-space(//div[@id="aod-offer-availability"])') \
+            or first('normalize-space(//div[@id="aod-pinned-offer-availability"])')
+        if not stock:
+            stock = "In Stock" if price else None
+
+        if not title and not price:
+            return None
+
+        if price is not None and parse_amount(price, self.marketplace.currency) is None:
+            price = None
+
+        # The fragment carries no rating block
+        return self._row(asin, title, price, stock, None, None)
@@ -0,0 +1,101 @@
+# scraper/checkpoint.py
+
+import json
+import os
+import threading
+import time
+from typing import List, Set
+
+from config import CHECKPOINT_MAX_AGE_MINUTES, CHECKPOINT_PATH, CSV_PATH
+from scraper.fileio import append_text, atomic_write
+
+
+class CycleCheckpoint:
+    """Journal of the scrape cycle in progress
+
+    begin() writes a header line, mark_done() appends one line per
+    finished product and finish() deletes the file. If a cycle dies, the
+    journal is still there on the next start and begin() returns the
+    products already finished, so the restarted cycle only does the rest.
+    A product's line is only written once its history row is committed
+    (see HistoryWriter.after_commit), and a journal without progress for
+    max_age_minutes is started over instead of resumed.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH,
+                 max_age_minutes: float = CHECKPOINT_MAX_AGE_MINUTES,
+                 history_path: str = CSV_PATH):
+        self.path = path
+        self.max_age = max_age_minutes * 60
+        self.history_path = history_path
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def begin(self, keys: List[str]) -> Set[str]:
+        """Start a cycle over keys, or resume an interrupted one
+
+        Returns the keys that an interrupted cycle already finished.
+        """
+        done = self._read_done()
+        if done is not None:
+            remaining = sum(1 for key in keys if key not in done)
+            print(f"[*] Resuming interrupted cycle: {len(done)} done, {remaining} remaining")
+            return done
+
+        header = {"started_at": time.strftime("%Y-%m-%d %H:%M:%S"), "products": len(keys)}
+        with atomic_write(self.path, encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+        return set()
+
+    def mark_done(self, key: str):
+        """Record that a product has been handled in this cycle
+
+        Journaled once the history rows saved for it so far are written,
+        so a crash in between has the product scraped again.
+        """
+        from scraper.history_writer import get_history_writer
+
+        get_history_writer(self.history_path).after_commit(lambda: self._append(key))
+
+    def _append(self, key: str):
+        with self._lock:
+            if not self._finished:
+                append_text(self.path, json.dumps({"done": key}) + "\n")
+
+    def finish(self):
+        """The cycle completed; the next one starts from the beginning"""
+        with self._lock:
+            self._finished = True
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def _read_done(self):
+        """Keys finished by an interrupted cycle, or None if there is none"""
+        if not os.path.isfile(self.path):
+            return None
+        age = time.time() - os.path.getmtime(self.path)
+        if age > self.max_age:
+            print(f"[i] Not resuming the cycle journal, last progress "
+                  f"{age / 60:.0f} minutes ago; starting over")
+            return None
+        done = set()
+        started = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut off by the crash
+                        continue
+                    if "done" in entry:
+                        done.add(entry["done"])
+                    elif "started_at" in entry:
+                        started = True
+        except OSError as e:
+            print(f"[!] Error reading cycle checkpoint: {e}")
+            return None
+        # Lines without the header are left over from a finished cycle
+        return done if started else None
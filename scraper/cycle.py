@@ -0,0 +1,405 @@
+# scraper/cycle.py
+
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from config import FETCH_STRATEGY, FETCH_TRANSPORT
+from scraper.marketplaces import get_marketplace
+from scraper.prices import parse_amount
+from scraper.products_manager import ProductsManager
+from scraper.profiling import region
+from scraper.transports import get_transport
+from settings import Settings, get_settings
+
+# history.csv and products.json are shared by every marketplace thread,
+# so saving results and updating products happen one at a time
+_persist_lock = threading.Lock()
+
+
+def scrape_product(item: Dict, pool=None, aod: bool = False, health=None,
+                   settings: Optional[Settings] = None,
+                   full_page: bool = False) -> Optional[Dict]:
+    """Fetch and parse one product; returns the parsed data or None
+
+    With a SessionPool the request waits for the marketplace's rate budget
+    and reuses a warmed-up session. With aod the lightweight offer-listing
+    fragment is fetched instead of the full product page, falling back to
+    the product page if the fragment yields no price. Successes and
+    failures are recorded in health (a HealthStore) when given. settings
+    is the snapshot to fetch with (default: the current one). full_page
+    turns off the streaming early stop (see SiblingFill.wants_full_page).
+    """
+    from scraper.amazon_scraper import AmazonScraper
+    from scraper.health import page_problem
+
+    scraper = AmazonScraper(item["asin"], item.get("marketplace"), settings)
+    key = ProductsManager.key(item)
+
+    def fetch_with(fetch):
+        if pool is None:
+            return fetch(None)
+        pool.wait_turn()
+        with pool.session() as session:
+            return fetch(session)
+
+    if aod:
+        from scraper.batch_fetch import BatchOfferScraper
+
+        offers = BatchOfferScraper(scraper.marketplace.code, scraper.settings)
+        data = fetch_with(lambda session: offers.fetch_aod(item["asin"], session))
+        if data and data.get("price_raw"):
+            data["price"] = parse_amount(
+                data["price_raw"], scraper.marketplace.currency)
+            if health:
+                health.record_success(key)
+            return data
+        print("   [!] No offer in AOD fragment, fetching product page")
+
+    html_source = fetch_with(lambda session: scraper.fetch(session, stop_early=not full_page))
+
+    if not html_source:
+        print("   [X] Failed to fetch page")
+        if health:
+            health.record_failure(key, scraper.last_error or "fetch_failed",
+                                  scraper.attempts_used)
+        return None
+
+    data = scraper.parse(html_source)
+
+    if not data:
+        print("[X] Amazon returned blocked/invalid data. Skipping save.")
+        return None
+
+    problem = page_problem(data)
+    if problem:
+        print(f"   [X] Unusable product page ({problem}). Skipping save.")
+        if health:
+            health.record_failure(key, problem, scraper.attempts_used)
+        return None
+    if health:
+        health.record_success(key)
+
+    data["price"] = parse_amount(
+        data.get("price_raw"), scraper.marketplace.currency)
+    return data
+
+
+def handle_result(item: Dict, data: Dict, manager: ProductsManager):
+    """Persist a scraped result and queue it for the cycle's alert rules"""
+    from alerts.rules import pending
+    from scraper.anomaly import get_anomaly_filter
+    from scraper.stock import classify_stock
+    from scraper.utils import save_to_csv
+
+    key = ProductsManager.key(item)
+    state, count = classify_stock(data.get("stock"))
+    data["stock_state"] = int(state)
+    data["stock_count"] = count
+
+    print(f"   Title : {(data.get('title') or 'N/A')[:80]}")
+    print(f"   Price : {data.get('price')} (raw: {data.get('price_raw')})")
+    print(f"   Stock : {data.get('stock')} ({state.label})")
+
+    # A likely glitch is neither saved nor alerted on; last_checked stays
+    # as it was so the planner re-checks the product first next cycle
+    held, released = get_anomaly_filter().check(key, data)
+    if held:
+        return
+
+    # The history row and the alert batch share one timestamp, so the rollup
+    # rebuild (rows before the batch) and the batch fold never count it twice
+    observed_at = time.time()
+
+    with region("persist"), _persist_lock:
+        # Save to CSV
+        with region("history"):
+            if released:
+                save_to_csv(released["data"], observed_at=released["observed_at"])
+            save_to_csv(data, observed_at=observed_at)
+
+        # Update last checked time; last price/stock feed the cycle planner
+        with region("products_db"):
+            manager.update_product(
+                key, last_checked=time.strftime("%Y-%m-%d %H:%M:%S"),
+                last_price=data.get("price"), last_stock=data.get("stock"),
+                last_stock_state=int(state))
+
+    # Alerts are decided for the whole cycle at once (see alerts.rules)
+    pending.add(item, data, observed_at)
+
+
+class SiblingFill:
+    """Fill tracked variation siblings from a page that was fetched anyway
+
+    A product page of a variation family can show price and availability
+    for every child on its swatches. When it does, siblings tracked in the
+    same cycle are saved from that page instead of being fetched. claim()
+    must be called before fetching a product, so a product is never both
+    fetched and filled. Families are known from the "parent" of tracked
+    variation children (see ProductsManager.add_variation_children).
+    """
+
+    def __init__(self, code: str, items: List[Dict], manager: ProductsManager,
+                 checkpoint=None, health=None):
+        self.marketplace = get_marketplace(code)
+        self.pending = {item["asin"]: item for item in items}
+        self._families = Counter(self._family(item) for item in items)
+        self.manager = manager
+        self.checkpoint = checkpoint
+        self.health = health
+        self._covered = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _family(item: Dict) -> str:
+        return item.get("parent") or ProductsManager.key(item)
+
+    def wants_full_page(self, item: Dict) -> bool:
+        """True if item's page may fill other products of this cycle
+
+        Their variation JSON comes after the point where a streaming fetch
+        stops early, so such pages are read in full.
+        """
+        return self._families[self._family(item)] > 1
+
+    def claim(self, item: Dict) -> bool:
+        """True if the caller should fetch item (not already filled or claimed)"""
+        with self._lock:
+            if item["asin"] in self._covered:
+                return False
+            self._covered.add(item["asin"])
+            return True
+
+    def fill(self, data: Dict) -> int:
+        """Save the siblings of data's page that are pending in this cycle"""
+        from scraper.variations import sibling_rows
+
+        if not data.get("variations"):
+            return 0
+
+        filled = 0
+        for asin, row in sibling_rows(data, self.marketplace).items():
+            sibling = self.pending.get(asin)
+            if sibling is None or not self.claim(sibling):
+                continue
+            row["price"] = parse_amount(row["price_raw"], self.marketplace.currency)
+            print(f"   [OK] {asin} filled from its variation family page")
+            key = ProductsManager.key(sibling)
+            try:
+                handle_result(sibling, row, self.manager)
+                if self.health:
+                    self.health.record_success(key)
+            except Exception as e:
+                print(f"   [X] Error saving {key}: {e}")
+            if self.checkpoint:
+                self.checkpoint.mark_done(key)
+            filled += 1
+        return filled
+
+
+def scrape_batches(code: str, items: List[Dict], manager: ProductsManager, pool,
+                   checkpoint=None, health=None, settings: Optional[Settings] = None):
+    """Scrape a marketplace through search result pages, many ASINs per request
+
+    ASINs that a search page did not return are fetched from their
+    product page afterwards.
+    """
+    from scraper.batch_fetch import BatchOfferScraper
+
+    batch_scraper = BatchOfferScraper(code, settings)
+    by_asin = {item["asin"]: item for item in items}
+    missing = []
+
+    for batch in batch_scraper.batches(list(by_asin)):
+        print(f"\n[{code}] Searching batch of {len(batch)} ASINs")
+        pool.wait_turn()
+        with pool.session() as session:
+            results = batch_scraper.fetch_search(batch, session)
+        print(f"   [OK] {len(results)}/{len(batch)} ASINs found in results")
+
+        for asin in batch:
+            data = results.get(asin)
+            if not data or not data.get("price_raw"):
+                missing.append(by_asin[asin])
+                continue
+            data["price"] = parse_amount(data["price_raw"], batch_scraper.marketplace.currency)
+            if health:
+                health.record_success(ProductsManager.key(by_asin[asin]))
+            try:
+                handle_result(by_asin[asin], data, manager)
+            except Exception as e:
+                print(f"   [X] Error saving {asin}: {e}")
+            if checkpoint:
+                checkpoint.mark_done(ProductsManager.key(by_asin[asin]))
+
+    return missing
+
+
+def scrape_marketplace(code: str, items: List[Dict], manager: ProductsManager,
+                       strategy: str = FETCH_STRATEGY, checkpoint=None, health=None,
+                       settings: Optional[Settings] = None):
+    """Scrape one marketplace's products within its own session pool
+
+    Each product is marked done in checkpoint (a CycleCheckpoint) once it
+    has been handled, whether or not the fetch succeeded; the outcome is
+    recorded in health (a HealthStore).
+    """
+    from scraper.session_pool import get_pool
+
+    pool = get_pool(code, settings)
+
+    if strategy == "search":
+        items = scrape_batches(code, items, manager, pool, checkpoint, health, settings)
+        if items:
+            print(f"\n[{code}] Falling back to product pages for {len(items)} ASINs")
+
+    siblings = SiblingFill(code, items, manager, checkpoint, health)
+
+    def check(numbered):
+        idx, item = numbered
+        if not siblings.claim(item):
+            return
+        print(f"\n[{code}] [{idx}/{len(items)}] Checking {item['name']}")
+        print(f"         ASIN: {item['asin']}")
+        try:
+            with region("product"):
+                data = scrape_product(item, pool, aod=strategy == "aod", health=health,
+                                      settings=settings,
+                                      full_page=siblings.wants_full_page(item))
+                if data:
+                    handle_result(item, data, manager)
+                    siblings.fill(data)
+        except Exception as e:
+            print(f"   [X] Error checking {ProductsManager.key(item)}: {e}")
+            if health:
+                health.record_failure(ProductsManager.key(item), type(e).__name__)
+        if checkpoint:
+            checkpoint.mark_done(ProductsManager.key(item))
+
+    with ThreadPoolExecutor(max_workers=pool.concurrency) as executor:
+        list(executor.map(check, enumerate(items, 1)))
+
+
+def scrape_all(settings: Optional[Settings] = None):
+    """Scrape all enabled products
+
+    Products are grouped by marketplace and each marketplace is scraped in
+    parallel with its own session pool and request budget, so throttling
+    on one domain does not hold up the others. With the async transport
+    all marketplaces share one event loop instead of a thread each.
+
+    Progress is journaled in a CycleCheckpoint: if a cycle is killed, the
+    next one only scrapes the products the interrupted cycle had not
+    reached yet. Products failing repeatedly are skipped until their
+    backoff expires (see scraper.health).
+    """
+    from alerts.rules import send_cycle_alerts
+    from scraper.anomaly import get_anomaly_filter
+    from scraper.bandwidth import meter
+    from scraper.checkpoint import CycleCheckpoint
+    from scraper.embedded import parse_timer
+    from scraper.health import get_health_store
+    from scraper.history_writer import get_history_writer
+    from scraper.planner import format_staleness, plan_cycle, staleness_report
+    from scraper.selector_registry import get_registry
+    from scraper.session_pool import close_all_pools
+
+    print("="*50)
+    print("=== Running scrape cycle ===")
+    print("="*50)
+
+    manager = ProductsManager()
+    products = manager.get_enabled_products()
+
+    if not products:
+        print("[!] No products to track. Add products via dashboard.")
+        return
+
+    # One snapshot for the whole cycle: a reload applies from the next one
+    settings = settings or get_settings()
+
+    report = staleness_report(products)
+    print(f"[i] Staleness: {format_staleness(report)}")
+    if report["over_slo"]:
+        print(f"[!] {report['over_slo']} products over the staleness SLO go first")
+
+    health = get_health_store()
+    products, deferred = health.split_due(products, ProductsManager.key)
+    if deferred:
+        print(f"[i] Skipping {len(deferred)} failing products until their next re-check "
+              "(see: main.py report health)")
+
+    checkpoint = CycleCheckpoint()
+    done = checkpoint.begin([ProductsManager.key(item) for item in products])
+    products = plan_cycle(
+        [item for item in products if ProductsManager.key(item) not in done])
+
+    by_marketplace = defaultdict(list)
+    for item in products:
+        by_marketplace[get_marketplace(item.get("marketplace")).code].append(item)
+
+    summary = ", ".join(f"{code}: {len(items)}" for code, items in by_marketplace.items())
+    print(f"[*] Tracking {len(products)} products ({summary})\n")
+
+    try:
+        if by_marketplace and get_transport(FETCH_TRANSPORT).is_async:
+            import asyncio
+            from scraper.async_fetch import scrape_all_async
+
+            if FETCH_STRATEGY != "product":
+                print(f"[!] FETCH_STRATEGY={FETCH_STRATEGY} is not supported by the "
+                      "async transport; fetching product pages")
+            asyncio.run(scrape_all_async(by_marketplace, manager, checkpoint, health, settings))
+        elif by_marketplace:
+            with ThreadPoolExecutor(max_workers=len(by_marketplace)) as executor:
+                futures = [
+                    executor.submit(scrape_marketplace, code, items, manager,
+                                    checkpoint=checkpoint, health=health, settings=settings)
+                    for code, items in by_marketplace.items()
+                ]
+                for future in futures:
+                    future.result()
+    finally:
+        # Commit the rows still queued for history.csv before anything
+        # reads it back
+        get_history_writer().flush()
+        # Results saved so far get their alerts even if the cycle dies
+        send_cycle_alerts(settings)
+        get_anomaly_filter().save()
+        # Keep failure counts even if the cycle dies; the checkpoint
+        # makes the next start resume
+        health.save()
+        # Sessions hold native client handles and would only go stale
+        # until the next cycle
+        close_all_pools()
+
+    used = meter.total()
+    if used["requests"]:
+        print(f"\n[i] Bandwidth: {used['wire_bytes'] / 1048576:.1f} MB over "
+              f"{used['requests']} requests ({used['aborted_early']} stopped early, "
+              f"{used['uncompressed_responses']} uncompressed)")
+    meter.save()
+
+    parse_summary = parse_timer.summary()
+    if parse_summary:
+        print(f"[i] Parse: {parse_summary}")
+    parse_timer.reset()
+
+    history_writer = get_history_writer()
+    written = history_writer.summary()
+    if written:
+        print(f"[i] History: {written}")
+    history_writer.reset_stats()
+
+    filtered = get_anomaly_filter().summary()
+    if filtered:
+        print(f"[i] Price filter: {filtered}")
+    checkpoint.finish()
+    get_registry().save_stats()
+
+    print("\n" + "="*50)
+    print("[OK] Scrape cycle completed")
+    print("="*50)
@@ -0,0 +1,172 @@
+# scraper/embedded.py
+
+import html
+import json
+import threading
+from typing import Dict, Optional
+
+from scraper.prices import CURRENCY_RE
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# Upper bounds for one scan so a malformed page cannot make us read the
+# rest of the document looking for a closing tag
+MAX_TAG_CHARS = 512
+MAX_TEXT_CHARS = 2048
+MAX_BLOB_CHARS = 65536
+
+# Buy box offers as JSON in a hidden div: {"desktop_buybox_group_1": [{"displayPrice": ...}]}
+PRICE_DATA_MARKER = 'class="twister-plus-buying-options-price-data"'
+PRICE_DATA_GROUP = "desktop_buybox_group_1"
+
+# Variation pages need the DOM for per-child swatch offers
+VARIATION_MARKERS = ("dimensionValuesDisplayData", "dimensionToAsinMap")
+
+# Rating and review count may legitimately be missing, but only when the
+# page has none of the elements the DOM tier would read them from
+_OPTIONAL_FIELDS = {
+    "rating": ("rating-out-of-text", "a-icon-alt"),
+    "reviews": ("acrCustomerReviewText", "total-review-count"),
+}
+
+
+def _start_tag_end(source: str, marker: str, tag: str) -> int:
+    """Index just past the start tag carrying marker, or -1
+
+    The marker must sit inside a <tag ...> start tag, so an id that also
+    appears in a script or on another element is skipped.
+    """
+    pos = source.find(marker)
+    while pos != -1:
+        open_pos = source.rfind("<", max(0, pos - MAX_TAG_CHARS), pos)
+        if open_pos != -1 and source.startswith("<" + tag, open_pos) \
+                and ">" not in source[open_pos:pos]:
+            close = source.find(">", pos, pos + MAX_TAG_CHARS)
+            if close != -1:
+                return close + 1
+        pos = source.find(marker, pos + len(marker))
+    return -1
+
+
+def _text_at(source: str, start: int) -> Optional[str]:
+    """Text node starting at start, unescaped and whitespace-normalized"""
+    end = source.find("<", start, start + MAX_TEXT_CHARS)
+    if end == -1:
+        return None
+    text = " ".join(html.unescape(source[start:end]).split())
+    return text or None
+
+
+def _element_text(source: str, marker: str, tag: str = "span") -> Optional[str]:
+    start = _start_tag_end(source, marker, tag)
+    return _text_at(source, start) if start != -1 else None
+
+
+def _availability(source: str) -> Optional[str]:
+    """First span text inside the availability block"""
+    start = _start_tag_end(source, 'id="availability"', "div")
+    if start == -1:
+        return None
+    span = source.find("<span", start, start + MAX_TEXT_CHARS)
+    if span == -1:
+        return None
+    close = source.find(">", span, span + MAX_TAG_CHARS)
+    return _text_at(source, close + 1) if close != -1 else None
+
+
+def _buybox_price(source: str) -> Optional[str]:
+    """Display price of the buy box offer from the embedded price JSON"""
+    start = _start_tag_end(source, PRICE_DATA_MARKER, "div")
+    if start == -1:
+        return None
+    end = source.find("</div>", start, start + MAX_BLOB_CHARS)
+    if end == -1:
+        return None
+    blob = source[start:end].strip()
+    if "&" in blob:
+        blob = html.unescape(blob)
+    try:
+        data = _loads(blob)
+        offer = data[PRICE_DATA_GROUP][0]
+        price = " ".join(str(offer["displayPrice"]).split())
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+    return price if CURRENCY_RE.search(price) else None
+
+
+def extract_embedded(source: str) -> Optional[Dict[str, Optional[str]]]:
+    """Raw fields from inline JSON and element markers, without building a DOM
+
+    Returns {"title", "price_raw", "stock", "rating_raw", "reviews_raw"} in
+    the same form AmazonScraper.parse reads them with XPath, or None when
+    any field is missing and the page has to go through the DOM tier.
+    """
+    fields = {
+        "title": _element_text(source, 'id="productTitle"'),
+        "price_raw": _buybox_price(source),
+        "stock": _availability(source),
+    }
+    if not all(fields.values()):
+        return None
+
+    for name, marker in (("rating", 'data-hook="rating-out-of-text"'),
+                         ("reviews", 'id="acrCustomerReviewText"')):
+        value = _element_text(source, marker)
+        if value is None and any(m in source for m in _OPTIONAL_FIELDS[name]):
+            return None
+        fields[f"{name}_raw"] = value
+    return fields
+
+
+def has_variations(source: str) -> bool:
+    return any(marker in source for marker in VARIATION_MARKERS)
+
+
+class ParseTimer:
+    """Thread-safe time spent per parse tier
+
+    "embedded" is the marker/JSON scan (run on every page), "dom" is
+    building the lxml tree plus XPath evaluation. pages counts which tier
+    produced the result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds: Dict[str, float] = {}
+        self.runs: Dict[str, int] = {}
+        self.pages: Dict[str, int] = {}
+
+    def record(self, tier: str, seconds: float):
+        with self._lock:
+            self.seconds[tier] = self.seconds.get(tier, 0.0) + seconds
+            self.runs[tier] = self.runs.get(tier, 0) + 1
+
+    def resolved(self, tier: str):
+        with self._lock:
+            self.pages[tier] = self.pages.get(tier, 0) + 1
+
+    def summary(self) -> Optional[str]:
+        """One-line summary, or None if nothing was parsed"""
+        with self._lock:
+            total = sum(self.pages.values())
+            if not total:
+                return None
+            parts = [f"{self.pages.get('embedded', 0)} of {total} pages from embedded data"]
+            for tier in ("embedded", "dom"):
+                if self.runs.get(tier):
+                    avg = self.seconds[tier] / self.runs[tier] * 1000
+                    parts.append(f"{tier} {avg:.1f} ms/page over {self.runs[tier]}")
+            return ", ".join(parts)
+
+    def reset(self):
+        with self._lock:
+            self.seconds.clear()
+            self.runs.clear()
+            self.pages.clear()
+
+
+parse_timer = ParseTimer()
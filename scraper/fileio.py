@@ -0,0 +1,122 @@
+# scraper/fileio.py
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w", **kwargs):
+    """Open a temporary file next to path and move it over path on success
+
+    Readers see either the old file or the complete new one, never a
+    truncated mix, even if the process is killed mid-write. On error the
+    temporary file is removed and path is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def repair_tail(path: str) -> int:
+    """Cut a partial last line left by an interrupted append
+
+    Returns the number of bytes removed. Only the end of the file is
+    read, so this is cheap to call before every append.
+    """
+    if not os.path.isfile(path):
+        return 0
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return 0
+
+        # Walk back to the last complete line
+        end = size
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            block = f.read(end - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            end = start
+        else:
+            keep = 0
+        f.truncate(keep)
+        return size - keep
+
+
+def append_text(path: str, text: str, encoding: str = "utf-8"):
+    """Append complete lines with a single write after repairing a torn tail"""
+    removed = repair_tail(path)
+    if removed:
+        print(f"[!] Removed {removed} bytes of an interrupted write from {path}")
+    with open(path, "a", newline="", encoding=encoding) as f:
+        f.write(text)
+        f.flush()
+
+
+@contextmanager
+def locked(f):
+    """Hold an exclusive lock on an open file, across processes
+
+    Advisory (flock) where available; writers that all take it never
+    interleave their appends. Without fcntl the block runs unlocked.
+    """
+    if fcntl is None:
+        yield f
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+        yield f
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _same_file(f, path: str) -> bool:
+    try:
+        return os.fstat(f.fileno()).st_ino == os.stat(path).st_ino
+    except OSError:
+        return False
+
+
+@contextmanager
+def locked_append(path: str, encoding: str = "utf-8"):
+    """Open path for appending and hold its lock (see locked())
+
+    A file that was replaced while this waited for the lock (history
+    retention swaps in a rewritten file that way) is reopened, so the
+    append never lands in the old, unlinked copy.
+    """
+    while True:
+        f = open(path, "a", newline="", encoding=encoding)
+        try:
+            with locked(f):
+                if fcntl is None or _same_file(f, path):
+                    yield f
+                    return
+        finally:
+            f.close()
@@ -0,0 +1,127 @@
+# scraper/health.py
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    HEALTH_BACKOFF_BASE_MINUTES,
+    HEALTH_BACKOFF_MAX_MINUTES,
+    HEALTH_FAILURE_THRESHOLD,
+    HEALTH_PATH,
+)
+from scraper.fileio import atomic_write
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def page_problem(data: Dict) -> Optional[str]:
+    """Why a parsed product page is unusable, or None if it is fine
+
+    - empty_page: neither title nor price (dog page, delisted, captcha variant)
+    - no_offer: a title but no price and no availability text, typically a
+      variation parent that only lists its children
+    """
+    if not data.get("title") and not data.get("price_raw"):
+        return "empty_page"
+    if not data.get("price_raw") and (data.get("stock") or "Unknown") == "Unknown":
+        return "no_offer"
+    return None
+
+
+class HealthStore:
+    """Per-product health: consecutive failures, last error, last success
+
+    After HEALTH_FAILURE_THRESHOLD consecutive failures a product is only
+    re-checked on an exponential schedule (base * 2^n minutes, capped at
+    HEALTH_BACKOFF_MAX_MINUTES) instead of every cycle. One success
+    resets it. wasted_requests counts the requests spent on failures.
+    """
+
+    def __init__(self, path: str = HEALTH_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records: Optional[Dict[str, Dict]] = None
+
+    def load(self) -> Dict[str, Dict]:
+        if self._records is None:
+            self._records = {}
+            if os.path.isfile(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._records = json.load(f)
+                except Exception as e:
+                    print(f"[!] Error reading product health: {e}")
+        return self._records
+
+    def get(self, key: str) -> Dict:
+        return self.load().get(key, {})
+
+    def record_success(self, key: str):
+        with self._lock:
+            record = self.load().setdefault(key, {})
+            record.update(
+                failures=0,
+                last_success=time.strftime(TIME_FORMAT),
+                next_check=None,
+            )
+
+    def record_failure(self, key: str, error: str, requests: int = 1):
+        """Count a failed check; schedules the next re-check once unhealthy"""
+        with self._lock:
+            record = self.load().setdefault(key, {})
+            failures = record.get("failures", 0) + 1
+            record.update(
+                failures=failures,
+                last_error=error,
+                last_failure=time.strftime(TIME_FORMAT),
+                wasted_requests=record.get("wasted_requests", 0) + requests,
+                next_check=None,
+            )
+            errors = record.setdefault("errors", {})
+            errors[error] = errors.get(error, 0) + 1
+
+            if failures >= HEALTH_FAILURE_THRESHOLD:
+                exponent = failures - HEALTH_FAILURE_THRESHOLD
+                delay = min(HEALTH_BACKOFF_BASE_MINUTES * 2 ** exponent,
+                            HEALTH_BACKOFF_MAX_MINUTES)
+                record["next_check"] = time.strftime(
+                    TIME_FORMAT, time.localtime(time.time() + delay * 60))
+
+    def is_due(self, key: str, now: Optional[float] = None) -> bool:
+        next_check = self.get(key).get("next_check")
+        if not next_check:
+            return True
+        now = time.time() if now is None else now
+        return time.mktime(time.strptime(next_check, TIME_FORMAT)) <= now
+
+    def split_due(self, products: List[Dict], key_func) -> Tuple[List[Dict], List[Dict]]:
+        """Split products into (due now, deferred by backoff)"""
+        now = time.time()
+        due, deferred = [], []
+        for product in products:
+            (due if self.is_due(key_func(product), now) else deferred).append(product)
+        return due, deferred
+
+    def save(self):
+        with self._lock:
+            text = json.dumps(self.load(), indent=2)
+        try:
+            with atomic_write(self.path, encoding="utf-8") as f:
+                f.write(text)
+        except Exception as e:
+            print(f"[!] Error writing product health: {e}")
+
+
+# Shared instance for the scrape cycle
+_default_store: Optional[HealthStore] = None
+
+
+def get_health_store() -> HealthStore:
+    """Return the process-wide health store"""
+    global _default_store
+    if _default_store is None:
+        _default_store = HealthStore()
+    return _default_store
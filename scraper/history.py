@@ -0,0 +1,396 @@
+# scraper/history.py
+
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+from config import CSV_PATH
+from scraper.fileio import atomic_write
+from scraper.marketplaces import DEFAULT_MARKETPLACE, product_key
+from scraper.stock import StockState, classify_stock, parse_stock_state
+from scraper.utils import HISTORY_FIELDS, DELTA_FILL_FIELDS, parse_rating, parse_review_count
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Columns written per run by compact_history()
+RUN_FIELDS = [
+    "asin",
+    "marketplace",
+    "first_seen",
+    "last_seen",
+    "observations",
+    "price_raw",
+    "price",
+    "stock",
+    "stock_state",
+    "rating",
+    "reviews",
+]
+
+PARQUET_BATCH_ROWS = 50_000
+
+# Numeric columns of the Parquet export; the others are strings. Fixed up
+# front so a batch with a column that is all empty still has its type
+PARQUET_NUMERIC = {
+    "price": float,
+    "stock_state": int,
+    "stock_count": int,
+    "rating": float,
+    "reviews": int,
+}
+PARQUET_FIELDS = HISTORY_FIELDS + ["title", "url"]
+BACKFILL_CHUNK_ROWS = 500_000
+
+
+def normalize_timestamp(value: Optional[str], end_of_day: bool = False) -> Optional[str]:
+    """Turn a CLI date/datetime into the history timestamp format
+
+    Accepts "YYYY-MM-DD" or "YYYY-MM-DD HH:MM[:SS]". A bare date used as an
+    upper bound is extended to the end of that day.
+    """
+    if not value:
+        return None
+
+    for fmt in (TIMESTAMP_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d" and end_of_day:
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return parsed.strftime(TIMESTAMP_FORMAT)
+
+    raise ValueError(f"Invalid date: {value!r} (expected YYYY-MM-DD[ HH:MM:SS])")
+
+
+def complete_row(row: Dict, key: str, last_values: Dict[str, Dict], legacy: bool) -> Dict:
+    """Fill one raw history row in place to the current schema
+
+    Blank delta-mode fields come from last_values (the previous row of each
+    product, updated here); stock_state is derived for files written before
+    the column existed; legacy files get numeric rating/reviews.
+    """
+    # ASIN, marketplace and stock repeat on every row; share one
+    # string object each
+    row["asin"] = sys.intern(row.get("asin") or "")
+    row["marketplace"] = sys.intern(row.get("marketplace") or DEFAULT_MARKETPLACE)
+    row["stock"] = sys.intern(row.get("stock") or "")
+    if not row.get("stock_state"):
+        # Files written before the column existed
+        state, count = classify_stock(row["stock"])
+        row["stock_state"] = str(int(state))
+        row["stock_count"] = "" if count is None else str(count)
+
+    previous = last_values.setdefault(key, {})
+    for field in DELTA_FILL_FIELDS:
+        if row.get(field):
+            previous[field] = row[field]
+        elif field in previous:
+            row[field] = previous[field]
+
+    if legacy:
+        row["rating"] = parse_rating(row.get("rating_raw"))
+        row["reviews"] = parse_review_count(row.get("reviews_raw"))
+    return row
+
+
+def iter_history(path: str = CSV_PATH, asins: Optional[Iterable[str]] = None,
+                 since: Optional[str] = None, until: Optional[str] = None,
+                 with_meta: bool = False) -> Iterator[Dict]:
+    """Stream history rows one at a time, optionally filtered
+
+    Rows written in delta mode leave unchanged descriptive fields blank;
+    they are forward-filled from the previous row of the same ASIN, so
+    callers always see complete rows. Rows from legacy files get numeric
+    rating/reviews parsed from their text columns. With with_meta, title
+    and url are joined in from the product metadata table.
+
+    asins filters by product key (bare ASIN for the default marketplace,
+    "ASIN@<marketplace>" otherwise). Timestamps are stored as zero-padded "YYYY-MM-DD HH:MM:SS" strings, so
+    the date range is checked with plain string comparisons.
+    """
+    if not os.path.isfile(path):
+        return
+
+    wanted = set(asins) if asins else None
+    last_values: Dict[str, Dict] = {}
+    meta = {}
+    if with_meta:
+        from scraper.product_meta import get_meta_store
+        meta = get_meta_store().load()
+
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        legacy = "rating" not in (reader.fieldnames or [])
+
+        for row in reader:
+            asin = row.get("asin") or ""
+            marketplace = row.get("marketplace") or DEFAULT_MARKETPLACE
+            key = product_key(asin, marketplace)
+            if wanted is not None and key not in wanted:
+                continue
+
+            complete_row(row, key, last_values, legacy)
+
+            if with_meta:
+                product = meta.get(key, {})
+                row.setdefault("title", product.get("title"))
+                row.setdefault("url", product.get("url"))
+
+            timestamp = row.get("timestamp") or ""
+            if since and timestamp < since:
+                continue
+            if until and timestamp > until:
+                continue
+            yield row
+
+
+# ============================================================
+# EXPORT
+# ============================================================
+
+def _export_csv(rows: Iterator[Dict], output: str) -> int:
+    count = 0
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(row.keys()))
+                writer.writeheader()
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def _export_jsonl(rows: Iterator[Dict], output: str) -> int:
+    count = 0
+    with open(output, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def _parquet_row(row: Dict) -> Dict:
+    """row with the columns of PARQUET_FIELDS in their Parquet types"""
+    typed = {}
+    for name in PARQUET_FIELDS:
+        value = row.get(name)
+        if value in (None, ""):
+            typed[name] = None
+        elif name in PARQUET_NUMERIC:
+            try:
+                number = float(value)
+                typed[name] = int(number) if PARQUET_NUMERIC[name] is int else number
+            except (TypeError, ValueError):
+                typed[name] = None
+        else:
+            typed[name] = str(value)
+    return typed
+
+
+def _export_parquet(rows: Iterator[Dict], output: str) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError(
+            "Parquet export requires pyarrow (pip install pyarrow)")
+
+    types = {float: pa.float64(), int: pa.int64()}
+    schema = pa.schema([(name, types[PARQUET_NUMERIC[name]] if name in PARQUET_NUMERIC
+                         else pa.string()) for name in PARQUET_FIELDS])
+
+    count = 0
+    writer = None
+    batch = []
+
+    def flush():
+        nonlocal writer
+        table = pa.Table.from_pylist(batch, schema=schema)
+        if writer is None:
+            writer = pq.ParquetWriter(output, schema)
+        writer.write_table(table)
+        batch.clear()
+
+    try:
+        for row in rows:
+            batch.append(_parquet_row(row))
+            count += 1
+            if len(batch) >= PARQUET_BATCH_ROWS:
+                flush()
+        if batch:
+            flush()
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return count
+
+
+EXPORTERS = {
+    "csv": _export_csv,
+    "jsonl": _export_jsonl,
+    "parquet": _export_parquet,
+}
+
+
+def export_history(output: str, fmt: str = "csv", path: str = CSV_PATH,
+                   asins: Optional[Iterable[str]] = None,
+                   since: Optional[str] = None, until: Optional[str] = None) -> int:
+    """Stream filtered history rows to CSV, JSONL or Parquet
+
+    Rows are written as they are read (Parquet in fixed-size batches), so
+    memory use does not grow with the size of the history file.
+    """
+    if fmt not in EXPORTERS:
+        raise ValueError(
+            f"Unknown export format: {fmt} (choose from {', '.join(EXPORTERS)})")
+
+    rows = iter_history(path, asins, since, until, with_meta=True)
+    return EXPORTERS[fmt](rows, output)
+
+
+def migrate_history(output: str, path: str = CSV_PATH) -> int:
+    """Rewrite a legacy history file into the normalized schema
+
+    Title and url are moved into the product metadata table; rating and
+    review text become numeric columns; stock_state is derived where it is
+    missing. output replaces its file only once complete, so it may be path
+    itself (the history writer migrates in place that way).
+    """
+    from scraper.product_meta import get_meta_store
+
+    store = get_meta_store()
+    count = 0
+
+    with atomic_write(output, newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(
+            f, fieldnames=HISTORY_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+
+        for row in iter_history(path):
+            if row.get("title") or row.get("url"):
+                store.update(product_key(row["asin"], row["marketplace"]), row.get("title"),
+                             row.get("url"), persist=False)
+            writer.writerow(row)
+            count += 1
+
+    store.save()
+    return count
+
+
+# ============================================================
+# COMPACTION
+# ============================================================
+
+def _run_from_row(row: Dict) -> Dict:
+    return {
+        "asin": row.get("asin", ""),
+        "marketplace": row.get("marketplace", ""),
+        "first_seen": row.get("timestamp", ""),
+        "last_seen": row.get("timestamp", ""),
+        "observations": 1,
+        "price_raw": row.get("price_raw", ""),
+        "price": row.get("price", ""),
+        "stock": row.get("stock", ""),
+        "stock_state": row.get("stock_state", ""),
+        "rating": row.get("rating", ""),
+        "reviews": row.get("reviews", ""),
+    }
+
+
+def compact_history(output: str, path: str = CSV_PATH) -> Dict:
+    """Collapse consecutive identical observations into change-only runs
+
+    Two observations of the same ASIN belong to one run when price and
+    stock are unchanged. Only the currently open run per ASIN is kept in
+    memory; a run is written out as soon as the next change closes it.
+    Rating and review count are taken from the latest observation; title
+    and url stay in the product metadata table.
+    """
+    open_runs: Dict[str, Dict] = {}
+    rows_in = 0
+    runs_out = 0
+
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=RUN_FIELDS)
+        writer.writeheader()
+
+        for row in iter_history(path):
+            rows_in += 1
+            key = product_key(row["asin"], row["marketplace"])
+            run = open_runs.get(key)
+
+            if run and run["price"] == row.get("price", "") and run["stock"] == row.get("stock", ""):
+                run["last_seen"] = row.get("timestamp", "")
+                run["observations"] += 1
+                for field in ("rating", "reviews"):
+                    if row.get(field) not in (None, ""):
+                        run[field] = row[field]
+                continue
+
+            if run:
+                writer.writerow(run)
+                runs_out += 1
+            open_runs[key] = _run_from_row(row)
+
+        for run in open_runs.values():
+            writer.writerow(run)
+            runs_out += 1
+
+    return {"rows_in": rows_in, "runs_out": runs_out}
+
+
+def iter_stock_transitions(path: str = CSV_PATH, asins: Optional[Iterable[str]] = None,
+                           since: Optional[str] = None,
+                           until: Optional[str] = None) -> Iterator[Dict]:
+    """Stream the rows where a product's stock state changed
+
+    Compares the integer stock_state of consecutive rows per product, so
+    wording changes ("In Stock." vs "In stock") are not transitions while
+    "In Stock" -> "Currently unavailable" is. Yields {"timestamp", "key",
+    "from", "to", "stock"} with StockState values; the first row of each
+    product is not a transition. Unknown rows (e.g. search results without
+    a stock note) are skipped, as the alert rollups skip them.
+    """
+    last: Dict[str, StockState] = {}
+    for row in iter_history(path, asins, since, until):
+        key = product_key(row["asin"], row["marketplace"])
+        state = parse_stock_state(row.get("stock_state"))
+        if state is StockState.UNKNOWN:
+            continue
+        previous = last.get(key)
+        last[key] = state
+        if previous is not None and previous != state:
+            yield {"timestamp": row.get("timestamp", ""), "key": key,
+                   "from": previous, "to": state, "stock": row.get("stock", "")}
+
+
+def backfill_prices(output: str, path: str = CSV_PATH,
+                    default_currency: str = "USD",
+                    chunk_rows: int = BACKFILL_CHUNK_ROWS) -> int:
+    """Recompute the price column from price_raw for a whole history file
+
+    Reads the file in chunks and runs scraper.prices.normalize_prices on
+    each, so millions of rows are re-parsed without a per-row Python loop.
+    """
+    import pandas as pd
+    from scraper.prices import normalize_prices
+
+    count = 0
+    first = True
+    for chunk in pd.read_csv(path, dtype=str, keep_default_na=False,
+                             chunksize=chunk_rows):
+        chunk["price"] = normalize_prices(
+            chunk["price_raw"].replace("", None), default_currency)["price"]
+        chunk.to_csv(output, mode="w" if first else "a",
+                     header=first, index=False)
+        first = False
+        count += len(chunk)
+
+    return count
@@ -0,0 +1,318 @@
+# scraper/history_writer.py
+
+import atexit
+import csv
+import io
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import (CSV_PATH, HISTORY_AUTO_MIGRATE, HISTORY_BATCH_MS, HISTORY_BATCH_ROWS,
+                    HISTORY_DURABILITY)
+from scraper.fileio import locked_append, repair_tail
+
+DURABILITY_LEVELS = ("buffered", "fsync", "sync")
+
+# Wait before retrying a group whose append failed
+RETRY_SECONDS = 1.0
+
+_ROW, _FLUSH, _CALLBACK, _STOP = "row", "flush", "callback", "stop"
+
+
+class _Waiter:
+    """Lets a producer block until its entry has been handled"""
+
+    __slots__ = ("event", "ok")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.ok = False
+
+    def done(self, ok: bool):
+        self.ok = ok
+        self.event.set()
+
+
+class HistoryWriter:
+    """Single writer for a history file, fed by a queue
+
+    Any number of threads enqueue rows (dicts) with write(); one
+    background thread appends them in groups (group commit): a group is
+    written once it has batch_rows rows or its oldest row has waited
+    batch_ms, with one write() call under an exclusive file lock, so
+    other processes appending to the same file never interleave with it.
+    Rows are encoded under that lock in the columns of the file's header,
+    so a file replaced by another process is written in its own layout.
+    The header is written by whichever writer finds the file empty; a file
+    missing columns of the current schema is migrated first (see
+    HISTORY_AUTO_MIGRATE).
+
+    durability is "buffered" (flush each group to the OS), "fsync" (also
+    fsync it) or "sync" (fsync, and write() returns only once the row's
+    group is on disk; a group is then also committed whenever the queue
+    runs empty, so it holds the rows of every producer that was waiting).
+    A failed append keeps its rows and is retried every RETRY_SECONDS;
+    producers and flush() waiting on them keep waiting until the retry
+    succeeds. Rows still failing when the writer is closed are reported
+    as lost.
+    """
+
+    def __init__(self, path: str = CSV_PATH, batch_rows: int = HISTORY_BATCH_ROWS,
+                 batch_ms: int = HISTORY_BATCH_MS, durability: str = HISTORY_DURABILITY):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown history durability '{durability}' "
+                             f"(choose from: {', '.join(DURABILITY_LEVELS)})")
+        self.path = path
+        self.batch_rows = max(1, batch_rows)
+        self.batch_seconds = max(0, batch_ms) / 1000
+        self.durability = durability
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    # Producers
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-writer",
+                                                daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def write(self, row: Dict) -> bool:
+        """Queue one row; in "sync" mode wait until it is on disk"""
+        self._ensure_started()
+        waiter = _Waiter() if self.durability == "sync" else None
+        self._queue.put((_ROW, row, waiter))
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self.max_depth = max(self.max_depth, depth)
+            if self.first_write is None:
+                self.first_write = time.perf_counter()
+        if waiter is None:
+            return True
+        waiter.event.wait()
+        return waiter.ok
+
+    def after_commit(self, callback: Callable[[], None]):
+        """Call callback once every row queued so far is written
+
+        Runs in the writer thread, right after the commit of the group
+        holding those rows (at once if none are waiting), and never if
+        they could not be written.
+        """
+        if self._thread is None:
+            callback()
+            return
+        self._queue.put((_CALLBACK, callback, None))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Commit everything queued so far; False if not written within timeout"""
+        if self._thread is None:
+            return True
+        waiter = _Waiter()
+        self._queue.put((_FLUSH, None, waiter))
+        return waiter.event.wait(timeout) and waiter.ok
+
+    def close(self):
+        """Commit what is queued and stop the writer thread"""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put((_STOP, None, None))
+        thread.join()
+        try:
+            atexit.unregister(self.close)
+        except Exception:
+            pass
+
+    # Writer thread
+
+    def _run(self):
+        pending: List[Dict] = []
+        waiters: List[_Waiter] = []
+        callbacks: List[Callable[[], None]] = []
+        deadline = None
+        retry_at = 0.0
+
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, row, waiter = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                kind, row, waiter = None, None, None
+
+            if kind == _ROW:
+                pending.append(row)
+                if waiter is not None:
+                    waiters.append(waiter)
+                if deadline is None:
+                    deadline = time.monotonic() + self.batch_seconds
+                # Waiting producers are not adding rows: commit as soon as
+                # the queue is drained instead of waiting for the timer
+                idle = waiters and self._queue.empty()
+                if len(pending) < self.batch_rows and not idle:
+                    continue
+            elif kind == _FLUSH and waiter is not None:
+                waiters.append(waiter)
+            elif kind == _CALLBACK:
+                callbacks.append(row)
+                # Runs with the commit of the group it follows
+                if pending:
+                    continue
+
+            # After a failed append, wait for the retry time whatever arrives
+            if kind != _STOP and pending and time.monotonic() < retry_at:
+                continue
+
+            ok = self._commit(pending) if pending else True
+            if ok:
+                for callback in callbacks:
+                    try:
+                        callback()
+                    except Exception as e:
+                        print(f"[!] History commit callback failed: {e}")
+                for w in waiters:
+                    w.done(True)
+                pending, waiters, callbacks = [], [], []
+                deadline = None
+            else:
+                # Rows and their waiters stay until the retry succeeds
+                retry_at = deadline = time.monotonic() + RETRY_SECONDS
+
+            if kind == _STOP:
+                if pending:
+                    print(f"[X] {len(pending)} history rows could not be written to {self.path}")
+                    for w in waiters:
+                        w.done(False)
+                return
+
+    @staticmethod
+    def _encode(rows: List[Dict], header: List[str], with_header: bool) -> str:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if with_header:
+            writer.writerow(header)
+        for row in rows:
+            writer.writerow(["" if row.get(key) is None else row[key] for key in header])
+        return buffer.getvalue()
+
+    def _migrate(self, header: List[str]):
+        """Rewrite the file in the current schema (called under its lock)"""
+        from scraper.history import migrate_history
+        from scraper.utils import HISTORY_FIELDS
+
+        missing = ", ".join(key for key in HISTORY_FIELDS if key not in header)
+        print(f"[*] Migrating {self.path} to the current history schema (missing: {missing})")
+        count = migrate_history(self.path, self.path)
+        print(f"[OK] Migrated {count} history rows")
+
+    def _commit(self, rows: List[Dict]) -> bool:
+        from scraper.utils import HISTORY_FIELDS, history_header
+
+        started = time.perf_counter()
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            while True:
+                with locked_append(self.path) as f:
+                    # Under the lock: another process may have left a torn
+                    # line, created, migrated or replaced the file since
+                    # this one last looked
+                    removed = repair_tail(self.path)
+                    if removed:
+                        print(f"[!] Removed {removed} bytes of an interrupted write "
+                              f"from {self.path}")
+                    header = history_header(self.path)
+                    if HISTORY_AUTO_MIGRATE and header[:1] == ["timestamp"] \
+                            and not set(HISTORY_FIELDS) <= set(header):
+                        # The migrated file replaces this one: append to it
+                        self._migrate(header)
+                        continue
+                    f.write(self._encode(rows, header, os.path.getsize(self.path) == 0))
+                    f.flush()
+                    if self.durability != "buffered":
+                        os.fsync(f.fileno())
+                break
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            print(f"[X] History write failed ({len(rows)} rows kept for retry): {e}")
+            return False
+
+        with self._stats_lock:
+            self.rows += len(rows)
+            self.commits += 1
+            self.commit_seconds += time.perf_counter() - started
+            self.last_commit = time.perf_counter()
+        return True
+
+    # Stats
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.rows = 0
+            self.commits = 0
+            self.errors = 0
+            self.commit_seconds = 0.0
+            self.max_depth = 0
+            self.first_write = None
+            self.last_commit = None
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            # From the first queued row to the last commit: includes the
+            # time rows wait for their group, as a producer sees it
+            span = (self.last_commit - self.first_write) \
+                if self.first_write and self.last_commit else 0.0
+            return {
+                "rows": self.rows,
+                "commits": self.commits,
+                "errors": self.errors,
+                "rows_per_commit": round(self.rows / self.commits, 1) if self.commits else 0.0,
+                "rows_per_second": round(self.rows / span, 1) if span > 0 else None,
+                "commit_ms": round(self.commit_seconds / self.commits * 1000, 2)
+                if self.commits else 0.0,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_depth,
+            }
+
+    def summary(self) -> Optional[str]:
+        """One-line summary, or None if nothing was written"""
+        stats = self.stats()
+        if not stats["rows"] and not stats["errors"]:
+            return None
+        rate = f", {stats['rows_per_second']:.0f} rows/s" if stats["rows_per_second"] else ""
+        return (f"{stats['rows']} rows in {stats['commits']} commits "
+                f"({stats['rows_per_commit']} rows/commit, {stats['commit_ms']} ms/commit{rate}), "
+                f"queue max {stats['max_queue_depth']}, {self.durability}"
+                + (f", {stats['errors']} failed appends" if stats["errors"] else ""))
+
+
+_writers: Dict[str, HistoryWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_history_writer(path: str = CSV_PATH) -> HistoryWriter:
+    """The process-wide writer of a history file"""
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = HistoryWriter(path)
+        return writer
+
+
+def close_history_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()
@@ -0,0 +1,118 @@
+# scraper/marketplaces.py
+
+from typing import Dict, List, NamedTuple, Optional
+
+from config import BASE_URL
+
+
+class Marketplace(NamedTuple):
+    """Domain-specific settings for one Amazon storefront"""
+
+    code: str                   # short code stored on products ("com", "de", ...)
+    domain: str                 # host name, e.g. "www.amazon.de"
+    currency: str               # ISO code used for a bare "$"/unlabeled price
+    language: str               # lc-* cookie value, e.g. "de_DE"
+    accept_language: str        # accept-language header
+    cookie_suffix: str          # suffix of ubid-/lc- cookies ("main", "acbde", ...)
+    session_prefix: str         # leading block of session-id / ubid cookies
+    warmup_paths: List[str]     # pages visited before the product page
+    blocked_patterns: List[str]  # localized captcha / robot check phrases
+
+    @property
+    def base_url(self) -> str:
+        return f"https://{self.domain}"
+
+    def product_url(self, asin: str) -> str:
+        return f"{self.base_url}/dp/{asin}"
+
+
+MARKETPLACES: Dict[str, Marketplace] = {
+    "com": Marketplace(
+        code="com",
+        domain="www.amazon.com",
+        currency="USD",
+        language="en_US",
+        accept_language="en-US,en;q=0.9",
+        cookie_suffix="main",
+        session_prefix="142",
+        warmup_paths=["/", "/books-used-books-textbooks/b?node=283155"],
+        blocked_patterns=[],
+    ),
+    "co.uk": Marketplace(
+        code="co.uk",
+        domain="www.amazon.co.uk",
+        currency="GBP",
+        language="en_GB",
+        accept_language="en-GB,en;q=0.9",
+        cookie_suffix="acbuk",
+        session_prefix="262",
+        warmup_paths=["/", "/books-used-books-textbooks/b?node=266239"],
+        blocked_patterns=[],
+    ),
+    "de": Marketplace(
+        code="de",
+        domain="www.amazon.de",
+        currency="EUR",
+        language="de_DE",
+        accept_language="de-DE,de;q=0.9,en;q=0.8",
+        cookie_suffix="acbde",
+        session_prefix="257",
+        warmup_paths=["/", "/buecher-buch-lesen/b?node=186606"],
+        blocked_patterns=[
+            "geben sie die zeichen unten ein",
+            "wir müssen sicherstellen, dass sie kein roboter sind",
+        ],
+    ),
+    "co.jp": Marketplace(
+        code="co.jp",
+        domain="www.amazon.co.jp",
+        currency="JPY",
+        language="ja_JP",
+        accept_language="ja-JP,ja;q=0.9,en;q=0.8",
+        cookie_suffix="acbjp",
+        session_prefix="355",
+        warmup_paths=["/", "/books-used-books-textbooks/b?node=465392"],
+        blocked_patterns=[
+            "表示されている文字を入力してください",
+            "ロボットではないことを確認",
+        ],
+    ),
+}
+
+
+def _code_from_domain(value: str) -> str:
+    """Extract the marketplace code from a domain or URL (amazon.de -> de)"""
+    value = value.lower().strip()
+    for prefix in ("https://", "http://"):
+        if value.startswith(prefix):
+            value = value[len(prefix):]
+    value = value.split("/")[0]
+    if "amazon." in value:
+        value = value.split("amazon.", 1)[1]
+    return value
+
+
+DEFAULT_MARKETPLACE = _code_from_domain(BASE_URL)
+
+
+def get_marketplace(code: Optional[str] = None) -> Marketplace:
+    """Look up a marketplace by code or domain ("de", "amazon.de", "www.amazon.de")
+
+    Raises ValueError for unsupported marketplaces.
+    """
+    key = _code_from_domain(code) if code else DEFAULT_MARKETPLACE
+    if key not in MARKETPLACES:
+        raise ValueError(
+            f"Unsupported marketplace: {code} (choose from {', '.join(MARKETPLACES)})")
+    return MARKETPLACES[key]
+
+
+def product_key(asin: str, marketplace: Optional[str] = None) -> str:
+    """Identifier of a tracked product
+
+    The same ASIN can be tracked on several marketplaces. Products on the
+    default marketplace are keyed by the bare ASIN (as they always were);
+    others get a suffix, e.g. "B08N5WRWNW@de".
+    """
+    code = marketplace if marketplace in MARKETPLACES else get_marketplace(marketplace).code
+    return asin if code == DEFAULT_MARKETPLACE else f"{asin}@{code}"
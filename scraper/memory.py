@@ -0,0 +1,166 @@
+# scraper/memory.py
+
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from config import (
+    MEMORY_PATH,
+    MEMORY_RECYCLE_CYCLES,
+    MEMORY_RECYCLE_MB,
+    MEMORY_TRACEMALLOC,
+)
+from scraper.fileio import atomic_write
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Snapshots kept in MEMORY_PATH
+MAX_SNAPSHOTS = 200
+
+# Allocation sites listed per tracemalloc snapshot
+TOP_GROWTH = 5
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size of this process, or None if unknown
+
+    Reads /proc on Linux; elsewhere falls back to the peak RSS reported by
+    getrusage, which can only grow and so still shows a leak.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _mb(value: Optional[int]) -> Optional[float]:
+    return round(value / 1048576, 1) if value is not None else None
+
+
+class MemoryMonitor:
+    """Per-cycle memory snapshots for a long-running process
+
+    after_cycle() records RSS (and, with MEMORY_TRACEMALLOC, the Python
+    heap and the allocation sites that grew most since the first cycle)
+    to MEMORY_PATH, and tells the caller whether the process should be
+    recycled: after recycle_cycles cycles or once RSS passes recycle_mb.
+    """
+
+    def __init__(self, label: str = "loop", path: str = MEMORY_PATH,
+                 recycle_cycles: int = MEMORY_RECYCLE_CYCLES,
+                 recycle_mb: int = MEMORY_RECYCLE_MB,
+                 trace: bool = MEMORY_TRACEMALLOC):
+        self.label = label
+        self.path = path
+        self.recycle_cycles = recycle_cycles
+        self.recycle_mb = recycle_mb
+        self.trace = trace
+        self.cycles = 0
+        self.start_rss = rss_bytes()
+        self._baseline = None
+
+        if trace:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def _growth(self) -> List[Dict]:
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)])
+        if self._baseline is None:
+            self._baseline = snapshot
+            return []
+        stats = snapshot.compare_to(self._baseline, "lineno")
+        return [
+            {"site": str(stat.traceback), "size_kb": round(stat.size_diff / 1024, 1),
+             "count": stat.count_diff}
+            for stat in stats[:TOP_GROWTH] if stat.size_diff > 0
+        ]
+
+    def snapshot(self) -> Dict:
+        rss = rss_bytes()
+        entry = {
+            "time": time.strftime(TIME_FORMAT),
+            "pid": os.getpid(),
+            "process": self.label,
+            "cycle": self.cycles,
+            "rss_mb": _mb(rss),
+            "rss_growth_mb": _mb(rss - self.start_rss) if rss and self.start_rss else None,
+        }
+        if self.trace:
+            import tracemalloc
+
+            current, peak = tracemalloc.get_traced_memory()
+            entry.update(python_mb=_mb(current), python_peak_mb=_mb(peak),
+                         growth=self._growth())
+        return entry
+
+    def save(self, entry: Dict):
+        snapshots = load_memory_snapshots(self.path)
+        snapshots.append(entry)
+        try:
+            with atomic_write(self.path, encoding="utf-8") as f:
+                json.dump(snapshots[-MAX_SNAPSHOTS:], f, indent=2)
+        except Exception as e:
+            print(f"[!] Error writing memory snapshots: {e}")
+
+    def after_cycle(self) -> bool:
+        """Record a snapshot; True if the process should be recycled now"""
+        self.cycles += 1
+        entry = self.snapshot()
+        self.save(entry)
+
+        if entry["rss_mb"] is not None:
+            print(f"[i] Memory: RSS {entry['rss_mb']:.1f} MB "
+                  f"({entry['rss_growth_mb'] or 0:+.1f} MB since start, cycle {self.cycles})")
+
+        if self.recycle_cycles and self.cycles >= self.recycle_cycles:
+            print(f"[*] Recycling process after {self.cycles} cycles")
+            return True
+        if self.recycle_mb and entry["rss_mb"] and entry["rss_mb"] >= self.recycle_mb:
+            print(f"[*] Recycling process: RSS {entry['rss_mb']:.1f} MB "
+                  f"over the {self.recycle_mb} MB limit")
+            return True
+        return False
+
+
+def load_memory_snapshots(path: str = MEMORY_PATH) -> List[Dict]:
+    if not os.path.isfile(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[!] Error reading memory snapshots: {e}")
+        return []
+
+
+def recycle_process():
+    """Replace this process with a fresh run of the same command line
+
+    Everything the old process held (native client handles, fragmented
+    heaps) goes away; products.json, the history and the checkpoint are
+    on disk, so nothing is lost.
+    """
+    from scraper.history_writer import close_history_writers
+    from scraper.session_pool import close_all_pools
+
+    close_all_pools()
+    # exec skips atexit, so queued history rows are written here
+    close_history_writers()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(sys.executable, [sys.executable] + sys.argv)
@@ -0,0 +1,109 @@
+# scraper/planner.py
+
+import math
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import (
+    PLANNER_NEAR_TARGET_PCT,
+    PLANNER_STOCK_BOOST,
+    PLANNER_TARGET_BOOST,
+    STALENESS_SLO_MINUTES,
+)
+from scraper.stock import StockState, stock_state
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def product_age(product: Dict, now: Optional[float] = None) -> float:
+    """Seconds since the product's last successful check (inf if never checked)"""
+    now = time.time() if now is None else now
+    last_checked = product.get("last_checked")
+    if not last_checked:
+        return float("inf")
+    try:
+        checked = datetime.strptime(last_checked, TIME_FORMAT).timestamp()
+    except ValueError:
+        return float("inf")
+    return max(0.0, now - checked)
+
+
+def priority_boost(product: Dict) -> float:
+    """Multiplier on a product's age: >1 for products worth checking sooner
+
+    - price within PLANNER_NEAR_TARGET_PCT of the target price
+    - stock alert set and the product was last seen out of stock
+    """
+    boost = 1.0
+
+    target = product.get("target_price")
+    price = product.get("last_price")
+    if target and price is not None and price <= target * (1 + PLANNER_NEAR_TARGET_PCT / 100):
+        boost *= PLANNER_TARGET_BOOST
+
+    if product.get("stock_alert") and product.get("last_stock"):
+        state = product.get("last_stock_state")
+        state = StockState(state) if state is not None else stock_state(product["last_stock"])
+        if not state.buyable:
+            boost *= PLANNER_STOCK_BOOST
+
+    return boost
+
+
+def plan_cycle(products: List[Dict], now: Optional[float] = None,
+               slo_minutes: int = STALENESS_SLO_MINUTES) -> List[Dict]:
+    """Order products so the stalest (and most interesting) are checked first
+
+    Products over the staleness SLO come first, oldest first; the rest are
+    ordered by age times priority boost. A cycle cut short by blocks or
+    timeouts therefore drops the freshest products instead of always the
+    same tail of the list.
+    """
+    now = time.time() if now is None else now
+    slo = slo_minutes * 60
+
+    def sort_key(product):
+        age = product_age(product, now)
+        if age > slo:
+            return (0, -age)
+        return (1, -age * priority_boost(product))
+
+    return sorted(products, key=sort_key)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def staleness_report(products: List[Dict], now: Optional[float] = None,
+                     slo_minutes: int = STALENESS_SLO_MINUTES) -> Dict:
+    """Distribution of age since last successful check, in minutes"""
+    now = time.time() if now is None else now
+    ages = sorted(product_age(p, now) / 60 for p in products)
+    checked = [age for age in ages if age != float("inf")]
+
+    report = {
+        "products": len(ages),
+        "never_checked": len(ages) - len(checked),
+        "over_slo": sum(1 for age in ages if age > slo_minutes),
+        "slo_minutes": slo_minutes,
+        "p50": None,
+        "p99": None,
+        "max": None,
+    }
+    if checked:
+        report.update(p50=_percentile(checked, 50), p99=_percentile(checked, 99),
+                      max=checked[-1])
+    return report
+
+
+def format_staleness(report: Dict) -> str:
+    """One-line summary of a staleness report"""
+    if report["p50"] is None:
+        return f"{report['products']} products, none checked yet"
+    return (f"age p50 {report['p50']:.0f} min, p99 {report['p99']:.0f} min, "
+            f"max {report['max']:.0f} min; {report['over_slo']} over the "
+            f"{report['slo_minutes']} min SLO, {report['never_checked']} never checked")
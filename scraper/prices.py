@@ -0,0 +1,180 @@
+# scraper/prices.py
+
+import re
+from typing import Optional, Tuple
+
+# Currency markers, longest first so "CDN$" wins over "$"
+_CURRENCY_TOKENS = {
+    "US$": "USD",
+    "CDN$": "CAD",
+    "C$": "CAD",
+    "AU$": "AUD",
+    "A$": "AUD",
+    "MX$": "MXN",
+    "R$": "BRL",
+    "S$": "SGD",
+    "USD": "USD",
+    "EUR": "EUR",
+    "GBP": "GBP",
+    "JPY": "JPY",
+    "CAD": "CAD",
+    "AUD": "AUD",
+    "INR": "INR",
+    "MXN": "MXN",
+    "BRL": "BRL",
+    "SEK": "SEK",
+    "PLN": "PLN",
+    "TRY": "TRY",
+    "zł": "PLN",
+    "kr": "SEK",
+    "TL": "TRY",
+    "£": "GBP",
+    "€": "EUR",
+    "¥": "JPY",
+    "￥": "JPY",
+    "₹": "INR",
+    "$": None,  # ambiguous; resolved with the marketplace default
+}
+
+# Currencies that are never quoted with decimals, so every separator
+# in their amounts is a thousands separator
+ZERO_DECIMAL_CURRENCIES = {"JPY"}
+
+CURRENCY_RE = re.compile(
+    "|".join(re.escape(t) for t in sorted(_CURRENCY_TOKENS, key=len, reverse=True)))
+
+# First number in the string, allowing grouped thousands ("1.234.567,89",
+# "1 234,56", "1'234.50") as well as plain amounts ("24.99", "24,99")
+# (NBSP and narrow NBSP are spelled out for pandas' pyarrow regex engine)
+_GROUPING_CHARS = "'\\s\u00a0\u202f"
+NUMBER_PATTERN = r"(\d{1,3}(?:[.," + _GROUPING_CHARS + r"]\d{3})+(?:[.,]\d+)?|\d+(?:[.,]\d+)?)"
+NUMBER_RE = re.compile(NUMBER_PATTERN)
+
+_GROUPING_RE = re.compile("[" + _GROUPING_CHARS + "]")
+
+
+def detect_currency(text: Optional[str], default: Optional[str] = "USD") -> Optional[str]:
+    """Return the ISO code of the first currency marker in text
+
+    A bare "$" resolves to default (the marketplace currency).
+    """
+    if not text:
+        return None
+    match = CURRENCY_RE.search(text)
+    if not match:
+        return default
+    return _CURRENCY_TOKENS[match.group(0)] or default
+
+
+def _number_to_float(number: str, zero_decimal: bool = False) -> Optional[float]:
+    """Convert an extracted number string to float, inferring separators
+
+    - both "." and "," present: the last one is the decimal separator
+    - one separator used several times: thousands grouping
+    - one separator used once: decimal, unless exactly three digits follow
+    """
+    number = _GROUPING_RE.sub("", number)
+
+    if zero_decimal:
+        cleaned = number.replace(",", "").replace(".", "")
+    else:
+        dot = number.rfind(".")
+        comma = number.rfind(",")
+        if dot >= 0 and comma >= 0:
+            if comma > dot:
+                cleaned = number.replace(".", "").replace(",", ".")
+            else:
+                cleaned = number.replace(",", "")
+        elif comma >= 0 or dot >= 0:
+            sep = "," if comma >= 0 else "."
+            pos = max(comma, dot)
+            if number.count(sep) == 1 and len(number) - pos - 1 != 3:
+                cleaned = number.replace(sep, ".")
+            else:
+                cleaned = number.replace(sep, "")
+        else:
+            cleaned = number
+
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+def parse_price(text: Optional[str], default_currency: Optional[str] = "USD") -> Tuple[Optional[float], Optional[str]]:
+    """Parse a price string into (amount, currency code)
+
+    Examples:
+        "$1,234.56"   -> (1234.56, "USD")
+        "1.234,56 €"  -> (1234.56, "EUR")
+        "£15.50"      -> (15.5, "GBP")
+        "￥1,280"     -> (1280.0, "JPY")
+        "$19.99 - $29.99" -> (19.99, "USD")
+    """
+    if not text:
+        return None, None
+
+    currency = detect_currency(text, default_currency)
+    match = NUMBER_RE.search(text)
+    if not match:
+        return None, currency
+
+    amount = _number_to_float(
+        match.group(1), zero_decimal=currency in ZERO_DECIMAL_CURRENCIES)
+    return amount, currency
+
+
+def parse_amount(text: Optional[str], default_currency: Optional[str] = "USD") -> Optional[float]:
+    """Parse a price string into its amount only"""
+    return parse_price(text, default_currency)[0]
+
+
+# ============================================================
+# VECTORIZED PATH
+# ============================================================
+
+def normalize_prices(raw, default_currency: Optional[str] = "USD"):
+    """Vectorized parse_price over a pandas Series of price strings
+
+    Returns a DataFrame with "price" (float64) and "currency" columns,
+    aligned with the input index. Produces the same values as
+    parse_price, but runs as a handful of whole-column string and NumPy
+    operations instead of a Python loop per row.
+    """
+    import numpy as np
+    import pandas as pd
+
+    raw = pd.Series(raw, dtype="string")
+
+    codes = {token: code or default_currency for token, code in _CURRENCY_TOKENS.items()}
+    token = raw.str.extract(f"({CURRENCY_RE.pattern})", expand=False)
+    currency = token.map(codes).astype("object").fillna(default_currency)
+    currency = currency.where(raw.notna() & (raw != ""), None)
+
+    number = raw.str.extract(NUMBER_PATTERN, expand=False)
+    number = number.str.replace(_GROUPING_RE.pattern, "", regex=True)
+
+    dot = number.str.rfind(".").fillna(-1).to_numpy(dtype="int64")
+    comma = number.str.rfind(",").fillna(-1).to_numpy(dtype="int64")
+    length = number.str.len().fillna(0).to_numpy(dtype="int64")
+    dots = number.str.count(r"\.").fillna(0).to_numpy(dtype="int64")
+    commas = number.str.count(",").fillna(0).to_numpy(dtype="int64")
+    zero_decimal = currency.isin(ZERO_DECIMAL_CURRENCIES).to_numpy()
+
+    both = (dot >= 0) & (comma >= 0)
+    comma_decimal = (both & (comma > dot)) | (
+        (comma >= 0) & (dot < 0) & (commas == 1) & (length - comma - 1 != 3))
+    dot_decimal = (both & (dot > comma)) | (
+        (dot >= 0) & (comma < 0) & (dots == 1) & (length - dot - 1 != 3))
+    comma_decimal &= ~zero_decimal
+    dot_decimal &= ~zero_decimal
+
+    no_separators = number.str.replace(r"[.,]", "", regex=True)
+    as_comma_decimal = number.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    as_dot_decimal = number.str.replace(",", "", regex=False)
+
+    cleaned = np.where(comma_decimal, as_comma_decimal,
+                       np.where(dot_decimal, as_dot_decimal, no_separators))
+    price = pd.to_numeric(pd.Series(cleaned, index=raw.index), errors="coerce")
+
+    return pd.DataFrame({"price": price.astype("float64"), "currency": currency})
@@ -0,0 +1,103 @@
+# scraper/product_index.py
+
+import bisect
+import os
+from typing import Dict, List, Optional, Tuple
+
+
+def _trigrams(text: str) -> set:
+    """Split text into the set of its 3-character substrings"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ProductIndex:
+    """In-memory search index over product ASINs and names
+
+    Short queries (1-2 characters) are answered with a prefix search over
+    a sorted key list; longer queries use a trigram posting index and
+    only verify the candidate products that share every trigram.
+    """
+
+    def __init__(self, products: List[Dict]):
+        self.products = products
+        self._keys: List[Tuple[str, int]] = []
+        self._trigrams: Dict[str, set] = {}
+        self._haystacks: List[str] = []
+
+        for pos, product in enumerate(products):
+            asin = str(product.get("asin", "")).lower()
+            name = str(product.get("name", "")).lower()
+            haystack = f"{asin} {name}"
+            self._haystacks.append(haystack)
+
+            # Prefix keys: ASIN plus every word of the name
+            self._keys.append((asin, pos))
+            for word in name.split():
+                self._keys.append((word, pos))
+
+            for gram in _trigrams(haystack):
+                self._trigrams.setdefault(gram, set()).add(pos)
+
+        self._keys.sort()
+
+    def _prefix_matches(self, query: str) -> set:
+        """Positions of products with an ASIN or name word starting with query"""
+        start = bisect.bisect_left(self._keys, (query, -1))
+        matches = set()
+        for key, pos in self._keys[start:]:
+            if not key.startswith(query):
+                break
+            matches.add(pos)
+        return matches
+
+    def _substring_matches(self, query: str) -> set:
+        """Positions of products whose ASIN or name contains query"""
+        candidates = None
+        for gram in sorted(_trigrams(query), key=lambda g: len(self._trigrams.get(g, ()))):
+            postings = self._trigrams.get(gram)
+            if not postings:
+                return set()
+            candidates = set(postings) if candidates is None else candidates & postings
+            if not candidates:
+                return set()
+        return {pos for pos in candidates if query in self._haystacks[pos]}
+
+    def search(self, query: str = "", offset: int = 0,
+               limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """Return one page of matching products and the total match count"""
+        query = (query or "").strip().lower()
+
+        if not query:
+            total = len(self.products)
+            end = None if limit is None else offset + limit
+            return self.products[offset:end], total
+
+        if len(query) < 3:
+            positions = self._prefix_matches(query)
+        else:
+            positions = self._substring_matches(query)
+
+        ordered = sorted(positions)
+        end = None if limit is None else offset + limit
+        return [self.products[pos] for pos in ordered[offset:end]], len(ordered)
+
+
+# Indexes are cached per database file and rebuilt only when it changes
+_INDEX_CACHE: Dict[str, Tuple[Tuple[int, int], ProductIndex]] = {}
+
+
+def get_index(db_path: str, products: List[Dict]) -> ProductIndex:
+    """Return a cached index for db_path, rebuilding it if the file changed"""
+    try:
+        st = os.stat(db_path)
+        signature = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return ProductIndex(products)
+
+    cached = _INDEX_CACHE.get(db_path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    index = ProductIndex(products)
+    _INDEX_CACHE[db_path] = (signature, index)
+    return index
@@ -0,0 +1,84 @@
+# scraper/product_meta.py
+
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from config import PRODUCT_META_PATH
+from scraper.fileio import atomic_write
+
+
+class ProductMetaStore:
+    """Per-ASIN product metadata (title, url) kept out of history rows
+
+    History rows only carry the ASIN; the descriptive text lives here once
+    per product and is rewritten only when it actually changes.
+    """
+
+    def __init__(self, path: str = PRODUCT_META_PATH):
+        self.path = path
+        self._meta: Optional[Dict[str, Dict]] = None
+
+    def load(self) -> Dict[str, Dict]:
+        """Return the ASIN -> metadata mapping, reading the file once"""
+        if self._meta is None:
+            self._meta = {}
+            if os.path.isfile(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._meta = json.load(f)
+                except Exception as e:
+                    print(f"[!] Error reading product metadata: {e}")
+        return self._meta
+
+    def get(self, asin: str) -> Dict:
+        """Metadata for one ASIN (empty dict if unknown)"""
+        return self.load().get(asin, {})
+
+    def update(self, asin: str, title: Optional[str], url: Optional[str],
+               persist: bool = True) -> bool:
+        """Record title/url for an ASIN; writes the file only on change
+
+        Pass persist=False when recording many ASINs and call save() once.
+        """
+        meta = self.load()
+        current = meta.get(asin, {})
+        title = title or current.get("title")
+        url = url or current.get("url")
+
+        if current.get("title") == title and current.get("url") == url:
+            return False
+
+        meta[asin] = {
+            "title": title,
+            "url": url,
+            "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        if persist:
+            self._write(meta)
+        return True
+
+    def save(self):
+        """Write the in-memory metadata to disk"""
+        self._write(self.load())
+
+    def _write(self, meta: Dict[str, Dict]):
+        """Write metadata file"""
+        try:
+            with atomic_write(self.path, encoding="utf-8") as f:
+                json.dump(meta, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            print(f"[!] Error writing product metadata: {e}")
+
+
+# Shared instance so repeated saves within a process reuse the loaded file
+_default_store: Optional[ProductMetaStore] = None
+
+
+def get_meta_store() -> ProductMetaStore:
+    """Return the process-wide metadata store"""
+    global _default_store
+    if _default_store is None:
+        _default_store = ProductMetaStore()
+    return _default_store
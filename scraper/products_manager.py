@@ -4,12 +4,19 @@ import json
 import os
 import csv
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from config import PRODUCTS_DB_PATH
+from scraper.fileio import atomic_write
+from scraper.product_index import get_index
+from scraper.marketplaces import get_marketplace, product_key
 
 
 class ProductsManager:
-    """Manage tracked products in JSON database"""
+    """Manage tracked products in JSON database
+    
+    Products are addressed by their key: the bare ASIN on the default
+    marketplace, "ASIN@<marketplace>" elsewhere (see product_key()).
+    """
     
     def __init__(self):
         self.db_path = PRODUCTS_DB_PATH
@@ -31,9 +38,9 @@ class ProductsManager:
             return {"products": []}
     
     def _write_db(self, data: Dict):
-        """Write to database file"""
+        """Write to database file (atomically, so a crash never truncates it)"""
         try:
-            with open(self.db_path, 'w', encoding='utf-8') as f:
+            with atomic_write(self.db_path, encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
         except Exception as e:
             print(f"[!] Error writing database: {e}")
@@ -47,23 +54,42 @@ class ProductsManager:
         """Save products to database"""
         self._write_db({"products": products})
     
+    @staticmethod
+    def key(product: Dict) -> str:
+        """Key of a product record"""
+        return product_key(product["asin"], product.get("marketplace"))
+    
     def add_product(self, asin: str, name: str, target_price: Optional[float] = None, 
-                    stock_alert: bool = False, alert_channels: Optional[List[str]] = None) -> bool:
-        """Add a new product to track"""
+                    stock_alert: bool = False, alert_channels: Optional[List[str]] = None,
+                    marketplace: Optional[str] = None, competitor: Optional[str] = None) -> bool:
+        """Add a new product to track
+
+        competitor is the key of another tracked product; the
+        below_competitor alert rule compares the two prices.
+        """
         products = self.load_products()
         
-        # Check if ASIN already exists
-        if any(p["asin"] == asin for p in products):
-            print(f"[!] Product {asin} already exists")
+        try:
+            marketplace = get_marketplace(marketplace).code
+        except ValueError as e:
+            print(f"[!] {e}")
+            return False
+        key = product_key(asin, marketplace)
+        
+        # Check if ASIN already exists on this marketplace
+        if any(self.key(p) == key for p in products):
+            print(f"[!] Product {key} already exists")
             return False
         
         # Create new product entry
         product = {
             "asin": asin,
+            "marketplace": marketplace,
             "name": name,
             "target_price": target_price,
             "stock_alert": stock_alert,
             "alert_channels": alert_channels if alert_channels else ["email"],
+            "competitor": competitor,
             "enabled": True,
             "created_at": datetime.now().isoformat(),
             "last_checked": None
@@ -71,7 +97,7 @@ class ProductsManager:
         
         products.append(product)
         self.save_products(products)
-        print(f"[OK] Added product: {name} ({asin})")
+        print(f"[OK] Added product: {name} ({key})")
         return True
     
     def update_product(self, asin: str, **kwargs) -> bool:
@@ -79,7 +105,7 @@ class ProductsManager:
         products = self.load_products()
         
         for product in products:
-            if product["asin"] == asin:
+            if self.key(product) == asin:
                 # Update only provided fields
                 for key, value in kwargs.items():
                     product[key] = value
@@ -97,7 +123,7 @@ class ProductsManager:
         original_count = len(products)
         
         # Filter out the product to delete
-        products = [p for p in products if p["asin"] != asin]
+        products = [p for p in products if self.key(p) != asin]
         
         if len(products) < original_count:
             self.save_products(products)
@@ -111,7 +137,7 @@ class ProductsManager:
         """Get a single product by ASIN"""
         products = self.load_products()
         for product in products:
-            if product["asin"] == asin:
+            if self.key(product) == asin:
                 return product
         return None
     
@@ -125,7 +151,7 @@ class ProductsManager:
         products = self.load_products()
         
         for product in products:
-            if product["asin"] == asin:
+            if self.key(product) == asin:
                 current_status = product.get("enabled", True)
                 product["enabled"] = not current_status
                 self.save_products(products)
@@ -137,12 +163,103 @@ class ProductsManager:
         print(f"[!] Product {asin} not found")
         return False
     
+    def search_products(self, query: str = "", offset: int = 0,
+                        limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """Search products by ASIN or name and return (page, total matches)"""
+        products = self.load_products()
+        return get_index(self.db_path, products).search(query, offset, limit)
+    
+    def bulk_update(self, updates: Dict[str, Dict]) -> int:
+        """Apply per-ASIN field updates in a single database write
+        
+        updates maps product key -> {field: value}. Returns the number of products changed.
+        """
+        if not updates:
+            return 0
+        
+        products = self.load_products()
+        count = 0
+        
+        for product in products:
+            fields = updates.get(self.key(product))
+            if fields:
+                product.update(fields)
+                count += 1
+        
+        if count:
+            self.save_products(products)
+        print(f"[OK] Updated {count} products")
+        return count
+    
+    def bulk_set_enabled(self, asins: List[str], enabled: bool) -> int:
+        """Enable or disable many products in a single database write"""
+        return self.bulk_update({asin: {"enabled": enabled} for asin in asins})
+    
+    def bulk_retarget(self, asins: List[str], target_price: Optional[float]) -> int:
+        """Set the same target price on many products in a single database write"""
+        return self.bulk_update({asin: {"target_price": target_price} for asin in asins})
+    
+    def bulk_delete(self, asins: List[str]) -> int:
+        """Delete many products in a single database write"""
+        doomed = set(asins)
+        products = self.load_products()
+        remaining = [p for p in products if self.key(p) not in doomed]
+        count = len(products) - len(remaining)
+        
+        if count:
+            self.save_products(remaining)
+        print(f"[OK] Deleted {count} products")
+        return count
+    
+    def add_variation_children(self, parent_key: str, variations: Dict) -> int:
+        """Track the children of a variation family like their parent
+        
+        Children get the parent's marketplace, target price, stock alert
+        and channels, and the parent's name plus their dimension values
+        (e.g. "Shirt (Large, Blue)"). Returns the number of children added.
+        """
+        from scraper.variations import variation_label
+        
+        products = self.load_products()
+        parent = next((p for p in products if self.key(p) == parent_key), None)
+        if parent is None:
+            print(f"[!] Product {parent_key} not found")
+            return 0
+        
+        existing = {self.key(p) for p in products}
+        marketplace = parent.get("marketplace") or "com"
+        added = 0
+        for asin, child in sorted((variations.get("children") or {}).items()):
+            key = product_key(asin, marketplace)
+            if key in existing:
+                continue
+            label = variation_label(child.get("dimensions") or {})
+            products.append({
+                "asin": asin,
+                "marketplace": marketplace,
+                "name": f"{parent['name']} ({label})" if label else parent["name"],
+                "target_price": parent.get("target_price"),
+                "stock_alert": parent.get("stock_alert", False),
+                "alert_channels": parent.get("alert_channels", ["email"]),
+                "enabled": True,
+                "parent": parent_key,
+                "created_at": datetime.now().isoformat(),
+                "last_checked": None,
+            })
+            existing.add(key)
+            added += 1
+        
+        if added:
+            self.save_products(products)
+        print(f"[OK] Added {added} variation children of {parent_key}")
+        return added
+    
     def import_from_csv(self, csv_path: str) -> int:
         """Import products from CSV file
         
-        Expected CSV format:
-        asin,name,target_price
-        B08N5WRWNW,Echo Dot,29.99
+        Expected CSV format (marketplace is optional, default "com"):
+        asin,name,target_price,marketplace,competitor
+        B08N5WRWNW,Echo Dot,29.99,com,B09B8V1LZ3
         """
         if not os.path.exists(csv_path):
             print(f"[!] CSV file not found: {csv_path}")
@@ -170,8 +287,12 @@ class ProductsManager:
                         except ValueError:
                             print(f"[!] Invalid price for {asin}: {target_price_str}")
                     
+                    marketplace = (row.get('marketplace') or '').strip() or None
+                    competitor = (row.get('competitor') or '').strip() or None
+                    
                     # Add product
-                    if self.add_product(asin, name, target_price):
+                    if self.add_product(asin, name, target_price, marketplace=marketplace,
+                                        competitor=competitor):
                         count += 1
             
             print(f"[OK] Imported {count} products from CSV")
@@ -191,7 +312,8 @@ class ProductsManager:
         
         try:
             with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-                fieldnames = ['asin', 'name', 'target_price', 'stock_alert', 'enabled']
+                fieldnames = ['asin', 'name', 'target_price', 'stock_alert', 'enabled', 'marketplace',
+                              'competitor']
                 writer = csv.DictWriter(f, fieldnames=fieldnames)
                 
                 writer.writeheader()
@@ -202,7 +324,9 @@ class ProductsManager:
                         'name': product['name'],
                         'target_price': product.get('target_price', ''),
                         'stock_alert': product.get('stock_alert', False),
-                        'enabled': product.get('enabled', True)
+                        'enabled': product.get('enabled', True),
+                        'marketplace': get_marketplace(product.get('marketplace')).code,
+                        'competitor': product.get('competitor') or ''
                     })
             
             print(f"[OK] Exported {len(products)} products to {csv_path}")
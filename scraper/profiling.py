@@ -0,0 +1,295 @@
+# scraper/profiling.py
+
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+from config import PROFILE_DIR, PROFILE_SAMPLE_MS
+
+# Regions cost one global lookup while no profile is running
+_NULL_REGION = nullcontext()
+
+# Stack of open regions of the current thread or asyncio task
+_stack: contextvars.ContextVar = contextvars.ContextVar("profile_regions", default=())
+
+_active: Optional["CycleProfile"] = None
+_armed_mode: Optional[str] = None
+_armed_forever = False
+
+MODES = ("sample", "cprofile")
+
+
+class _Frame:
+    __slots__ = ("name", "path", "start", "children", "profiler", "thread")
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.start = time.perf_counter()
+        self.children = 0.0
+        self.profiler = None
+        self.thread = threading.get_ident()
+
+
+class _Region:
+    """Context manager for one named region (see region())"""
+
+    __slots__ = ("profile", "frame", "token")
+
+    def __init__(self, profile: "CycleProfile", name: str):
+        self.profile = profile
+        stack = _stack.get()
+        path = f"{stack[-1].path};{name}" if stack else name
+        self.frame = _Frame(name, path)
+
+    def __enter__(self):
+        stack = _stack.get() + (self.frame,)
+        self.token = _stack.set(stack)
+        self.profile.enter(self.frame)
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.frame.start
+        _stack.reset(self.token)
+        parent = _stack.get()
+        if parent:
+            parent[-1].children += elapsed
+        self.profile.exit(self.frame, elapsed, parent)
+        return False
+
+
+def region(name: str):
+    """Attribute the wall time of a block to a named subsystem
+
+    A no-op unless a cycle is being profiled. Regions nest; the report
+    shows both total and self time (total minus nested regions), and
+    sampled stacks are rooted at the open regions so a flamegraph groups
+    them by subsystem.
+    """
+    profile = _active
+    if profile is None:
+        return _NULL_REGION
+    return _Region(profile, name)
+
+
+class CycleProfile:
+    """Region timings, stack samples and optionally cProfile for one cycle
+
+    The sampler thread reads every thread's Python stack each
+    PROFILE_SAMPLE_MS and writes them in the collapsed format of
+    flamegraph.pl / speedscope / inferno (one "frame;frame;frame count"
+    line per distinct stack). In "cprofile" mode each thread that enters
+    a region is also traced with cProfile; the merged stats go to a .prof
+    file (snakeviz, gprof2dot). Where only one profiler may be active per
+    process (Python 3.12+), worker threads fall back to the samples.
+    """
+
+    def __init__(self, mode: str = "sample", sample_ms: float = PROFILE_SAMPLE_MS):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode '{mode}' (choose from: {', '.join(MODES)})")
+        self.mode = mode
+        self.interval = max(sample_ms, 1) / 1000
+        self.samples: Counter = Counter()
+        self.totals: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self._thread_regions: Dict[int, str] = {}
+        self._profilers = []
+        self._traced = set()
+        self._main_profiler = None
+        self._thread_profiling = True
+        self._stop = threading.Event()
+        self._sampler = None
+        self.started = self.wall = 0.0
+
+    # Regions
+
+    def enter(self, frame: _Frame):
+        ident = threading.get_ident()
+        self._thread_regions[ident] = frame.path
+        if self.mode == "cprofile" and self._thread_profiling and ident not in self._traced:
+            # Traced until this region exits; nested regions reuse it
+            frame.profiler = self._enable_profiler()
+            if frame.profiler is None:
+                self._thread_profiling = False
+                print("[!] cProfile cannot trace worker threads while the cycle's "
+                      "profiler is active; they are only sampled")
+            else:
+                self._traced.add(ident)
+
+    def exit(self, frame: _Frame, elapsed: float, parent):
+        ident = threading.get_ident()
+        # A parent opened in another thread (asyncio.to_thread copies the
+        # context) is not what this thread is doing once the region ends
+        if parent and parent[-1].thread == ident:
+            self._thread_regions[ident] = parent[-1].path
+        else:
+            self._thread_regions.pop(ident, None)
+        if frame.profiler is not None:
+            frame.profiler.disable()
+            self._traced.discard(ident)
+            with self._lock:
+                self._profilers.append(frame.profiler)
+        with self._lock:
+            row = self.totals.setdefault(frame.path, [0, 0.0, 0.0])
+            row[0] += 1
+            row[1] += elapsed
+            row[2] += elapsed - frame.children
+
+    @staticmethod
+    def _enable_profiler():
+        """A running cProfile.Profile, or None if another profiler is active"""
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return None
+        return profiler
+
+    # Sampling
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, top in sys._current_frames().items():
+                if ident == own:
+                    continue
+                regions = self._thread_regions.get(ident)
+                if regions is None:
+                    continue
+                frames = []
+                f = top
+                while f is not None:
+                    code = f.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    f = f.f_back
+                frames.reverse()
+                self.samples[regions + ";" + ";".join(frames)] += 1
+
+    def start(self):
+        global _active
+        if self.mode == "cprofile":
+            self._main_profiler = self._enable_profiler()
+            if self._main_profiler is None:
+                print("[!] Another profiler is active; falling back to the sample profile")
+                self.mode = "sample"
+            else:
+                self._traced.add(threading.get_ident())
+        self.started = time.perf_counter()
+        _active = self
+        self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler",
+                                         daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        global _active
+        _active = None
+        self._stop.set()
+        self._sampler.join()
+        self.wall = time.perf_counter() - self.started
+        if self._main_profiler is not None:
+            self._main_profiler.disable()
+            self._traced.discard(threading.get_ident())
+            self._profilers.append(self._main_profiler)
+
+    # Output
+
+    def report(self) -> str:
+        lines = [f"Cycle wall time: {self.wall:.2f} s ({self.mode} profile, "
+                 f"{sum(self.samples.values())} samples)",
+                 "Region times are summed over concurrent threads and tasks.", "",
+                 f"{'Region':<40} {'Calls':>7} {'Total s':>9} {'Self s':>9}"]
+        for path, (calls, total, own) in sorted(self.totals.items(), key=lambda r: -r[1][2]):
+            lines.append(f"{path[:40]:<40} {calls:>7} {total:>9.2f} {own:>9.2f}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: str = PROFILE_DIR) -> str:
+        """Write the profile files; returns their common path prefix"""
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, "cycle-" + time.strftime("%Y%m%d-%H%M%S"))
+
+        with open(prefix + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        report = self.report()
+        if self._profilers:
+            import io
+            import pstats
+
+            stats = pstats.Stats(self._profilers[0])
+            for profiler in self._profilers[1:]:
+                stats.add(profiler)
+            stats.dump_stats(prefix + ".prof")
+            buffer = io.StringIO()
+            stats.stream = buffer
+            stats.sort_stats("cumulative").print_stats(30)
+            report += "\n" + buffer.getvalue()
+
+        with open(prefix + ".txt", "w", encoding="utf-8") as f:
+            f.write(report)
+        return prefix
+
+
+def arm(mode: str = "sample", forever: bool = False):
+    """Profile the next cycle (every cycle with forever)"""
+    global _armed_mode, _armed_forever
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode '{mode}' (choose from: {', '.join(MODES)})")
+    _armed_mode = mode
+    _armed_forever = forever
+
+
+def disarm():
+    global _armed_mode, _armed_forever
+    _armed_mode = None
+    _armed_forever = False
+
+
+def install_signal_toggle(mode: str = "sample") -> bool:
+    """SIGUSR1 switches per-cycle profiling on and off in a running process"""
+    import signal
+
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+
+    def toggle(signum, frame):
+        if _armed_mode:
+            disarm()
+            print("\n[i] Profiling off (SIGUSR1)")
+        else:
+            arm(mode, forever=True)
+            print(f"\n[i] Profiling on from the next cycle (SIGUSR1, {mode})")
+
+    signal.signal(signal.SIGUSR1, toggle)
+    return True
+
+
+@contextmanager
+def profile_cycle():
+    """Profile the wrapped cycle if profiling is armed"""
+    global _armed_mode
+    mode = _armed_mode
+    if mode is None or _active is not None:
+        yield None
+        return
+    if not _armed_forever:
+        _armed_mode = None
+
+    profile = CycleProfile(mode)
+    profile.start()
+    try:
+        with region("cycle"):
+            yield profile
+    finally:
+        profile.stop()
+        prefix = profile.write()
+        print(f"\n[i] Profile written to {prefix}.txt / .collapsed"
+              + (" / .prof" if profile.mode == "cprofile" else ""))
+        print(profile.report())
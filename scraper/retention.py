@@ -0,0 +1,428 @@
+# scraper/retention.py
+
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import (
+    CSV_PATH,
+    HISTORY_DAILY_PATH,
+    HISTORY_HOURLY_PATH,
+    RETENTION_HOURLY_MONTHS,
+    RETENTION_INTERVAL_MINUTES,
+    RETENTION_RAW_DAYS,
+    RETENTION_STATE_PATH,
+)
+from scraper.fileio import atomic_write, locked, locked_append
+from scraper.marketplaces import product_key
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DAYS_PER_MONTH = 30
+
+HOURLY_FIELDS = ["hour", "asin", "marketplace", "price_first", "price_min", "price_max",
+                 "price_last", "stock", "stock_state", "rating", "reviews", "observations"]
+DAILY_FIELDS = ["day", "asin", "marketplace", "open", "high", "low", "close",
+                "stock", "stock_state", "rating", "reviews", "observations"]
+
+# Columns of the rows yielded by iter_tiered_history()
+TIERED_FIELDS = ["timestamp", "asin", "marketplace", "price", "price_min", "price_max",
+                 "stock", "stock_state", "rating", "reviews", "observations", "tier"]
+
+TIERS = ("daily", "hourly", "raw")
+
+
+def _num(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+class _Bucket:
+    """First/min/max/last price and last stock and rating of one period"""
+
+    __slots__ = ("first", "low", "high", "last", "stock", "stock_state",
+                 "rating", "reviews", "observations")
+
+    def __init__(self):
+        self.first = self.low = self.high = self.last = None
+        self.stock = self.stock_state = self.rating = self.reviews = None
+        self.observations = 0
+
+    def add(self, first, low, high, last, stock, stock_state, rating, reviews,
+            observations: int = 1):
+        if last is not None:
+            if self.first is None:
+                self.first = first
+            self.low = low if self.low is None else min(self.low, low)
+            self.high = high if self.high is None else max(self.high, high)
+            self.last = last
+        self.stock = stock
+        self.stock_state = stock_state
+        if rating not in (None, ""):
+            self.rating = rating
+        if reviews not in (None, ""):
+            self.reviews = reviews
+        self.observations += observations
+
+
+# ============================================================
+# COMPACTION
+# ============================================================
+
+def _consume_aged(f, header: List[str], cutoff: str, on_row: Callable[[Dict], None]) -> int:
+    """Pass the rows before cutoff at the start of f to on_row
+
+    Tier files are appended in time order with the time in the first
+    column, so the scan stops at the first row at or after cutoff; a
+    slightly older row after it (a held price saved late) waits for the
+    next run. Returns the offset of the first row kept.
+    """
+    while True:
+        pos = f.tell()
+        line = f.readline()
+        if not line.endswith(b"\n") or line[:len(cutoff)].decode("ascii", "replace") >= cutoff:
+            return pos
+        values = next(csv.reader([line.decode("utf-8")]), [])
+        on_row(dict(zip(header, values)))
+
+
+def _append_rows(path: str, fields: List[str], rows: List[List]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+    with locked_append(path) as f:
+        if os.path.getsize(path) == 0:
+            csv.writer(f).writerow(fields)
+        f.write(buffer.getvalue())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _drop_prefix(path: str, f, header_line: bytes, start: int,
+                 copy_head: Optional[Callable] = None):
+    """Replace path with its header and everything from offset start
+
+    The bulk of the file is copied without a lock while writers keep
+    appending; only the rows they appended meanwhile are copied under the
+    file lock, right before the new file is swapped in. Writers waiting on
+    the lock then reopen the new file (fileio.locked_append).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp",
+                                    dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(header_line)
+            f.seek(start)
+            if copy_head:
+                copy_head(f, out)
+            shutil.copyfileobj(f, out)
+            end = f.tell()
+
+        with locked_append(path):
+            # The history writer may have migrated the file in place meanwhile
+            if os.fstat(f.fileno()).st_ino != os.stat(path).st_ino:
+                raise RuntimeError(f"{path} was replaced during compaction; retrying next run")
+            if os.path.getsize(path) < end:
+                raise RuntimeError(f"{path} shrank during compaction; retrying next run")
+            with open(path, "rb") as live, open(tmp_path, "ab") as out:
+                live.seek(end)
+                shutil.copyfileobj(live, out)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def compact_raw(cutoff: str, path: str = CSV_PATH,
+                hourly_path: str = HISTORY_HOURLY_PATH) -> int:
+    """Fold raw rows before cutoff into hourly rows and drop them from path
+
+    Returns the number of raw rows folded. cutoff is on an hour boundary,
+    so an hour is never split between two runs.
+    """
+    from scraper.history import complete_row
+    from scraper.utils import DELTA_FILL_FIELDS
+
+    if not os.path.isfile(path):
+        return 0
+
+    buckets: Dict[Tuple[str, str], _Bucket] = {}
+    names: Dict[str, Tuple[str, str]] = {}
+    last_values: Dict[str, Dict] = {}
+    folded = 0
+
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8")]), [])
+        if not header or header[0] != "timestamp":
+            print(f"[!] {path} has no timestamp column first; not compacted")
+            return 0
+        legacy = "rating" not in header
+
+        def fold(row):
+            nonlocal folded
+            key = product_key(row.get("asin") or "", row.get("marketplace"))
+            complete_row(row, key, last_values, legacy)
+            price = _num(row.get("price"))
+            hour = row["timestamp"][:13] + ":00:00"
+            bucket = buckets.get((key, hour))
+            if bucket is None:
+                bucket = buckets[(key, hour)] = _Bucket()
+                names[key] = (row["asin"], row["marketplace"])
+            bucket.add(price, price, price, price, row["stock"], row["stock_state"],
+                       row.get("rating"), row.get("reviews"))
+            folded += 1
+
+        start = _consume_aged(f, header, cutoff, fold)
+        if not folded:
+            return 0
+
+        _append_rows(hourly_path, HOURLY_FIELDS, [
+            [hour, *names[key], b.first, b.low, b.high, b.last, b.stock, b.stock_state,
+             b.rating, b.reviews, b.observations]
+            for (key, hour), b in sorted(buckets.items(), key=lambda item: (item[0][1], item[0][0]))
+        ])
+
+        # Delta-mode rows leave rating/reviews blank when unchanged; the
+        # first kept row of each product gets the values of the dropped rows
+        fill_idx = [header.index(field) for field in DELTA_FILL_FIELDS if field in header]
+        pending = {key for key, values in last_values.items() if values}
+
+        def copy_head(src, out):
+            while pending:
+                line = src.readline()
+                if not line.endswith(b"\n"):
+                    out.write(line)
+                    return
+                values = next(csv.reader([line.decode("utf-8")]), [])
+                row = dict(zip(header, values))
+                key = product_key(row.get("asin") or "", row.get("marketplace"))
+                if key in pending:
+                    pending.discard(key)
+                    previous = last_values[key]
+                    blanks = [i for i in fill_idx if i < len(values) and not values[i]
+                              and previous.get(header[i])]
+                    if blanks:
+                        for i in blanks:
+                            values[i] = previous[header[i]]
+                        buffer = io.StringIO()
+                        csv.writer(buffer).writerow(values)
+                        line = buffer.getvalue().encode("utf-8")
+                out.write(line)
+
+        _drop_prefix(path, f, header_line, start, copy_head)
+    return folded
+
+
+def compact_hourly(cutoff: str, path: str = HISTORY_HOURLY_PATH,
+                   daily_path: str = HISTORY_DAILY_PATH) -> int:
+    """Fold hourly rows before cutoff (a midnight) into daily OHLC rows"""
+    if not os.path.isfile(path):
+        return 0
+
+    buckets: Dict[Tuple[str, str], _Bucket] = {}
+    names: Dict[str, Tuple[str, str]] = {}
+    folded = 0
+
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8")]), [])
+
+        def fold(row):
+            nonlocal folded
+            key = product_key(row["asin"], row["marketplace"])
+            day = row["hour"][:10]
+            bucket = buckets.get((key, day))
+            if bucket is None:
+                bucket = buckets[(key, day)] = _Bucket()
+                names[key] = (row["asin"], row["marketplace"])
+            bucket.add(_num(row["price_first"]), _num(row["price_min"]), _num(row["price_max"]),
+                       _num(row["price_last"]), row["stock"], row["stock_state"],
+                       row["rating"], row["reviews"], int(row["observations"] or 0))
+            folded += 1
+
+        start = _consume_aged(f, header, cutoff, fold)
+        if not folded:
+            return 0
+
+        _append_rows(daily_path, DAILY_FIELDS, [
+            [day, *names[key], b.first, b.high, b.low, b.last, b.stock, b.stock_state,
+             b.rating, b.reviews, b.observations]
+            for (key, day), b in sorted(buckets.items(), key=lambda item: (item[0][1], item[0][0]))
+        ])
+        _drop_prefix(path, f, header_line, start)
+    return folded
+
+
+def load_state(path: str = RETENTION_STATE_PATH) -> Dict:
+    """{"raw_from", "hourly_from", ...}: where each finer tier starts"""
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[!] Error reading retention state: {e}")
+        return {}
+
+
+def run_retention(raw_days: int = RETENTION_RAW_DAYS,
+                  hourly_months: int = RETENTION_HOURLY_MONTHS,
+                  now: Optional[float] = None, state_path: str = RETENTION_STATE_PATH) -> Dict:
+    """Apply the retention policy once; returns {"raw_rows", "hourly_rows"} folded
+
+    Runs are incremental: each only reads the rows that aged out of a tier
+    since the previous run, plus the first kept row of each product. One
+    process compacts at a time (a lock next to the state file).
+    """
+    if raw_days <= 0:
+        return {"raw_rows": 0, "hourly_rows": 0}
+
+    now = datetime.fromtimestamp(time.time() if now is None else now)
+    raw_from = (now - timedelta(days=raw_days)).strftime("%Y-%m-%d %H:00:00")
+    hourly_from = None
+    if hourly_months > 0:
+        hourly_from = min(
+            (now - timedelta(days=hourly_months * DAYS_PER_MONTH)).strftime("%Y-%m-%d 00:00:00"),
+            raw_from[:10] + " 00:00:00")
+
+    os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+    with open(state_path + ".lock", "a") as lock_file, locked(lock_file):
+        state = load_state(state_path)
+        stats = {"raw_rows": compact_raw(raw_from), "hourly_rows": 0}
+        state["raw_from"] = max(state.get("raw_from", ""), raw_from)
+        if hourly_from:
+            stats["hourly_rows"] = compact_hourly(hourly_from)
+            state["hourly_from"] = max(state.get("hourly_from", ""), hourly_from)
+        state["last_run"] = now.strftime(TIME_FORMAT)
+        with atomic_write(state_path, encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+
+    if stats["raw_rows"] or stats["hourly_rows"]:
+        print(f"[OK] Retention: {stats['raw_rows']} raw rows folded into hourly, "
+              f"{stats['hourly_rows']} hourly rows into daily")
+    return stats
+
+
+def start_compactor(interval_minutes: int = RETENTION_INTERVAL_MINUTES
+                    ) -> Optional[threading.Thread]:
+    """Run the retention policy in a background thread every interval
+
+    Writers are only held up while the rows appended during a run are
+    copied over (see _drop_prefix). Returns None if retention is off.
+    """
+    if RETENTION_RAW_DAYS <= 0:
+        return None
+
+    def loop():
+        while True:
+            try:
+                run_retention()
+            except Exception as e:
+                print(f"[X] History retention failed: {e}")
+            time.sleep(max(1, interval_minutes) * 60)
+
+    thread = threading.Thread(target=loop, name="history-retention", daemon=True)
+    thread.start()
+    print(f"[i] History retention every {interval_minutes} min: raw {RETENTION_RAW_DAYS} days, "
+          + (f"hourly {RETENTION_HOURLY_MONTHS} months" if RETENTION_HOURLY_MONTHS > 0
+             else "hourly forever") + ", then daily")
+    return thread
+
+
+# ============================================================
+# READING
+# ============================================================
+
+def tiers_for_range(since: Optional[str] = None, until: Optional[str] = None,
+                    state: Optional[Dict] = None) -> List[str]:
+    """The tiers holding rows between since and until, coarsest first
+
+    Tiers cover consecutive periods: daily rows before hourly_from, hourly
+    rows before raw_from, raw rows after it.
+    """
+    state = load_state() if state is None else state
+    raw_from = state.get("raw_from")
+    hourly_from = state.get("hourly_from")
+    tiers = []
+    if hourly_from and (not since or since < hourly_from):
+        tiers.append("daily")
+    if raw_from and (not since or since < raw_from) \
+            and (not until or not hourly_from or until >= hourly_from):
+        tiers.append("hourly")
+    if not raw_from or not until or until >= raw_from:
+        tiers.append("raw")
+    return tiers
+
+
+def _from_hourly(row: Dict) -> Dict:
+    return {"timestamp": row["hour"], "asin": row["asin"], "marketplace": row["marketplace"],
+            "price": row["price_last"], "price_min": row["price_min"],
+            "price_max": row["price_max"], "stock": row["stock"],
+            "stock_state": row["stock_state"], "rating": row["rating"],
+            "reviews": row["reviews"], "observations": row["observations"], "tier": "hourly"}
+
+
+def _from_daily(row: Dict) -> Dict:
+    return {"timestamp": row["day"] + " 00:00:00", "asin": row["asin"],
+            "marketplace": row["marketplace"], "price": row["close"], "price_min": row["low"],
+            "price_max": row["high"], "stock": row["stock"], "stock_state": row["stock_state"],
+            "rating": row["rating"], "reviews": row["reviews"],
+            "observations": row["observations"], "tier": "daily"}
+
+
+def _iter_tier(path: str, convert: Callable[[Dict], Dict], wanted, since, until):
+    if not os.path.isfile(path):
+        return
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            out = convert(row)
+            if wanted is not None and product_key(out["asin"], out["marketplace"]) not in wanted:
+                continue
+            if since and out["timestamp"] < since:
+                continue
+            if until and out["timestamp"] > until:
+                continue
+            yield out
+
+
+def iter_tiered_history(asins: Optional[Iterable[str]] = None, since: Optional[str] = None,
+                        until: Optional[str] = None) -> Iterator[Dict]:
+    """Stream history at the finest resolution kept for each part of the range
+
+    Rows have TIERED_FIELDS; price is the last price of the period
+    (the close of a day), price_min/price_max its extremes. Tiers outside
+    the range are not opened, so a query over the last days reads only the
+    raw file.
+    """
+    from scraper.history import iter_history
+
+    wanted = set(asins) if asins else None
+    tiers = tiers_for_range(since, until)
+    if "daily" in tiers:
+        yield from _iter_tier(HISTORY_DAILY_PATH, _from_daily, wanted, since, until)
+    if "hourly" in tiers:
+        yield from _iter_tier(HISTORY_HOURLY_PATH, _from_hourly, wanted, since, until)
+    if "raw" in tiers:
+        for row in iter_history(CSV_PATH, wanted, since, until):
+            yield {"timestamp": row.get("timestamp", ""), "asin": row["asin"],
+                   "marketplace": row["marketplace"], "price": row.get("price", ""),
+                   "price_min": row.get("price", ""), "price_max": row.get("price", ""),
+                   "stock": row["stock"], "stock_state": row["stock_state"],
+                   "rating": row.get("rating"), "reviews": row.get("reviews"),
+                   "observations": 1, "tier": "raw"}
@@ -0,0 +1,211 @@
+# scraper/selector_registry.py
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from lxml import etree
+
+from config import SELECTOR_STATS_PATH, SELECTORS_PATH
+from scraper.fileio import atomic_write
+
+# How often (seconds) the registry file is checked for changes
+RELOAD_CHECK_SECONDS = 2.0
+
+# Reorder a field's selectors after this many evaluations of the field
+REORDER_EVERY = 100
+
+
+class Selector:
+    """One compiled XPath with its hit counters"""
+
+    __slots__ = ("xpath", "compiled", "hits", "evals")
+
+    def __init__(self, xpath: str, hits: int = 0, evals: int = 0):
+        self.xpath = xpath
+        self.compiled = etree.XPath(xpath)
+        self.hits = hits
+        self.evals = evals
+
+    @property
+    def hit_rate(self) -> float:
+        # Laplace smoothing so new selectors are neither first nor last
+        return (self.hits + 1) / (self.evals + 2)
+
+
+class FieldSelectors:
+    """The selectors of one field, tried in order
+
+    first(): the first selector whose first result (stripped) is
+    non-empty wins; a selector may also return a string (e.g.
+    normalize-space). all(): every result of the first selector that
+    returns any. require "digit" rejects results without a digit.
+
+    With reorder the selectors are re-sorted by hit rate every
+    REORDER_EVERY evaluations; only set it on fields whose selectors
+    extract the same value. Fields whose order is a priority (price
+    fallbacks, the rating widget before generic star icons) or whose
+    selectors return different text (the availability span vs the whole
+    availability block) keep the order of the registry file.
+    """
+
+    def __init__(self, name: str, spec: Dict, stats: Dict[str, Dict]):
+        self.name = name
+        self.require = spec.get("require")
+        self.reorder = bool(spec.get("reorder", False))
+        self.selectors = [
+            Selector(xpath, **stats.get(xpath, {})) for xpath in spec["selectors"]
+        ]
+        self._evals = 0
+        self._resort()
+
+    def _resort(self):
+        if self.reorder:
+            # Assigning a new list keeps concurrent iterations consistent
+            self.selectors = sorted(self.selectors, key=lambda s: -s.hit_rate)
+
+    def _accept(self, value: Optional[str]) -> bool:
+        if not value:
+            return False
+        if self.require == "digit":
+            return any(ch.isdigit() for ch in value)
+        return True
+
+    def first(self, tree) -> Optional[str]:
+        self._evals += 1
+        if self._evals % REORDER_EVERY == 0:
+            self._resort()
+
+        for selector in self.selectors:
+            selector.evals += 1
+            result = selector.compiled(tree)
+            if isinstance(result, str):
+                value = result.strip()
+            else:
+                value = str(result[0]).strip() if result else None
+            if self._accept(value):
+                selector.hits += 1
+                return value
+        return None
+
+    def all(self, tree) -> List[str]:
+        for selector in self.selectors:
+            selector.evals += 1
+            result = selector.compiled(tree)
+            values = [str(r).strip() for r in result] if isinstance(result, list) else []
+            if values:
+                selector.hits += 1
+                return values
+        return []
+
+    def stats(self) -> Dict[str, Dict]:
+        return {s.xpath: {"hits": s.hits, "evals": s.evals} for s in self.selectors}
+
+
+class SelectorSet:
+    """One compiled version of the registry; never modified after loading"""
+
+    def __init__(self, spec: Dict, stats: Dict[str, Dict[str, Dict]]):
+        self.version = spec.get("version")
+        self.fields = {
+            name: FieldSelectors(name, field, stats.get(name, {}))
+            for name, field in spec["fields"].items()
+        }
+
+    def first(self, field: str, tree) -> Optional[str]:
+        return self.fields[field].first(tree)
+
+    def all(self, field: str, tree) -> List[str]:
+        return self.fields[field].all(tree)
+
+    def stats(self) -> Dict[str, Dict[str, Dict]]:
+        return {name: field.stats() for name, field in self.fields.items()}
+
+
+class SelectorRegistry:
+    """Loads the selector file, compiles it and reloads it when it changes
+
+    parse() takes the current SelectorSet once per page, so a reload
+    never affects a page that is already being parsed. A file that fails
+    to load or compile is reported and the previous set stays active.
+    Hit counters carry over across reloads and are saved by save_stats().
+    """
+
+    def __init__(self, path: str = SELECTORS_PATH, stats_path: str = SELECTOR_STATS_PATH):
+        self.path = path
+        self.stats_path = stats_path
+        self._lock = threading.Lock()
+        self._current: Optional[SelectorSet] = None
+        self._mtime = None
+        self._next_check = 0.0
+
+    def _load_stats(self) -> Dict:
+        if self._current is not None:
+            return self._current.stats()
+        if os.path.isfile(self.stats_path):
+            try:
+                with open(self.stats_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"[!] Error reading selector stats: {e}")
+        return {}
+
+    def _reload(self, mtime):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                spec = json.load(f)
+            selectors = SelectorSet(spec, self._load_stats())
+        except Exception as e:
+            if self._current is None:
+                raise
+            print(f"[X] Selector registry {self.path} not reloaded: {e}")
+            self._mtime = mtime
+            return
+        if self._current is not None:
+            print(f"[OK] Reloaded selector registry (version {selectors.version})")
+        self._current = selectors
+        self._mtime = mtime
+
+    def current(self) -> SelectorSet:
+        """The active selector set, reloading the file if it changed"""
+        now = time.monotonic()
+        if self._current is not None and now < self._next_check:
+            return self._current
+        with self._lock:
+            self._next_check = now + RELOAD_CHECK_SECONDS
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = self._mtime
+            if self._current is None or mtime != self._mtime:
+                self._reload(mtime)
+            return self._current
+
+    def save_stats(self):
+        """Persist hit counters so the next process starts with the learned order"""
+        if self._current is None:
+            return
+        try:
+            with atomic_write(self.stats_path, encoding="utf-8") as f:
+                json.dump(self._current.stats(), f, indent=2)
+        except Exception as e:
+            print(f"[!] Error writing selector stats: {e}")
+
+
+# Shared registry for all parsers in the process
+_default_registry: Optional[SelectorRegistry] = None
+
+
+def get_registry() -> SelectorRegistry:
+    """Return the process-wide selector registry"""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = SelectorRegistry()
+    return _default_registry
+
+
+def get_selectors() -> SelectorSet:
+    """The selector set to use for one page"""
+    return get_registry().current()
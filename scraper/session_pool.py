@@ -0,0 +1,134 @@
+# scraper/session_pool.py
+
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from config import (
+    MARKETPLACE_CONCURRENCY,
+    REQUEST_DELAY_MIN,
+    REQUEST_DELAY_MAX,
+    SESSION_MAX_USES,
+)
+from scraper.marketplaces import Marketplace, get_marketplace
+from scraper.profiling import region
+from settings import Settings
+
+
+class PooledSession:
+    """A warmed-up HTTP client plus the cookies collected during warm-up"""
+
+    def __init__(self, client, cookies: Dict[str, str], pool: "SessionPool"):
+        self.client = client
+        self.cookies = cookies
+        self.pool = pool
+        self.uses = 0
+        self.broken = False
+
+    def close(self):
+        close = getattr(self.client, "close", None)
+        if close:
+            try:
+                close()
+            except Exception:
+                pass
+
+
+class SessionPool:
+    """Session pool and request budget for one marketplace
+
+    At most `concurrency` requests are in flight for the domain, and
+    request starts are spaced by a random delay between `delay_min` and
+    `delay_max` seconds. Warm-up happens once per session instead of once
+    per product; sessions are retired after `max_uses` requests or when
+    marked broken (e.g. after a bot check). New sessions take their proxy
+    from `settings` (default: the current snapshot).
+    """
+
+    def __init__(self, marketplace: Marketplace, concurrency: int = MARKETPLACE_CONCURRENCY,
+                 delay_min: float = REQUEST_DELAY_MIN, delay_max: float = REQUEST_DELAY_MAX,
+                 max_uses: int = SESSION_MAX_USES, settings: Optional[Settings] = None):
+        self.marketplace = marketplace
+        self.settings = settings
+        self.concurrency = max(1, concurrency)
+        self.delay_min = delay_min
+        self.delay_max = max(delay_min, delay_max)
+        self.max_uses = max_uses
+
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._idle: "queue.LifoQueue[PooledSession]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def _create(self) -> PooledSession:
+        from scraper.amazon_scraper import AmazonScraper
+
+        client = AmazonScraper.new_client(settings=self.settings)
+        with region("warm_up"):
+            cookies = AmazonScraper.warm_up(client, self.marketplace)
+        return PooledSession(client, cookies, self)
+
+    def wait_turn(self):
+        """Block until this domain's rate budget allows another request"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + random.uniform(self.delay_min, self.delay_max)
+        if start > now:
+            with region("sleep"):
+                time.sleep(start - now)
+
+    @contextmanager
+    def session(self):
+        """Check out a session for one product; blocks while the pool is busy"""
+        with self._slots:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                pooled = self._create()
+
+            try:
+                yield pooled
+            finally:
+                pooled.uses += 1
+                if pooled.broken or pooled.uses >= self.max_uses:
+                    pooled.close()
+                else:
+                    self._idle.put(pooled)
+
+    def close(self):
+        """Close all idle sessions"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools: Dict[str, SessionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(marketplace: Optional[str] = None,
+             settings: Optional[Settings] = None) -> SessionPool:
+    """Return the process-wide session pool for a marketplace
+
+    With settings, sessions created from now on use that snapshot.
+    """
+    mp = get_marketplace(marketplace)
+    with _pools_lock:
+        if mp.code not in _pools:
+            _pools[mp.code] = SessionPool(mp)
+        if settings is not None:
+            _pools[mp.code].settings = settings
+        return _pools[mp.code]
+
+
+def close_all_pools():
+    """Close every pooled session (e.g. on shutdown)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
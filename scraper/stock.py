@@ -0,0 +1,103 @@
+# scraper/stock.py
+
+import re
+from enum import IntEnum
+from functools import lru_cache
+from typing import Optional, Tuple
+
+
+class StockState(IntEnum):
+    """Normalized availability, stored as a small int in the history"""
+
+    UNKNOWN = 0
+    IN_STOCK = 1
+    LOW_STOCK = 2
+    OUT_OF_STOCK = 3
+    # Orderable now but shipped later: pre-orders and back-orders
+    PREORDER = 4
+    THIRD_PARTY_ONLY = 5
+
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+    @property
+    def buyable(self) -> bool:
+        """Can be ordered from the buy box right now"""
+        return self in (StockState.IN_STOCK, StockState.LOW_STOCK)
+
+
+# Checked in this order: back-orders ("In stock on May 3, 2026.",
+# "Temporarily out of stock. Order now ...") must win over the out of stock
+# and in stock wording they contain, "Currently unavailable" and "Not
+# available" over "available", and "Only 3 left in stock" over plain "in
+# stock". Phrases cover the marketplaces in scraper.marketplaces (English,
+# German, Japanese).
+_RULES = [
+    (StockState.PREORDER, re.compile(
+        r"in stock on \w|temporarily out of stock.{0,40}order now"
+        r"|auf lager ab \w|vor[üu]bergehend nicht auf lager.{0,40}bestellen sie jetzt"
+        r"|入荷予定", re.I)),
+    (StockState.OUT_OF_STOCK, re.compile(
+        r"currently unavailable|out of stock|\bunavailable\b|no longer available"
+        r"|\bnot available"
+        r"|derzeit nicht verf[üu]gbar|nicht (?:auf lager|verf[üu]gbar|vorr[äa]tig)"
+        r"|在庫切れ|現在お取り扱いできません|取り扱いできません", re.I)),
+    (StockState.PREORDER, re.compile(
+        r"pre-?order|will be released|this item will be released"
+        r"|vorbestell|erscheint am|erscheinungstermin"
+        r"|予約", re.I)),
+    (StockState.LOW_STOCK, re.compile(
+        r"only (\d[\d,.]*) left|(\d[\d,.]*) left in stock"
+        r"|nur noch (\d[\d.]*)|(\d[\d.]*) auf lager"
+        r"|残り(\d+)点", re.I)),
+    (StockState.THIRD_PARTY_ONLY, re.compile(
+        r"available from these sellers|see all buying options|other sellers"
+        r"|erh[äa]ltlich bei diesen anbietern|alle kaufoptionen|anderen verk[äa]ufern"
+        r"|出品者からお求めいただけます|こちらからもご購入いただけます", re.I)),
+    (StockState.IN_STOCK, re.compile(
+        r"in stock|usually (?:ships|dispatched)|ships within"
+        r"|^\W*available\W*$|available (?:now|to ship|for (?:immediate )?(?:delivery|dispatch))"
+        r"|auf lager|vorr[äa]tig|gew[öo]hnlich versandfertig|verf[üu]gbar"
+        r"|在庫あり|通常", re.I)),
+]
+
+
+@lru_cache(maxsize=4096)
+def classify_stock(text: Optional[str]) -> Tuple[StockState, Optional[int]]:
+    """Map availability text to (StockState, count left or None)
+
+    Examples:
+        "In Stock" -> (IN_STOCK, None)
+        "Only 3 left in stock - order soon." -> (LOW_STOCK, 3)
+        "Currently unavailable." -> (OUT_OF_STOCK, None)
+        "In stock on May 3, 2026." -> (PREORDER, None)
+        "Available from these sellers." -> (THIRD_PARTY_ONLY, None)
+        "Unknown" -> (UNKNOWN, None)
+
+    Availability strings repeat across products and rows, so results are
+    cached; classifying a whole history file costs one dict lookup per row.
+    """
+    if not text or text.strip().lower() == "unknown":
+        return StockState.UNKNOWN, None
+    for state, pattern in _RULES:
+        match = pattern.search(text)
+        if not match:
+            continue
+        if state is StockState.LOW_STOCK:
+            digits = re.sub(r"\D", "", next(g for g in match.groups() if g))
+            return state, int(digits) if digits else None
+        return state, None
+    return StockState.UNKNOWN, None
+
+
+def stock_state(text: Optional[str]) -> StockState:
+    return classify_stock(text)[0]
+
+
+def parse_stock_state(value) -> StockState:
+    """StockState from a stored column value ("" / None -> UNKNOWN)"""
+    try:
+        return StockState(int(value))
+    except (TypeError, ValueError):
+        return StockState.UNKNOWN
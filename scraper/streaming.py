@@ -0,0 +1,113 @@
+# scraper/streaming.py
+
+from typing import Dict, List, Optional
+
+from config import STREAM_CHUNK_BYTES, STREAM_MARGIN_BYTES
+
+COMPRESSED_ENCODINGS = {"gzip", "br", "deflate", "zstd"}
+
+
+def accepted_encodings() -> str:
+    """accept-encoding value for encodings requests/urllib3 can actually decode"""
+    encodings = ["gzip", "deflate"]
+    try:
+        import brotli  # noqa: F401
+        encodings.append("br")
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            encodings.append("br")
+        except ImportError:
+            pass
+    return ", ".join(encodings)
+
+
+class StreamedResponse:
+    """Response read incrementally, possibly stopped before the end of the body"""
+
+    def __init__(self, status_code: int, text: str, headers, cookies,
+                 wire_bytes: int, body_bytes: int, aborted: bool):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        self.cookies = cookies
+        self.wire_bytes = wire_bytes
+        self.body_bytes = body_bytes
+        self.aborted = aborted
+
+    @property
+    def compressed(self) -> bool:
+        return self.headers.get("content-encoding", "").lower() in COMPRESSED_ENCODINGS
+
+
+class StreamingClient:
+    """HTTP client that can stop reading a page once it has what parse needs
+
+    Offers the same get() call as tls_client.Session. When stop_markers is
+    given, the body is read chunk by chunk and the connection is dropped
+    once every marker has been seen plus margin_bytes more (so the marked
+    elements are complete); lxml parses the truncated document fine.
+    Uses requests, so the TLS fingerprint is that of urllib3, not a browser.
+    """
+
+    streams = True
+
+    def __init__(self, proxy: Optional[str] = None,
+                 chunk_bytes: int = STREAM_CHUNK_BYTES,
+                 margin_bytes: int = STREAM_MARGIN_BYTES):
+        import requests
+
+        self.session = requests.Session()
+        self.proxy = proxy
+        if proxy:
+            self.session.proxies = {"http": proxy, "https": proxy}
+        self.chunk_bytes = chunk_bytes
+        self.margin_bytes = margin_bytes
+
+    def get(self, url: str, headers: Optional[Dict] = None, cookies: Optional[Dict] = None,
+            timeout_seconds: int = 15, allow_redirects: bool = True,
+            stop_markers: Optional[List[str]] = None) -> StreamedResponse:
+        headers = dict(headers or {})
+        headers["accept-encoding"] = accepted_encodings()
+
+        response = self.session.get(
+            url, headers=headers, cookies=cookies, timeout=timeout_seconds,
+            allow_redirects=allow_redirects, stream=True)
+
+        pending = set(stop_markers or [])
+        chunks = []
+        body_bytes = 0
+        stop_at = None
+        aborted = False
+
+        try:
+            for chunk in response.iter_content(chunk_size=self.chunk_bytes):
+                chunks.append(chunk)
+                body_bytes += len(chunk)
+
+                if stop_at is None and pending:
+                    # Markers may straddle chunk boundaries; search the tail too
+                    window = (chunks[-2][-256:] if len(chunks) > 1 else b"") + chunk
+                    pending = {m for m in pending if m.encode() not in window}
+                    if not pending:
+                        stop_at = body_bytes + self.margin_bytes
+
+                if stop_at is not None and body_bytes >= stop_at:
+                    aborted = True
+                    break
+        finally:
+            wire_bytes = response.raw.tell() if hasattr(response.raw, "tell") else body_bytes
+            response.close()
+
+        encoding = response.encoding or "utf-8"
+        try:
+            text = b"".join(chunks).decode(encoding, errors="replace")
+        except LookupError:
+            text = b"".join(chunks).decode("utf-8", errors="replace")
+
+        return StreamedResponse(
+            response.status_code, text, response.headers, response.cookies,
+            wire_bytes, body_bytes, aborted)
+
+    def close(self):
+        self.session.close()
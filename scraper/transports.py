@@ -0,0 +1,110 @@
+# scraper/transports.py
+
+import random
+from typing import Dict, Optional
+
+from config import ASYNC_MAX_CLIENTS, FETCH_TRANSPORT
+
+CLIENT_IDS = [
+    "chrome_120", "chrome_119", "chrome_118",
+    "firefox_120", "safari_ios_16_5"
+]
+
+# curl_cffi browser targets matching the user agents in HEADERS_LIST
+IMPERSONATE_TARGETS = ["chrome120", "chrome119", "chrome116"]
+
+
+class Transport:
+    """How AmazonScraper talks HTTP
+
+    new_client() returns a client whose get(url, headers=, cookies=,
+    timeout_seconds=, allow_redirects=) returns a response with
+    status_code, text, content, headers and cookies. For async transports
+    get() and close() are coroutines.
+    """
+
+    name = ""
+    is_async = False
+
+    def new_client(self, proxy: Optional[str] = None):
+        raise NotImplementedError
+
+
+class TlsClientTransport(Transport):
+    """TLS-fingerprinted blocking client with a random browser identity (default)"""
+
+    name = "tls_client"
+
+    def new_client(self, proxy: Optional[str] = None):
+        import tls_client
+
+        client = tls_client.Session(
+            client_identifier=random.choice(CLIENT_IDS),
+            random_tls_extension_order=True
+        )
+        if proxy:
+            client.proxies = {"http": proxy, "https": proxy}
+        return client
+
+
+class StreamingTransport(Transport):
+    """requests-based client that can stop reading a page early (see scraper.streaming)"""
+
+    name = "streaming"
+
+    def new_client(self, proxy: Optional[str] = None):
+        from scraper.streaming import StreamingClient
+
+        return StreamingClient(proxy)
+
+
+class AsyncCurlClient:
+    """curl_cffi AsyncSession behind the transport get() signature"""
+
+    def __init__(self, proxy: Optional[str] = None, max_clients: int = ASYNC_MAX_CLIENTS):
+        try:
+            from curl_cffi.requests import AsyncSession
+        except ImportError:
+            raise RuntimeError(
+                "The async transport needs curl_cffi (pip install curl_cffi)")
+
+        self.proxy = proxy
+        self.session = AsyncSession(
+            impersonate=random.choice(IMPERSONATE_TARGETS),
+            proxies={"http": proxy, "https": proxy} if proxy else None,
+            max_clients=max_clients,
+        )
+
+    async def get(self, url: str, headers: Optional[Dict] = None, cookies: Optional[Dict] = None,
+                  timeout_seconds: int = 15, allow_redirects: bool = True):
+        return await self.session.get(
+            url, headers=headers, cookies=cookies,
+            timeout=timeout_seconds, allow_redirects=allow_redirects)
+
+    async def close(self):
+        await self.session.close()
+
+
+class AsyncCurlTransport(Transport):
+    """Browser-impersonating asyncio client; many requests share one event loop"""
+
+    name = "async"
+    is_async = True
+
+    def new_client(self, proxy: Optional[str] = None):
+        return AsyncCurlClient(proxy)
+
+
+TRANSPORTS = {
+    transport.name: transport
+    for transport in (TlsClientTransport(), StreamingTransport(), AsyncCurlTransport())
+}
+
+
+def get_transport(name: Optional[str] = None) -> Transport:
+    """Look up a transport by name (default: FETCH_TRANSPORT)"""
+    name = (name or FETCH_TRANSPORT).lower()
+    if name not in TRANSPORTS:
+        raise ValueError(
+            f"Unknown transport '{name}' (choose from: {', '.join(TRANSPORTS)})")
+    return TRANSPORTS[name]
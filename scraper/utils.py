@@ -6,7 +6,51 @@ import re
 import time
 from typing import Optional
 
-from config import CSV_PATH
+from config import CSV_PATH, HISTORY_AUTO_MIGRATE, HISTORY_WRITE_MODE, HISTORY_HEARTBEAT_MINUTES
+from scraper.prices import parse_amount
+from scraper.stock import classify_stock
+from scraper.marketplaces import DEFAULT_MARKETPLACE, product_key
+
+# Current history schema: descriptive text (title, url) lives in the
+# product metadata table and rating/reviews are stored as numbers;
+# stock_state is the scraper.stock.StockState value of the stock text and
+# stock_count the units left for low_stock
+HISTORY_FIELDS = [
+    "timestamp",
+    "asin",
+    "marketplace",
+    "price_raw",
+    "price",
+    "stock",
+    "stock_state",
+    "stock_count",
+    "rating",
+    "reviews",
+]
+
+# Schema of history files written before metadata was split out; the
+# history writer migrates them unless HISTORY_AUTO_MIGRATE is off
+LEGACY_HISTORY_FIELDS = [
+    "timestamp",
+    "asin",
+    "title",
+    "price_raw",
+    "price",
+    "stock",
+    "rating_raw",
+    "reviews_raw",
+    "url",
+]
+
+# Columns that delta rows leave blank while they are unchanged;
+# readers forward-fill them per ASIN (see scraper.history.iter_history)
+DELTA_FILL_FIELDS = ["title", "rating_raw", "reviews_raw", "url", "rating", "reviews"]
+
+_RATING_RE = re.compile(r"(\d+(?:[.,]\d+)?)")
+_REVIEWS_RE = re.compile(r"(\d[\d,. ]*)")
+
+# Last persisted row per product key, used by the delta write mode
+_last_written = {}
 
 
 def ensure_data_dir():
@@ -20,82 +64,164 @@ def parse_price_to_float(price_str: Optional[str]) -> Optional[float]:
     Examples:
         "$24.99" -> 24.99
         "$1,234.56" -> 1234.56
+        "1.234,56 €" -> 1234.56
         "24.99" -> 24.99
+
+    See scraper.prices for currency detection and the vectorized version.
     """
-    if not price_str:
+    return parse_amount(price_str)
+
+
+def _delta_row(row: dict, now: float) -> Optional[dict]:
+    """Return the compact row to persist for this observation, or None
+
+    A row is written when price, stock or rating changed since the last
+    persisted row for the product, or when the heartbeat interval elapsed.
+    Unchanged descriptive fields are blanked out.
+    """
+    last = _last_written.get(product_key(row["asin"], row["marketplace"]))
+    if last is None:
+        return row
+
+    changed = any(
+        str(row[key]) != str(last["row"][key])
+        for key in ("price", "stock", "rating")
+    )
+    heartbeat_due = now - last["time"] >= HISTORY_HEARTBEAT_MINUTES * 60
+
+    if not changed and not heartbeat_due:
         return None
 
-    # Remove currency symbols and spaces
-    cleaned = price_str.replace("$", "").replace(
-        "£", "").replace("€", "").strip()
+    compact = dict(row)
+    for key in DELTA_FILL_FIELDS:
+        if str(row[key]) == str(last["row"][key]):
+            compact[key] = ""
+    return compact
 
-    # Remove commas (for thousands)
-    cleaned = cleaned.replace(",", "")
 
-    # Extract first number (handles cases like "$24.99 - $29.99")
-    match = re.search(r"(\d+\.?\d*)", cleaned)
+def parse_rating(rating_str: Optional[str]) -> Optional[float]:
+    """Parse rating text to a float
 
+    Examples:
+        "4.5 out of 5 stars" -> 4.5
+        "4,5 von 5 Sternen" -> 4.5
+    """
+    if not rating_str:
+        return None
+    match = _RATING_RE.search(rating_str)
     if not match:
         return None
+    return float(match.group(1).replace(",", "."))
 
-    try:
-        return float(match.group(1))
-    except (ValueError, AttributeError):
+
+def parse_review_count(reviews_str: Optional[str]) -> Optional[int]:
+    """Parse review count text to an int
+
+    Examples:
+        "50,000 ratings" -> 50000
+        "1.234 Sternebewertungen" -> 1234
+    """
+    if not reviews_str:
+        return None
+    match = _REVIEWS_RE.search(reviews_str)
+    if not match:
         return None
+    digits = re.sub(r"\D", "", match.group(1))
+    return int(digits) if digits else None
 
 
-def save_to_csv(data: dict):
-    """Save scraped data to CSV file"""
+def history_header(path: str = CSV_PATH) -> list:
+    """Columns of an existing history file, or the current schema for a new one
+
+    Read from the file on every call: it may have been migrated or
+    replaced by another process since.
+    """
+    if os.path.isfile(path) and os.path.getsize(path) > 0:
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), HISTORY_FIELDS)
+    return HISTORY_FIELDS
+
+
+def save_to_csv(data: dict, mode: Optional[str] = None,
+                observed_at: Optional[float] = None) -> bool:
+    """Save scraped data to CSV file
+
+    mode is "full" (every observation) or "delta" (change-only rows with
+    periodic heartbeats); defaults to HISTORY_WRITE_MODE. observed_at
+    (epoch seconds) stamps a row saved later than it was scraped. The row
+    is encoded and appended by the history writer thread with the rest of
+    its group, in the columns of the file at that time (see
+    scraper.history_writer). Returns True if a row was queued, or with
+    HISTORY_DURABILITY=sync, written.
+    """
+    from scraper.history_writer import get_history_writer
+
+    mode = mode or HISTORY_WRITE_MODE
     ensure_data_dir()
-    file_exists = os.path.isfile(CSV_PATH)
+
+    now = observed_at or time.time()
+    rating = data.get("rating")
+    reviews = data.get("reviews")
+    state, count = classify_stock(data.get("stock"))
+    row = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+        "asin": data.get("asin", ""),
+        "marketplace": data.get("marketplace") or DEFAULT_MARKETPLACE,
+        "title": data.get("title", ""),
+        "price_raw": data.get("price_raw", ""),
+        "price": data.get("price", ""),
+        "stock": data.get("stock", ""),
+        "stock_state": int(state),
+        "stock_count": count,
+        "rating": rating if rating is not None else parse_rating(data.get("rating_raw")),
+        "reviews": reviews if reviews is not None else parse_review_count(data.get("reviews_raw")),
+        "rating_raw": data.get("rating_raw", ""),
+        "reviews_raw": data.get("reviews_raw", ""),
+        "url": data.get("url", ""),
+    }
+
+    # Title and URL go to the metadata table, not into every history row
+    from scraper.product_meta import get_meta_store
+    key = product_key(row["asin"], row["marketplace"])
+    get_meta_store().update(key, row["title"], row["url"])
+
+    # A legacy file that is not migrated has no marketplace column: a row
+    # of another marketplace would be read back as a DEFAULT_MARKETPLACE one
+    if not HISTORY_AUTO_MIGRATE and row["marketplace"] != DEFAULT_MARKETPLACE \
+            and "marketplace" not in history_header(CSV_PATH):
+        print(f"[X] {CSV_PATH} has no marketplace column, not saving {key} "
+              "(run: main.py history migrate)")
+        return False
+
+    out = row
+    if mode == "delta":
+        out = _delta_row(row, now)
+        if out is None:
+            print("[OK] Unchanged since last save, skipped (delta mode)")
+            return False
 
     try:
-        with open(CSV_PATH, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-
-            # Write header if file is new
-            if not file_exists:
-                writer.writerow([
-                    "timestamp",
-                    "asin",
-                    "title",
-                    "price_raw",
-                    "price",
-                    "stock",
-                    "rating_raw",
-                    "reviews_raw",
-                    "url",
-                ])
-
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-
-            writer.writerow([
-                timestamp,
-                data.get("asin", ""),
-                data.get("title", ""),
-                data.get("price_raw", ""),
-                data.get("price", ""),
-                data.get("stock", ""),
-                data.get("rating_raw", ""),
-                data.get("reviews_raw", ""),
-                data.get("url", ""),
-            ])
-
-        print(f"[OK] Data saved to CSV")
+        if not get_history_writer(CSV_PATH).write(out):
+            return False
+
+        _last_written[key] = {"row": row, "time": now}
+        return True
 
     except Exception as e:
         print(f"[!] Error saving to CSV: {e}")
+        return False
 
 
 def load_from_csv() -> list:
-    """Load all data from CSV file"""
-    if not os.path.isfile(CSV_PATH):
-        return []
+    """Load all data from CSV file
+
+    Materializes the whole history; prefer scraper.history.iter_history()
+    for large files.
+    """
+    from scraper.history import iter_history
 
     try:
-        with open(CSV_PATH, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            return list(reader)
+        return list(iter_history(CSV_PATH))
     except Exception as e:
         print(f"[!] Error loading CSV: {e}")
         return []
@@ -111,6 +237,8 @@ if __name__ == "__main__":
         "$19.99 - $29.99",
         "£15.50",
         "€20.00",
+        "1.234,56 €",
+        "￥1,280",
         None,
         "",
         "Invalid"
@@ -0,0 +1,158 @@
+# scraper/variations.py
+
+import json
+import re
+from typing import Dict, Optional
+
+from scraper.prices import CURRENCY_RE, detect_currency
+
+# Inline JSON of the variation selector ("twister") on product pages
+_JSON_KEYS = {
+    "dimensionValuesDisplayData": dict,
+    "dimensionToAsinMap": dict,
+    "variationValues": dict,
+    "dimensions": list,
+}
+_JSON_KEY_RE = re.compile(r'"(%s)"\s*:\s*' % "|".join(_JSON_KEYS))
+_PARENT_RE = re.compile(r'"parentAsin"\s*:\s*"([A-Z0-9]{10})"')
+_ASIN_RE = re.compile(r"^[A-Z0-9]{10}$")
+
+# Variation swatches that carry per-child price/availability
+_SWATCH_XPATH = (
+    '//div[@id="twister_feature_div" or @id="twister" or @id="inline-twister-expander-content"]'
+    '//li[@data-asin or @data-defaultasin]'
+)
+
+
+def _inline_json(html_source: str) -> Dict:
+    """Values of the twister JSON keys found in inline scripts"""
+    decoder = json.JSONDecoder()
+    found = {}
+    for match in _JSON_KEY_RE.finditer(html_source):
+        key = match.group(1)
+        if key in found:
+            continue
+        try:
+            value, _ = decoder.raw_decode(html_source, match.end())
+        except ValueError:
+            continue
+        # Other scripts use the same names (e.g. "dimensions": "10 x 5 cm")
+        if isinstance(value, _JSON_KEYS[key]):
+            found[key] = value
+    return found
+
+
+def _children_from_json(data: Dict) -> Dict[str, Dict[str, str]]:
+    """Child ASIN -> {dimension: value} from the twister JSON"""
+    dimensions = data.get("dimensions") or []
+    children = {}
+
+    display = data.get("dimensionValuesDisplayData")
+    if isinstance(display, dict):
+        for asin, values in display.items():
+            if _ASIN_RE.match(asin) and isinstance(values, list):
+                names = dimensions if len(dimensions) == len(values) else \
+                    [f"dimension_{i}" for i in range(len(values))]
+                children[asin] = dict(zip(names, map(str, values)))
+
+    # Older layout: "0_2" -> ASIN, indices into variationValues
+    to_asin = data.get("dimensionToAsinMap")
+    values = data.get("variationValues")
+    if not children and isinstance(to_asin, dict) and isinstance(values, dict) and dimensions:
+        for combo, asin in to_asin.items():
+            indices = str(combo).split("_")
+            if not _ASIN_RE.match(str(asin)) or len(indices) != len(dimensions):
+                continue
+            dims = {}
+            for name, idx in zip(dimensions, indices):
+                options = values.get(name) or []
+                if idx.isdigit() and int(idx) < len(options):
+                    dims[name] = str(options[int(idx)])
+            children[asin] = dims
+
+    return children
+
+
+def _swatch_offers(tree) -> Dict[str, Dict]:
+    """Child ASIN -> price/availability shown on its variation swatch"""
+    offers = {}
+    for li in tree.xpath(_SWATCH_XPATH):
+        asin = li.get("data-asin") or li.get("data-defaultasin")
+        if not asin or not _ASIN_RE.match(asin):
+            continue
+        classes = li.get("class") or ""
+        price = None
+        for text in li.xpath('.//span[contains(@class,"twisterSwatchPrice")]//text()'
+                             ' | .//span[@class="a-offscreen"]/text()'):
+            if CURRENCY_RE.search(text):
+                price = " ".join(text.split())
+                break
+        unavailable = "unavailable" in classes.lower()
+        offers[asin] = {"price_raw": price, "available": not unavailable}
+    return offers
+
+
+def extract_variations(html_source: str, tree=None) -> Optional[Dict]:
+    """Variation family of a product page, or None if it has none
+
+    Returns {"parent_asin", "dimensions", "children"} where children maps
+    each child ASIN to {"dimensions": {...}, "price_raw", "available"};
+    price_raw/available are None when the page does not show them.
+    """
+    if "dimensionValuesDisplayData" not in html_source and \
+            "dimensionToAsinMap" not in html_source:
+        return None
+
+    data = _inline_json(html_source)
+    children = _children_from_json(data)
+    if not children:
+        return None
+
+    offers = _swatch_offers(tree) if tree is not None else {}
+    parent = _PARENT_RE.search(html_source)
+
+    return {
+        "parent_asin": parent.group(1) if parent else None,
+        "dimensions": data.get("dimensions") or [],
+        "children": {
+            asin: {
+                "dimensions": dims,
+                "price_raw": offers.get(asin, {}).get("price_raw"),
+                "available": offers.get(asin, {}).get("available"),
+            }
+            for asin, dims in children.items()
+        },
+    }
+
+
+def variation_label(dimensions: Dict[str, str]) -> str:
+    """Label such as "Large, Blue" from a child's dimension values"""
+    return ", ".join(v for v in dimensions.values() if v)
+
+
+def sibling_rows(data: Dict, marketplace) -> Dict[str, Dict]:
+    """History rows for the siblings of a parsed page that show a price
+
+    data is AmazonScraper.parse output with a "variations" entry; the
+    fetched ASIN itself is left out. Rating and review count are shared
+    by the whole family on Amazon, so they are copied from the page.
+    """
+    variations = data.get("variations") or {}
+    rows = {}
+    for asin, child in (variations.get("children") or {}).items():
+        if asin == data.get("asin") or not child.get("price_raw"):
+            continue
+        rows[asin] = {
+            "asin": asin,
+            "marketplace": marketplace.code,
+            "currency": detect_currency(child["price_raw"], marketplace.currency),
+            "title": None,
+            "price_raw": child["price_raw"],
+            "stock": "In Stock" if child.get("available") is not False else "Currently unavailable",
+            "rating_raw": data.get("rating_raw"),
+            "reviews_raw": data.get("reviews_raw"),
+            "rating": data.get("rating"),
+            "reviews": data.get("reviews"),
+            "url": marketplace.product_url(asin),
+        }
+    return rows
@@ -0,0 +1,308 @@
+# scraper/work_queue.py
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from config import QUEUE_DB_PATH, QUEUE_LEASE_SECONDS, QUEUE_MAX_ATTEMPTS
+from scraper.marketplaces import get_marketplace
+from scraper.products_manager import ProductsManager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key           TEXT PRIMARY KEY,
+    marketplace   TEXT NOT NULL,
+    item          TEXT NOT NULL,
+    state         TEXT NOT NULL,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+CREATE TABLE IF NOT EXISTS results (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    key        TEXT NOT NULL,
+    item       TEXT NOT NULL,
+    data       TEXT NOT NULL,
+    worker     TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class WorkQueue:
+    """SQLite-backed job queue shared by a coordinator and its workers
+
+    Job states: queued -> leased -> done (or back to queued when the
+    lease expires or the fetch fails, until max_attempts; then failed).
+    A job is claimed by exactly one worker at a time, and a result is
+    only accepted from the worker that still holds the lease, so nothing
+    is scraped twice or lost when a worker dies mid-fetch. Results stay
+    queued until the coordinator has persisted them (at-least-once).
+
+    Workers on other hosts need the database on storage every node can
+    lock (SQLite over NFS/SMB is unreliable).
+    """
+
+    def __init__(self, path: str = QUEUE_DB_PATH, lease_seconds: int = QUEUE_LEASE_SECONDS,
+                 max_attempts: int = QUEUE_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Connection holding the write lock for the duration of the block"""
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    # ============================================================
+    # COORDINATOR SIDE
+    # ============================================================
+
+    def enqueue(self, items: List[Dict]) -> int:
+        """Queue products for scraping; ones already queued or leased are left alone
+
+        Workers claim in the order of items (see scraper.planner.plan_cycle).
+        """
+        now = time.time()
+        queued = 0
+        with self._transaction() as db:
+            for idx, item in enumerate(items):
+                cursor = db.execute(
+                    """INSERT INTO jobs (key, marketplace, item, state, attempts, updated_at)
+                       VALUES (?, ?, ?, 'queued', 0, ?)
+                       ON CONFLICT (key) DO UPDATE
+                       SET item = excluded.item, state = 'queued', attempts = 0,
+                           lease_owner = NULL, lease_expires = NULL,
+                           updated_at = excluded.updated_at
+                       WHERE jobs.state IN ('done', 'failed')""",
+                    (ProductsManager.key(item), get_marketplace(item.get("marketplace")).code,
+                     # claim() orders by updated_at; offsets keep the planned order
+                     json.dumps(item), now + idx * 1e-6))
+                queued += cursor.rowcount
+        return queued
+
+    def requeue_expired(self) -> int:
+        """Put jobs whose lease ran out (worker died or hung) back in the queue"""
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                """UPDATE jobs SET state = 'failed', lease_owner = NULL, updated_at = ?
+                   WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?""",
+                (now, now, self.max_attempts))
+            cursor = db.execute(
+                """UPDATE jobs SET state = 'queued', lease_owner = NULL, updated_at = ?
+                   WHERE state = 'leased' AND lease_expires < ?""",
+                (now, now))
+            return cursor.rowcount
+
+    def take_results(self, limit: int = 100) -> List[Dict]:
+        """Return up to limit reported results, oldest first
+
+        Results stay in the queue until ack_results(): a coordinator that
+        dies before persisting them gets them again (at-least-once).
+        """
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT id, key, item, data, worker FROM results ORDER BY id LIMIT ?",
+                (limit,)).fetchall()
+        return [
+            {"id": rid, "key": key, "item": json.loads(item), "data": json.loads(data),
+             "worker": worker}
+            for rid, key, item, data, worker in rows
+        ]
+
+    def ack_results(self, ids: List[int]) -> int:
+        """Remove results once they are persisted"""
+        if not ids:
+            return 0
+        with self._transaction() as db:
+            cursor = db.execute(
+                f"DELETE FROM results WHERE id IN ({','.join('?' * len(ids))})", ids)
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._transaction() as db:
+            counts = dict(db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+            counts["results"] = db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return counts
+
+    # ============================================================
+    # WORKER SIDE
+    # ============================================================
+
+    def claim(self, worker: str, marketplace: Optional[str] = None) -> Optional[Dict]:
+        """Lease the oldest queued job (optionally for one marketplace)"""
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                """SELECT key, item FROM jobs
+                   WHERE state = 'queued' AND (? IS NULL OR marketplace = ?)
+                   ORDER BY updated_at LIMIT 1""",
+                (marketplace, marketplace)).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                """UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?,
+                   attempts = attempts + 1, updated_at = ? WHERE key = ?""",
+                (worker, now + self.lease_seconds, now, row[0]))
+        return json.loads(row[1])
+
+    def complete(self, worker: str, item: Dict, data: Dict) -> bool:
+        """Report a scraped result; False if the lease was lost in the meantime"""
+        key = ProductsManager.key(item)
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                """UPDATE jobs SET state = 'done', lease_owner = NULL, updated_at = ?
+                   WHERE key = ? AND state = 'leased' AND lease_owner = ?""",
+                (now, key, worker))
+            if not cursor.rowcount:
+                return False
+            db.execute(
+                "INSERT INTO results (key, item, data, worker, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(item), json.dumps(data), worker, now))
+        return True
+
+    def fail(self, worker: str, item: Dict):
+        """Give a job back after a failed fetch (failed for good after max_attempts)"""
+        key = ProductsManager.key(item)
+        with self._transaction() as db:
+            db.execute(
+                """UPDATE jobs
+                   SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                       lease_owner = NULL, updated_at = ?
+                   WHERE key = ? AND state = 'leased' AND lease_owner = ?""",
+                (self.max_attempts, time.time(), key, worker))
+
+
+# ============================================================
+# PROCESSES
+# ============================================================
+
+def run_coordinator(interval_minutes: int, poll_seconds: float = 5, once: bool = False):
+    """Enqueue enabled products every interval and persist what workers report
+
+    The coordinator is the only process writing history and products, and
+    the only one sending alerts. With once, it enqueues a single round and
+    returns when that round has been fully reported or has failed.
+    """
+    from alerts.rules import send_cycle_alerts
+    from scraper.anomaly import get_anomaly_filter
+    from scraper.cycle import handle_result
+    from scraper.health import HealthStore
+    from scraper.history_writer import get_history_writer
+    from scraper.planner import plan_cycle
+    from settings import get_settings
+
+    queue = WorkQueue()
+    manager = ProductsManager()
+    next_enqueue = 0.0
+
+    print(f"[*] Coordinator started (queue: {queue.path})")
+
+    while True:
+        if time.time() >= next_enqueue:
+            products = manager.get_enabled_products()
+            # Workers report no failure details, but products backed off
+            # by single-host cycles stay backed off here too
+            products, _ = HealthStore().split_due(products, ProductsManager.key)
+            queued = queue.enqueue(plan_cycle(products))
+            print(f"[*] Enqueued {queued} of {len(products)} products")
+            next_enqueue = time.time() + interval_minutes * 60
+
+        expired = queue.requeue_expired()
+        if expired:
+            print(f"[!] Re-queued {expired} jobs with expired leases")
+
+        results = queue.take_results()
+        for result in results:
+            item = manager.get_product(result["key"]) or result["item"]
+            print(f"\n[OK] {result['key']} reported by {result['worker']}")
+            try:
+                handle_result(item, result["data"], manager)
+            except Exception as e:
+                print(f"   [X] Error saving {result['key']}: {e}")
+        # Rules read the rollups from history: persist this round's rows
+        # first. Results leave the queue only once their rows are written
+        # (one that failed to save is logged and dropped); a coordinator
+        # killed before that handles them again on restart
+        if get_history_writer().flush():
+            queue.ack_results([result["id"] for result in results])
+        send_cycle_alerts(get_settings())
+        get_anomaly_filter().save()
+
+        if once:
+            stats = queue.stats()
+            if not any(stats.get(state) for state in ("queued", "leased", "results")):
+                print(f"[OK] Round complete: {stats.get('done', 0)} done, "
+                      f"{stats.get('failed', 0)} failed")
+                return
+
+        time.sleep(poll_seconds)
+
+
+def run_worker(worker_id: str, marketplace: Optional[str] = None,
+               poll_seconds: float = 5, exit_when_idle: bool = False):
+    """Claim jobs, fetch and parse them, and report the results"""
+    from scraper.cycle import scrape_product
+    from scraper.memory import MemoryMonitor, recycle_process
+    from scraper.session_pool import close_all_pools, get_pool
+    from settings import get_settings, get_store
+
+    queue = WorkQueue()
+    monitor = MemoryMonitor(f"worker {worker_id}")
+    # Pooled sessions outlive a job; drop them when the proxies change
+    get_store().on_reload(lambda old, new: close_all_pools() if old.proxy != new.proxy else None)
+    print(f"[*] Worker {worker_id} started (queue: {queue.path})")
+
+    try:
+        while True:
+            item = queue.claim(worker_id, marketplace)
+            if item is None:
+                if exit_when_idle:
+                    print(f"[OK] Worker {worker_id}: queue empty, exiting")
+                    return
+                time.sleep(poll_seconds)
+                continue
+
+            key = ProductsManager.key(item)
+            print(f"\n[{worker_id}] Checking {item.get('name', key)} ({key})")
+            try:
+                settings = get_settings()
+                data = scrape_product(item, get_pool(item.get("marketplace"), settings),
+                                      settings=settings)
+            except Exception as e:
+                print(f"   [X] Error checking {key}: {e}")
+                data = None
+
+            if not data:
+                queue.fail(worker_id, item)
+            elif not queue.complete(worker_id, item, data):
+                print(f"   [!] Lease on {key} expired; result dropped")
+
+            if monitor.after_cycle():
+                recycle_process()
+    finally:
+        close_all_pools()